@@ -0,0 +1,138 @@
+'''Compares the per-call overhead of the AVTransport clients against a local fake renderer:
+upnpclient, dlna_helper.soap_call and the precompiled upnp_control client.
+
+Run from the repository's root: python -m benchmarks.bench_control [calls]
+'''
+import sys
+import threading
+from time import perf_counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import upnpclient
+
+from dlna import dlna_helper
+from dlna import upnp_control
+
+DESCRIPTION = b'''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+    <friendlyName>Benchmark</friendlyName>
+    <UDN>uuid:benchmark</UDN>
+    <serviceList>
+      <service>
+        <serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType>
+        <serviceId>urn:upnp-org:serviceId:AVTransport</serviceId>
+        <SCPDURL>/avt.xml</SCPDURL>
+        <controlURL>/avt/control</controlURL>
+        <eventSubURL>/avt/event</eventSubURL>
+      </service>
+    </serviceList>
+  </device>
+</root>'''
+
+SCPD = b'''<?xml version="1.0"?>
+<scpd xmlns="urn:schemas-upnp-org:service-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <actionList>
+    <action>
+      <name>GetTransportInfo</name>
+      <argumentList>
+        <argument><name>InstanceID</name><direction>in</direction>
+          <relatedStateVariable>A_ARG_TYPE_InstanceID</relatedStateVariable></argument>
+        <argument><name>CurrentTransportState</name><direction>out</direction>
+          <relatedStateVariable>TransportState</relatedStateVariable></argument>
+        <argument><name>CurrentTransportStatus</name><direction>out</direction>
+          <relatedStateVariable>TransportStatus</relatedStateVariable></argument>
+        <argument><name>CurrentSpeed</name><direction>out</direction>
+          <relatedStateVariable>TransportPlaySpeed</relatedStateVariable></argument>
+      </argumentList>
+    </action>
+  </actionList>
+  <serviceStateTable>
+    <stateVariable sendEvents="no"><name>A_ARG_TYPE_InstanceID</name><dataType>ui4</dataType></stateVariable>
+    <stateVariable sendEvents="no"><name>TransportState</name><dataType>string</dataType></stateVariable>
+    <stateVariable sendEvents="no"><name>TransportStatus</name><dataType>string</dataType></stateVariable>
+    <stateVariable sendEvents="no"><name>TransportPlaySpeed</name><dataType>string</dataType></stateVariable>
+  </serviceStateTable>
+</scpd>'''
+
+TRANSPORT_INFO = (b'<?xml version="1.0"?>'
+                  b'<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+                  b' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+                  b'<u:GetTransportInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">'
+                  b'<CurrentTransportState>PLAYING</CurrentTransportState>'
+                  b'<CurrentTransportStatus>OK</CurrentTransportStatus>'
+                  b'<CurrentSpeed>1</CurrentSpeed>'
+                  b'</u:GetTransportInfoResponse></s:Body></s:Envelope>')
+
+
+class FakeRenderer(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, delayed ACKs would dominate every keep-alive call
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._respond(SCPD if self.path == '/avt.xml' else DESCRIPTION)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self._respond(TRANSPORT_INFO)
+
+    def _respond(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset="utf-8"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _measure(name: str, calls: int, fn):
+    fn()  # warm up, e.g. the connection
+    started = perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = perf_counter() - started
+    print(f"{name:<28} {elapsed / calls * 1e6:10.1f} us/call")
+
+
+def main(calls: int):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeRenderer)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    location = f"http://127.0.0.1:{server.server_address[1]}/description.xml"
+    try:
+        print(f"{calls} calls of GetTransportInfo")
+        _measure('upnpclient.Device()', 20, lambda: upnpclient.Device(location))
+        _measure('upnp_control.Device()', 20, lambda: upnp_control.Device(location))
+
+        upnp_device = upnpclient.Device(location)
+        _measure('upnpclient', calls, lambda: upnp_device.AVTransport.GetTransportInfo(InstanceID=0))
+
+        action = upnp_device.AVTransport.find_action('GetTransportInfo')
+        service_type = upnp_device.AVTransport.service_type
+        _measure('dlna_helper.soap_call', calls,
+                 lambda: dlna_helper.soap_call(action.url, service_type, 'GetTransportInfo', [('InstanceID', 0)]))
+
+        control_device = upnp_control.Device(location)
+        _measure('upnp_control', calls, lambda: control_device.AVTransport.GetTransportInfo(InstanceID=0))
+
+        # without the network: building the request and reading the response
+        template = control_device.AVTransport._templates['GetTransportInfo']
+        _measure('  template + extract', calls,
+                 lambda: (template.body({'InstanceID': 0}), upnp_control.extract(TRANSPORT_INFO, template.arguments_out)))
+        _measure('  format + parse', calls,
+                 lambda: (dlna_helper.SOAP_ENVELOPE.format(action='GetTransportInfo', service_type=service_type,
+                                                           arguments='<InstanceID>0</InstanceID>').encode('utf-8'),
+                          dlna_helper.parse_soap_response(TRANSPORT_INFO)))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,72 @@
+'''Runs the controller against a fleet of simulated renderers: all of them are started as one group,
+then the integrators poll them and keep them looping for a while.
+Reports the group's start skew, the renderers' load, the command queues' waiting times and the poller's lag.
+
+Run from the repository's root: python -m benchmarks.bench_fleet [renderers] [seconds]
+'''
+import sys
+from time import perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+
+from controller.scheduler import Scheduler
+from controller.poller import Poller
+from controller.player_wrapper import PlayerWrapper, configure
+from controller.player_dispatcher import PlayerDispatcher
+from controller.data.command import Command, PlayCommand
+from dlna.simulated_renderer import RendererFleet
+from dlna.player import Player
+
+
+class StaticPlayers():
+    '''the configured players only, without discovery'''
+
+    def __init__(self, players: list[PlayerWrapper]):
+        self._players = players
+
+    def get_players(self) -> list[PlayerWrapper]:
+        return self._players
+
+
+def _millis(seconds: float | None) -> str:
+    # None if nothing was measured, e.g. no poll was due within a short run
+    return 'n/a' if seconds is None else f"{seconds * 1000:.0f} ms"
+
+
+def main(count: int, seconds: float):
+    scheduler = Scheduler()
+    scheduler.start()
+    poller = Poller()
+    poller.start()
+    state_executor = ThreadPoolExecutor(max_workers=Player.STATE_QUERY_WORKERS, thread_name_prefix='PlayerState')
+    with RendererFleet(count, seed=0, track_duration=5, accept_delay=0.05, latency=0.005, jitter=0.02) as fleet:
+        players = [configure({'name': r.name, 'url': r.location}, state_executor=state_executor)
+                   for r in fleet.get_renderers()]
+        dispatcher = PlayerDispatcher(StaticPlayers(players), None, scheduler,
+                                      groups={'All': [p.get_name() for p in players]}, poller=poller)
+
+        started = perf_counter()
+        states = dispatcher.play(PlayCommand(target='All', url='http://media/track.mp3', loop=True))
+        took = perf_counter() - started
+        plays = [r.get_last_play() for r in fleet.get_renderers() if r.get_last_play() is not None]
+        print(f"{count} renderers, {len(states)} playing after {took:.2f}s")
+        print(f"start skew {(max(plays) - min(plays)) * 1000:.0f} ms")
+
+        before = fleet.get_info()
+        sleep(seconds)
+        after = fleet.get_info()
+        print(f"{(after['calls'] - before['calls']) / seconds:.1f} calls/s, "
+              f"{after['tracks'] - before['tracks']} tracks in {seconds:.0f}s")
+
+        queues = dispatcher.get_queue_info().values()
+        print(f"max command queue wait {_millis(max(q['max_wait_seconds'] for q in queues))}")
+        polling = poller.get_info()
+        print(f"{polling['runs']} polls in {polling['ticks']} ticks, {polling['skipped']} skipped, "
+              f"lag avg {_millis(polling['avg_lag_seconds'])} max {_millis(polling['max_lag_seconds'])}")
+        dispatcher.stop(Command('All'))
+    poller.shutdown()
+    scheduler.shutdown()
+    state_executor.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100, float(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,94 @@
+'''Compares the scheduler backends: the built-in HeapScheduler and APScheduler.
+Measures the startup including imports (in a fresh interpreter each), adding and removing jobs,
+the latency of run_job_now and how many runs of many short interval jobs happen on time.
+
+Run from the repository's root: python -m benchmarks.bench_scheduler [jobs]
+'''
+import sys
+import statistics
+import subprocess
+import threading
+from time import perf_counter, sleep
+
+from controller.scheduler import Scheduler, HeapScheduler
+
+STARTUP = '''
+from time import perf_counter
+started = perf_counter()
+from controller.scheduler import {cls}
+s = {cls}()
+s.start()
+print(perf_counter() - started)
+'''
+
+
+def _startup(cls: str) -> float:
+    # best of a few, the first ones may pay for cold caches
+    return min(float(subprocess.run([sys.executable, '-c', STARTUP.format(cls=cls)], capture_output=True, text=True,
+                                    check=True).stdout) for _ in range(5))
+
+
+def _add_remove(scheduler, jobs: int) -> tuple[float, float]:
+    started = perf_counter()
+    for n in range(jobs):
+        scheduler.start_job(f"job {n}", _noop, 3600)
+    added = perf_counter()
+    for n in range(jobs):
+        scheduler.stop_job(f"job {n}")
+    removed = perf_counter()
+    return (added - started) / jobs, (removed - added) / jobs
+
+
+def _run_now_latency(scheduler, calls: int = 100) -> float:
+    ran = threading.Event()
+    scheduler.start_job('latency', ran.set, 3600)
+    latencies = []
+    for _ in range(calls):
+        ran.clear()
+        started = perf_counter()
+        scheduler.run_job_now('latency')
+        ran.wait(5)
+        latencies.append(perf_counter() - started)
+        # APScheduler may still be busy with the run
+        sleep(0.002)
+    scheduler.stop_job('latency')
+    return statistics.median(latencies)
+
+
+def _on_time(scheduler, jobs: int, interval: float = 0.5, seconds: float = 3) -> float:
+    runs = []
+    lock = threading.Lock()
+
+    def run():
+        with lock:
+            runs.append(1)
+    for n in range(jobs):
+        scheduler.start_job(f"interval {n}", run, interval)
+    sleep(seconds)
+    for n in range(jobs):
+        scheduler.stop_job(f"interval {n}")
+    return len(runs) / (jobs * int(seconds / interval))
+
+
+def _noop():
+    pass
+
+
+def main(jobs: int):
+    print(f"{'':<16}{'startup':>12}{'add':>12}{'remove':>12}{'run_now':>12}{'on time':>10}")
+    for name, cls, create in (('builtin', 'HeapScheduler', HeapScheduler), ('apscheduler', 'Scheduler', Scheduler)):
+        startup = _startup(cls)
+        scheduler = create()
+        scheduler.start()
+        try:
+            add, remove = _add_remove(scheduler, jobs)
+            latency = _run_now_latency(scheduler)
+            on_time = _on_time(scheduler, jobs)
+        finally:
+            scheduler.shutdown()
+        print(f"{name:<16}{startup * 1e3:>10.1f}ms{add * 1e6:>10.1f}us{remove * 1e6:>10.1f}us"
+              f"{latency * 1e3:>10.2f}ms{on_time * 100:>9.0f}%")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,44 @@
+import logging
+import threading
+
+from dlna.shuffle_deck import ShuffleDeck
+
+logger = logging.getLogger(__file__)
+
+
+class CandidateSequence():
+    '''The items of one search in one shuffled order, shared by the renderers of a group.
+    Each renderer asks for its n-th item and all get the same one, so they play in lockstep.
+    The first renderer reaching a position draws it, drawn items are kept as long as a renderer
+    lagging at most WINDOW positions behind could still ask for them.
+    '''
+
+    WINDOW = 16
+
+    _search_response: any
+    _deck: ShuffleDeck
+    _items: dict[int, any]
+
+    def __init__(self, search_response, deck: ShuffleDeck = None):
+        self._search_response = search_response
+        self._deck = deck if deck is not None else ShuffleDeck()
+        self._items = {}
+        self._drawn = 0
+        self._lock = threading.Lock()
+
+    def get_search_response(self):
+        return self._search_response
+
+    def item(self, position: int):
+        '''the item at position, None if nothing (more) was found'''
+        with self._lock:
+            while self._drawn <= position:
+                # sampling responses fetch the item on demand, so it may vanish although counted before
+                item = self._search_response.random_item(self._deck) if self._search_response.get_matches() > 0 else None
+                self._items[self._drawn] = item
+                self._items.pop(self._drawn - self.WINDOW, None)
+                self._drawn += 1
+            if position not in self._items:
+                logger.warning(f"position {position} dropped, lagging more than {self.WINDOW} behind")
+                return None
+            return self._items[position]
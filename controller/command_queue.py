@@ -0,0 +1,161 @@
+import heapq
+import logging
+import threading
+from time import monotonic
+from concurrent.futures import Future, Executor
+
+logger = logging.getLogger(__file__)
+
+# lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class _Command():
+
+    __slots__ = ('priority', 'seq', 'key', 'fn', 'futures', 'enqueued', 'cancelled')
+
+    def __init__(self, priority: int, seq: int, key: str, fn):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.fn = fn
+        self.futures: list[Future] = [Future()]
+        self.enqueued = monotonic()
+        self.cancelled = False
+
+    def __lt__(self, other: '_Command'):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CommandQueue():
+    '''Actor serializing everything sent to a single renderer.
+    Interactive commands run before background ones. A queued command is replaced by a newer one
+    with the same key, its caller gets the result of the newer one.
+    Given an executor, e.g. the poller's, the commands run there one at a time, a task per command,
+    so the threads are shared by all renderers. Without, on a worker thread of its own.
+    '''
+
+    _name: str
+    _heap: list[_Command]
+    _pending: dict[str, _Command]
+    _executor: Executor
+    _thread: threading.Thread
+    _worker: threading.Thread
+
+    def __init__(self, name: str, executor: Executor = None):
+        self._name = name
+        self._heap = []
+        self._pending = {}
+        self._depth = 0
+        self._seq = 0
+        self._started = 0
+        self._executor = executor
+        self._thread = None
+        # a command is running or a task to run the next one is submitted to the executor
+        self._draining = False
+        # the thread running a command currently
+        self._worker = None
+        self._condition = threading.Condition()
+        self._stats = {'executed': 0, 'coalesced': 0, 'errors': 0, 'wait_seconds': 0.0,
+                       'last_wait_seconds': None, 'max_wait_seconds': 0.0}
+
+    def submit(self, fn, priority: int = BACKGROUND, key: str = None) -> Future:
+        '''queues fn, returns a future of its result'''
+        with self._condition:
+            self._seq += 1
+            command = _Command(priority, self._seq, key, fn)
+            former = self._pending.get(key) if key is not None else None
+            if former is not None:
+                # removed lazily when popped
+                former.cancelled = True
+                command.futures[:0] = former.futures
+                self._depth -= 1
+                self._stats['coalesced'] += 1
+            if key is not None:
+                self._pending[key] = command
+            heapq.heappush(self._heap, command)
+            self._depth += 1
+            if self._executor is not None:
+                if not self._draining:
+                    self._draining = True
+                    self._executor.submit(self._drain)
+            elif self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"Commands {self._name}", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+            return command.futures[-1]
+
+    def call(self, fn, priority: int = INTERACTIVE, key: str = None):
+        '''runs fn on the worker and waits for its result'''
+        if threading.current_thread() is self._worker:
+            # already serialized, queueing would wait for ourself
+            return fn()
+        return self.submit(fn, priority, key).result()
+
+    def _next(self, wait: bool = True) -> _Command:
+        '''the next command to run, None if there is none and not to wait for one'''
+        with self._condition:
+            while True:
+                while not self._heap:
+                    if not wait:
+                        self._draining = False
+                        return None
+                    self._condition.wait()
+                command = heapq.heappop(self._heap)
+                if command.cancelled:
+                    continue
+                if command.key is not None:
+                    self._pending.pop(command.key, None)
+                self._depth -= 1
+                self._started += 1
+                waited = monotonic() - command.enqueued
+                self._stats['wait_seconds'] += waited
+                self._stats['last_wait_seconds'] = waited
+                self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+                return command
+
+    def _run(self):
+        while True:
+            self._execute(self._next())
+
+    def _drain(self):
+        command = self._next(wait=False)
+        if command is None:
+            return
+        self._execute(command)
+        # the next one queued behind the other renderers' commands
+        self._executor.submit(self._drain)
+
+    def _execute(self, command: _Command):
+        self._worker = threading.current_thread()
+        try:
+            result = command.fn()
+        except Exception as e:
+            logger.debug(f"command on {self._name} failed", exc_info=e)
+            with self._condition:
+                self._stats['executed'] += 1
+                self._stats['errors'] += 1
+            for f in command.futures:
+                f.set_exception(e)
+            return
+        finally:
+            self._worker = None
+        with self._condition:
+            self._stats['executed'] += 1
+        for f in command.futures:
+            f.set_result(result)
+
+    def get_depth(self) -> int:
+        return self._depth
+
+    def get_info(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            wait_seconds = stats.pop('wait_seconds')
+            for k in ('last_wait_seconds', 'max_wait_seconds'):
+                if stats[k] is not None:
+                    stats[k] = round(stats[k], 3)
+            stats['avg_wait_seconds'] = round(wait_seconds / self._started, 3) if self._started else None
+            stats['depth'] = self._depth
+            return stats
@@ -3,7 +3,8 @@ from dataclasses import dataclass
 
 @dataclass
 class Command:
-    target: str = None
+    # a single player's name or alias, a configured group's name, or a list of them
+    target: str | list[str] = None
 
 
 @dataclass
@@ -11,6 +12,13 @@ class PlayCommand(Command):
     url: str = None
     artist: str = None
     title: str = None
-    target: str = None
+    target: str | list[str] = None
     type: str = None
     loop: bool = False
+    # urls and media server item ids, played in this order instead of searching
+    playlist: list[str] = None
+
+    def search_args(self) -> dict:
+        '''arguments of the media server search, None values left out'''
+        search_args = {'title': self.title, 'artist': self.artist, 'type': self.type}
+        return {k: v for k, v in search_args.items() if v is not None}
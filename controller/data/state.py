@@ -18,6 +18,28 @@ class StateView():
     stop_reason: str
 
 
+@dataclass
+class TrackView():
+    url: str
+    artist: str
+    title: str
+
+
+def track_view(url: str, item: Item) -> TrackView | None:
+    if url is None:
+        return None
+    return TrackView(url, item.get_actor() if item is not None else None, item.get_title() if item is not None else None)
+
+
+@dataclass
+class QueueView():
+    # sent to the renderer already
+    playing: TrackView
+    next: TrackView
+    # prepared, not yet sent
+    upcoming: list[TrackView]
+
+
 class State():
 
     # the command beeing issued
@@ -77,7 +99,21 @@ class State():
         else:
             return "Medien"
 
+    def _playlist_description(self) -> str | None:
+        '''a looping playlist as a whole, an entry played without an item by its url'''
+        if not self.is_playlist_mode():
+            return None
+        if self.current_command.loop:
+            return "Wiederholt Playlist"
+        title, artist = self._title_and_artist()
+        if not title and not artist and self.last_played_url:
+            return "Spielt " + self.last_played_url
+        return None
+
     def _calculate_description(self):
+        description = self._playlist_description()
+        if description is not None:
+            return description
         if self.current_command.loop:
             if self.current_command.url:
                 return "Wiederholt " + self.current_command.url
@@ -118,10 +154,16 @@ class State():
         if self.current_command is None:
             return False
 
-        if self.current_command.url:
+        if self.current_command.url or self.current_command.playlist:
             return False
         return True
 
+    def is_playlist_mode(self):
+        """playlist mode plays the given urls and items in order"""
+        if self.current_command is None or self.current_command.url:
+            return False
+        return bool(self.current_command.playlist)
+
     def command(self, command: PlayCommand):
         """set the last command issued"""
         self.current_command = command
@@ -156,6 +198,13 @@ class State():
         self._initial_values()
         self.stop_reason = reason
 
+    def queue_view(self, upcoming: list[TrackView]) -> QueueView:
+        """what is played now and next, followed by the upcoming tracks"""
+        if not self.running:
+            return QueueView(None, None, [])
+        return QueueView(track_view(self.last_played_url, self.last_played_item),
+                         track_view(self.next_play_url, self.next_play_item), upcoming)
+
     def view(self):
         """function that renders an immutable view"""
         title, artist = self._title_and_artist()
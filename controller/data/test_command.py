@@ -6,4 +6,9 @@ class TestCommand(unittest.TestCase):
 
     def test_to_str(self):
         p = PlayCommand(url='a', artist='b', title='c', type='d', target='e', loop=True)
-        self.assertEqual("PlayCommand(target='e', url='a', artist='b', title='c', type='d', loop=True)", str(p))
+        self.assertEqual("PlayCommand(target='e', url='a', artist='b', title='c', type='d', loop=True, playlist=None)", str(p))
+
+    def test_search_args(self):
+        self.assertEqual({'artist': 'b', 'type': 'd'}, PlayCommand(artist='b', type='d').search_args())
+        self.assertEqual({}, PlayCommand(url='a').search_args())
+        self.assertEqual({}, PlayCommand(playlist=['a', '64$1']).search_args())
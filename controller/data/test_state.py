@@ -1,6 +1,6 @@
 import unittest
 
-from controller.data.state import State
+from controller.data.state import State, QueueView, TrackView
 from controller.data.command import PlayCommand
 
 
@@ -161,3 +161,32 @@ class TestState(unittest.TestCase):
 
         t.now_playing(None, MyItem('Bar', None))
         self.assertEqual('Spielt Bar', t._calculate_description())
+
+        t.command(PlayCommand(playlist=['http://x/a.mp3', '64$1'], loop=True))
+        self.assertEqual('Wiederholt Playlist', t._calculate_description())
+
+        t.command(PlayCommand(playlist=['http://x/a.mp3', '64$1']))
+        t.now_playing('http://x/a.mp3', None)
+        self.assertEqual('Spielt http://x/a.mp3', t._calculate_description())
+
+    def test_playlist_mode(self):
+        t = self._testee()
+        t.command(PlayCommand(playlist=['http://x/a.mp3']))
+        self.assertTrue(t.is_playlist_mode())
+        self.assertFalse(t.is_item_mode())
+        self.assertFalse(t.is_url_mode())
+
+        t.command(PlayCommand(title=DEFAULT_TITLE, playlist=[]))
+        self.assertFalse(t.is_playlist_mode())
+        self.assertTrue(t.is_item_mode())
+
+    def test_queue_view(self):
+        t = self._testee()
+        self.assertEqual(QueueView(None, None, []), t.queue_view([]))
+
+        t.command(PlayCommand(artist=DEFAULT_ARTIST, loop=True))
+        t.now_playing('a', MyItem(DEFAULT_TITLE, DEFAULT_ARTIST))
+        t.next_play('b', None)
+        upcoming = [TrackView('c', None, None)]
+        self.assertEqual(QueueView(TrackView('a', DEFAULT_ARTIST, DEFAULT_TITLE), TrackView('b', None, None), upcoming),
+                         t.queue_view(upcoming))
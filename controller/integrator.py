@@ -1,15 +1,26 @@
+import copy
 import logging
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
 from enum import Enum
 from typing import Tuple
+from concurrent.futures import Future
 
 from controller.player_wrapper import PlayerWrapper
-from controller.data.state import State, StateView
+from controller.data.state import State, StateView, QueueView, track_view
 from controller.data.command import PlayCommand
 from controller.scheduler import Scheduler
-from controller.data.exceptions import RequestInvalidException
+from controller.poller import Poller
+from controller.command_queue import CommandQueue, INTERACTIVE, BACKGROUND
+from controller.data.exceptions import RequestInvalidException, RequestCannotBeHandeledException
+from controller.candidate_sequence import CandidateSequence
+from controller.play_queue import PlayQueue, QueuedTrack
 
-from dlna.player import TRANSPORT_STATE
+from dlna.player import TRANSPORT_STATE, State as PlayerState
 from dlna.mediaserver import MediaServer
+from dlna.shuffle_deck import ShuffleDeck
+from dlna.eventing import EventListener, Subscription
 
 logger = logging.getLogger(__file__)
 
@@ -22,30 +33,99 @@ NEXT_MEDIA_STATE = Enum('NextMediaState', ['SET', 'UNSET'])
 PROGRESS_COUNT_MAX = 2147483647  # see spec # 2.2.26 maximum of i4 datatype
 
 
+@dataclass
+class _PausedSession():
+    # as it was when paused: command, search response and the tracks played
+    state: State
+    queue: PlayQueue
+    # seconds into the current track, None if unknown
+    rel_time: float
+
+
 class Integrator():
 
     DEFAULT_CHECK_INTERVAL = 10
+    # with events, polling only catches what got lost
+    EVENT_FALLBACK_INTERVAL = 60
+    # event subscriptions are renewed after half of the granted timeout, not more often than this,
+    # but this long before they expire at least
+    RENEWAL_MIN_INTERVAL = 30
+    RENEWAL_MARGIN = 5
+    # changes of these AVTransport state variables trigger a check
+    EVENT_VARIABLES = frozenset(['TransportState', 'AVTransportURI', 'CurrentTrackURI', 'NextAVTransportURI'])
+    # adaptive polling: long intervals within a track, short ones around its end
+    MIN_CHECK_INTERVAL = 1
+    MAX_CHECK_INTERVAL = 60
+    END_OF_TRACK_LEAD = 2
+    DEFAULT_TRANSITION_SECONDS = 2
+    # tracks prepared ahead, less than a group's sequence keeps
+    QUEUE_SIZE = PlayQueue.DEFAULT_SIZE
+    # tracks played before the current one, to skip back to
+    HISTORY_SIZE = 20
 
     _state: State
     _player: PlayerWrapper
     _media_server: MediaServer
     _scheduler: Scheduler
-
-    def __init__(self, player: PlayerWrapper, media_server: MediaServer, scheduler: Scheduler) -> None:
+    _poller: Poller | Scheduler
+    _deck: ShuffleDeck
+    _deck_search: dict
+    _listener: EventListener
+    _subscription: Subscription
+    _base_interval: int
+    _interval: float
+    _player_state: PlayerState
+    _transition_started: float
+    _transition_seconds: float
+    _commands: CommandQueue
+    _sequence: CandidateSequence
+    _sequence_position: int
+    _queue: PlayQueue
+    _current_track: QueuedTrack
+    _next_track: QueuedTrack
+    _history: deque[QueuedTrack]
+    _paused: _PausedSession
+
+    def __init__(self, player: PlayerWrapper, media_server: MediaServer, scheduler: Scheduler,
+                 listener: EventListener = None, poller: Poller = None) -> None:
         self._player = player
         self._media_server = media_server
         self._state: State = State()
         self._scheduler = scheduler
+        # the renderer's state is checked by a job of the poller, by one of the scheduler without
+        self._poller = poller if poller is not None else scheduler
+        # the shuffle order outlives the session, so pausing and playing the same again doesn't repeat tracks
+        self._deck = ShuffleDeck()
+        self._deck_search = None
+        # without a listener the renderer is polled only
+        self._listener = listener
+        self._subscription = None
+        # the interval without knowing the track, and the one currently scheduled
+        self._base_interval = self.DEFAULT_CHECK_INTERVAL
+        self._interval = self.DEFAULT_CHECK_INTERVAL
+        self._player_state = None
+        # learned per renderer: how long TRANSITIONING usually lasts
+        self._transition_started = None
+        self._transition_seconds = self.DEFAULT_TRANSITION_SECONDS
+        # everything talking to the renderer runs there, one at a time, on the poller's workers if polled by one
+        self._commands = CommandQueue(player.get_name(), poller.get_executor() if poller is not None else None)
+        # playing in a group: the items come from the group's sequence
+        self._sequence = None
+        self._sequence_position = 0
+        # the upcoming tracks, prepared in background
+        self._queue = PlayQueue(self.QUEUE_SIZE)
+        # the tracks told to the renderer, kept with their metadata to be played again without any work
+        self._current_track = None
+        self._next_track = None
+        self._history = deque(maxlen=self.HISTORY_SIZE)
+        # kept while paused, to resume without searching again
+        self._paused = None
 
     def _perform_media_search(self):
-        # do the searching stuff
-        search_args = {}
-        search_args['title'] = self._state.current_command.title
-        search_args['artist'] = self._state.current_command.artist
-        search_args['type'] = self._state.current_command.type
-
-        # remove None values (and it's keys) from dictionary
-        search_args_cleaned = {k: v for k, v in search_args.items() if v is not None}
+        search_args_cleaned = self._state.current_command.search_args()
+        if search_args_cleaned != self._deck_search:
+            self._deck = ShuffleDeck()
+            self._deck_search = search_args_cleaned
 
         # search the media server
         logger.debug(f"searching for {search_args_cleaned}")
@@ -53,29 +133,98 @@ class Integrator():
         logger.debug('Found {} items'.format(search_response.get_matches()))
         return search_response
 
+    def _track_source(self):
+        '''the source the play queue is filled from, None in url mode'''
+        if self._state.is_url_mode():
+            return None
+        if self._state.is_playlist_mode():
+            tracks = self._playlist_tracks(self._state.current_command.playlist, self._state.current_command.loop)
+            return lambda: next(tracks, None)
+        return self._search_track
+
+    def _search_track(self) -> QueuedTrack | None:
+        if self._state.search_response is None:
+            self._state.search_response = self._perform_media_search()
+        item = self._next_item()
+        return self._track(item.get_url(), item) if item is not None else None
+
+    def _playlist_tracks(self, entries: list[str], loop: bool):
+        while True:
+            found = False
+            for entry in entries:
+                if '://' in entry:
+                    yield self._track(entry, None)
+                    found = True
+                    continue
+                item = self._media_server.get_item(entry)
+                if item is None:
+                    logger.info(f"skipping {entry} of the playlist, not found")
+                    continue
+                yield self._track(item.get_url(), item)
+                found = True
+            # nothing found at all, would loop forever
+            if not loop or not found:
+                return
+
+    def _track(self, url: str, item) -> QueuedTrack:
+        metadata = self._player.get_dlna_player().render_metadata(item) if item is not None else None
+        return QueuedTrack(url, item, metadata)
+
+    def _prefetch(self):
+        try:
+            self._queue.fill()
+        except Exception as e:
+            # pop tries again when the track is needed
+            logger.info(f"preparing the tracks of {self._player.get_name()} failed", exc_info=e)
+
+    def _prefetch_later(self):
+        self._commands.submit(self._prefetch, BACKGROUND, key='prefetch')
+
+    def _has_next(self) -> bool:
+        '''whether another track follows the current one'''
+        if self._state.looping:
+            return True
+        return self._state.is_playlist_mode() and not self._queue.is_exhausted()
+
+    def _next_item(self):
+        if self._sequence is not None:
+            item = self._sequence.item(self._sequence_position)
+            self._sequence_position += 1
+            return item
+        # sampling responses fetch the item on demand, so it may vanish although counted before
+        if self._state.search_response.get_matches() > 0:
+            return self._state.search_response.random_item(self._deck)
+        return None
+
     def _next_track_is_current_track(self):
         # detected that the next track is beeing played and replaces the current track
+        self._remember_current(self._next_track)
         self._state.next_track_is_playing()
 
+    def _remember_current(self, track: QueuedTrack):
+        if self._current_track is not None:
+            self._history.append(self._current_track)
+        self._current_track = track
+        self._next_track = None
+
     def _set_next_track(self):
         logger.debug('set next track')
         if self._state.is_url_mode():
             # this mode always plays the same url
             self._player.get_dlna_player().set_next(self._state.current_command.url)
             self._state.next_play(self._state.current_command.url, None)
+            self._next_track = QueuedTrack(self._state.current_command.url, None, None)
             return
 
-        if self._state.search_response is None:
-            # this is super unlikely, as we already played one item in _play_next_track
-            logger.warning("Why don't we have a search_response, when setting next track?")
-            self._state.search_response = self._perform_media_search()
-
-        if (self._state.search_response.get_matches() > 0):
-            item = self._state.search_response.random_item()
-            url = item.get_url()
-
-            self._player.get_dlna_player().set_next(url, item=item)
-            self._state.next_play(url, item)
+        track = self._queue.pop()
+        if track is not None:
+            # prepared ahead, nothing left to do but telling the renderer
+            self._player.get_dlna_player().set_next(track.url, metadata_raw=track.metadata)
+            self._state.next_play(track.url, track.item)
+            self._next_track = track
+            self._prefetch_later()
+        elif self._state.is_playlist_mode():
+            logger.debug('playlist played to its end')
         else:
             # this is very unlikely, as we must have come across in the previous call to _play_next_track
             logger.warning("Why come here, we should have been ended privously")
@@ -86,28 +235,31 @@ class Integrator():
             # this mode always plays the same url
             logger.debug('playing without item')
             self._player.get_dlna_player().play(self._state.current_command.url)
+            self._remember_current(QueuedTrack(self._state.current_command.url, None, None))
             self._state.now_playing(self._state.current_command.url, None)
             if self._state.looping:
                 self._set_next_track()
             return  # early return since it's a simple play the URL mode.
 
-        if self._state.search_response is None:
-            self._state.search_response = self._perform_media_search()
-
-        if (self._state.search_response.get_matches() > 0):
-            item = self._state.search_response.random_item()
-            url = item.get_url()
-
-            self._player.get_dlna_player().play(url, item=item)
-            self._state.now_playing(url, item)
-            if self._state.looping:
+        track = self._queue.pop()
+        if track is not None:
+            self._player.get_dlna_player().play(track.url, metadata_raw=track.metadata)
+            self._remember_current(track)
+            self._state.now_playing(track.url, track.item)
+            if self._has_next():
                 self._set_next_track()
         else:
             self._end("nothing found in media server")
 
     def _initiate(self, s: State) -> StateView:
-        self._end("initiate new track")
+        # the subscription is kept for the new session
+        self._end_session("initiate new track")
         self._state = s
+        self._queue.reset(self._track_source())
+        self._current_track = None
+        self._next_track = None
+        self._history.clear()
+        self._paused = None
 
         self._play_next_track()
 
@@ -119,22 +271,22 @@ class Integrator():
                 return
 
             if RUNNING_STATE.RUNNING_CURRENT == run_state:
-                if self._state.looping and next_state == NEXT_MEDIA_STATE.UNSET:
+                if next_state == NEXT_MEDIA_STATE.UNSET and self._has_next():
                     self._set_next_track()
                 return
 
             if RUNNING_STATE.RUNNING_NEXT == run_state:
-                if self._state.looping:
-                    self._next_track_is_current_track()
-                    self._set_next_track()
-                else:
+                if not self._state.looping and not self._state.is_playlist_mode():
                     raise ValueError('What the hack happened, not looping but next track detected?')
+                self._next_track_is_current_track()
+                if self._has_next():
+                    self._set_next_track()
 
             if RUNNING_STATE.STOPPED == run_state:
-                if self._state.looping:
+                if self._has_next():
                     self._play_next_track()
                 else:
-                    self._end("not looping")
+                    self._end("end of playlist" if self._state.is_playlist_mode() else "not looping")
 
             if RUNNING_STATE.UNKNOWN == run_state:
                 logger.info("unable to determine running state - skipping")
@@ -144,14 +296,36 @@ class Integrator():
             # reset inner state
             self._end("exception in looping: " + str(e))
             raise e
+        finally:
+            if self._state.running:
+                self._adapt_check_interval()
+
+    def _poll(self):
+        '''runs on the poller: the renderer is queried behind interactive commands, never alongside them'''
+        if not self._state.running:
+            return
+        self._commands.submit(self._poll_if_running, BACKGROUND, key='poll')
+
+    def _poll_if_running(self):
+        # ended while the poll was queued
+        if self._state.running:
+            self._loop_process()
 
     def _end(self, reason: str):
+        self._end_session(reason)
+        # nothing to be notified about until played again
+        self._cancel_subscription()
+
+    def _end_session(self, reason: str):
         logger.debug(f"ending integrator due to {reason}")
-        self._scheduler.stop_job(self._scheduler_name())
+        self._poller.stop_job(self._scheduler_name())
         self._state.stop(reason)
+        self._queue.reset()
 
     def _check_running(self) -> Tuple[RUNNING_STATE, NEXT_MEDIA_STATE]:
         player_state = self._player.get_dlna_player().get_state()
+        self._observe_transition(player_state.transport_state)
+        self._player_state = player_state
 
         transport_state = player_state.transport_state
         currently_played_url = player_state.current_url
@@ -201,25 +375,178 @@ class Integrator():
                 logger.debug('Found renderer running unknown track')
                 return [RUNNING_STATE.INTERRUPTED, None]
 
+    def _observe_transition(self, transport_state: TRANSPORT_STATE):
+        now = monotonic()
+        if transport_state is TRANSPORT_STATE.TRANSITIONING:
+            if self._transition_started is None:
+                self._transition_started = now
+            return
+        if self._transition_started is not None:
+            # polled, so it's an upper bound - smoothed over the recent transitions
+            took = now - self._transition_started
+            self._transition_seconds = 0.7 * self._transition_seconds + 0.3 * took
+            self._transition_started = None
+            logger.debug(f"{self._player.get_name()} was transitioning for {took:.1f}s, "
+                         f"usually {self._transition_seconds:.1f}s")
+
+    def _next_check_interval(self, player_state: PlayerState) -> float:
+        if player_state is None:
+            return self._base_interval
+        if player_state.transport_state is TRANSPORT_STATE.TRANSITIONING and self._transition_started is not None:
+            expected = self._transition_seconds - (monotonic() - self._transition_started)
+            return round(max(self.MIN_CHECK_INTERVAL, expected), 1)
+        if player_state.transport_state is TRANSPORT_STATE.PLAYING and player_state.track_duration \
+                and player_state.rel_time is not None:
+            remaining = player_state.track_duration - player_state.rel_time
+            if remaining > self.END_OF_TRACK_LEAD + self.MIN_CHECK_INTERVAL:
+                # just before the end, but not longer than the maximum
+                return round(min(remaining - self.END_OF_TRACK_LEAD, self.MAX_CHECK_INTERVAL), 1)
+            # right after the end
+            return round(max(self.MIN_CHECK_INTERVAL, remaining + self.MIN_CHECK_INTERVAL), 1)
+        return self._base_interval
+
+    def _adapt_check_interval(self):
+        interval = self._next_check_interval(self._player_state)
+        if interval != self._interval and self._poller.reschedule_job(self._scheduler_name(), interval):
+            self._interval = interval
+
     def _validate_state(self, s: State):
-        if s.current_command.title is None and s.current_command.artist is None and s.current_command.url is None:
+        c = s.current_command
+        if c.title is None and c.artist is None and c.url is None and not c.playlist:
+            raise RequestInvalidException()
+        if c.playlist is not None and (not isinstance(c.playlist, list) or not all(isinstance(e, str) for e in c.playlist)):
             raise RequestInvalidException()
 
     def _scheduler_name(self):
         return "Media_Observer_" + self._player.get_name()
 
+    def _renewal_name(self):
+        return "Event_Renewal_" + self._player.get_name()
+
+    def _choose_base_interval(self) -> int:
+        if self._listener is not None and self._ensure_subscription():
+            return self.EVENT_FALLBACK_INTERVAL
+        return self.DEFAULT_CHECK_INTERVAL
+
+    def _ensure_subscription(self) -> bool:
+        if self._subscription is not None and self._subscription.is_active():
+            return True
+        callback_url = None
+        try:
+            event_url = self._player.get_dlna_player().get_event_url()
+            callback_url = self._listener.register(event_url, self._on_event)
+            subscription = Subscription(event_url, callback_url, request_timeout=self._player.get_timeout())
+            subscription.subscribe()
+        except Exception as e:
+            logger.info(f"no events from {self._player.get_name()}, polling instead", exc_info=e)
+            if callback_url is not None:
+                self._listener.unregister(callback_url)
+            return False
+        self._subscription = subscription
+        self._scheduler.stop_job(self._renewal_name())
+        self._scheduler.start_job(self._renewal_name(), self._renew, self._renewal_interval(subscription.get_timeout()))
+        return True
+
+    def _renewal_interval(self, timeout: int) -> float:
+        half = timeout * 0.5
+        return min(max(half, self.RENEWAL_MIN_INTERVAL), max(timeout - self.RENEWAL_MARGIN, half))
+
+    def _renew(self):
+        self._commands.submit(self._renew_subscription, BACKGROUND, key='renew')
+
+    def _renew_subscription(self):
+        if self._subscription is None:
+            # cancelled while the renewal was queued
+            return
+        try:
+            self._subscription.renew()
+        except Exception as e:
+            logger.info(f"renewing the subscription of {self._player.get_name()} failed", exc_info=e)
+            self._cancel_subscription()
+            if self._state.running:
+                # e.g. the renderer restarted: subscribe again or fall back to polling
+                self._poller.stop_job(self._scheduler_name())
+                self._base_interval = self._choose_base_interval()
+                self._interval = self._base_interval
+                self._poller.start_job(self._scheduler_name(), self._poll, self._interval)
+
+    def _cancel_subscription(self):
+        if self._subscription is None:
+            return
+        subscription, self._subscription = self._subscription, None
+        self._scheduler.stop_job(self._renewal_name())
+        self._listener.unregister(subscription.get_callback_url())
+        subscription.unsubscribe()
+
+    def _on_event(self, values: dict[str, str]):
+        logger.debug(f"event from {self._player.get_name()}: {values}")
+        if 'TransportState' in values:
+            # a play command may wait for it
+            self._player.get_dlna_player().on_transport_state(values['TransportState'])
+        if self._state.running and self.EVENT_VARIABLES.intersection(values):
+            self._poller.run_job_now(self._scheduler_name())
+
     # external methods
 
-    def play(self, command: PlayCommand) -> StateView:
+    def play(self, command: PlayCommand, sequence: CandidateSequence = None) -> StateView:
+        # quick successive commands of the same kind: only the last one queued is executed,
+        # different ones, e.g. a pause and a resume, all run
+        return self._commands.call(lambda: self._play(command, sequence), INTERACTIVE, key='play')
+
+    def submit_play(self, command: PlayCommand, sequence: CandidateSequence = None) -> Future:
+        '''like play, without waiting: playing on several renderers at once'''
+        return self._commands.submit(lambda: self._play(command, sequence), INTERACTIVE, key='play')
+
+    def pause(self) -> StateView:
+        return self._commands.call(self._pause, INTERACTIVE, key='pause')
+
+    def resume(self) -> StateView:
+        return self._commands.call(self._resume, INTERACTIVE, key='resume')
+
+    def stop(self) -> StateView:
+        return self._commands.call(self._stop, INTERACTIVE, key='stop')
+
+    def next_track(self) -> StateView:
+        '''skips to the prepared next track'''
+        # not coalesced, each skip counts
+        return self._commands.call(self._skip_next, INTERACTIVE)
+
+    def previous_track(self) -> StateView:
+        '''skips back to the track played before'''
+        return self._commands.call(self._skip_previous, INTERACTIVE)
+
+    def get_state(self) -> StateView:
+        return self._state.view()
+
+    def is_paused(self) -> bool:
+        '''whether a paused session can be resumed'''
+        return self._paused is not None
+
+    def get_play_queue(self) -> QueueView:
+        return self._state.queue_view([track_view(t.url, t.item) for t in self._queue.peek()])
+
+    def get_queue_info(self) -> dict:
+        return dict(self._commands.get_info(), play_queue=self._queue.get_info())
+
+    def _play(self, command: PlayCommand, sequence: CandidateSequence = None) -> StateView:
         logger.debug('play called')
         s: State = State()
         s.command(command)
+        self._sequence = sequence
+        self._sequence_position = 0
+        if sequence is not None:
+            # searched once for the whole group
+            s.search_response = sequence.get_search_response()
 
         self._validate_state(s)
         try:
+            # subscribed before, so the renderer's events tell already when it accepted the first track
+            self._base_interval = self._choose_base_interval()
             self._initiate(s)
             logger.debug(f"current state {self._state.running} with count {self._state.played_count}")
-            self._scheduler.start_job(self._scheduler_name(), self._loop_process, self.DEFAULT_CHECK_INTERVAL)
+            self._player_state = None
+            self._interval = self._base_interval
+            self._poller.start_job(self._scheduler_name(), self._poll, self._interval)
         except Exception as e:
             logger.info('error while playing', exc_info=e)
             # reset inner state
@@ -227,8 +554,60 @@ class Integrator():
             raise e
         return self._state.view()
 
-    def pause(self) -> StateView:
+    def _skip_next(self) -> StateView:
+        logger.debug('next called')
+        self._ensure_running()
+        # the one prepared, otherwise the following one of the same search or playlist
+        track = self._next_track if self._next_track is not None else self._queue.pop()
+        if track is None:
+            raise RequestCannotBeHandeledException(f"Nothing to skip to on {self._player.get_name()}")
+        self._skip_to(track)
+        return self._state.view()
+
+    def _skip_previous(self) -> StateView:
+        logger.debug('previous called')
+        self._ensure_running()
+        if not self._history:
+            raise RequestCannotBeHandeledException(f"No previous track on {self._player.get_name()}")
+        track = self._history.pop()
+        if not self._state.is_url_mode():
+            # these are played after it again
+            for t in (self._next_track, self._current_track):
+                if t is not None:
+                    self._queue.push_front(t)
+        self._current_track = None
+        self._skip_to(track)
+        return self._state.view()
+
+    def _ensure_running(self):
+        if not self._state.running:
+            raise RequestCannotBeHandeledException(f"Nothing is playing on {self._player.get_name()}")
+
+    def _skip_to(self, track: QueuedTrack):
+        # the renderer keeps running and the observer job goes on, just the track changes
+        try:
+            self._player.get_dlna_player().play(track.url, metadata_raw=track.metadata)
+            self._remember_current(track)
+            self._state.next_play(None, None)
+            self._state.now_playing(track.url, track.item)
+            self._player_state = None
+            if self._has_next():
+                self._set_next_track()
+            # the interval fitted the former track
+            self._adapt_check_interval()
+        except Exception as e:
+            logger.info('error while skipping', exc_info=e)
+            # reset inner state
+            self._end("exception in skip: " + str(e))
+            raise e
+
+    def _pause(self) -> StateView:
         logger.debug('pause called')
+        session = None
+        if self._state.running:
+            # ending resets the state and the queue, they are kept as they are
+            session = _PausedSession(copy.copy(self._state), self._queue, None)
+            self._queue = PlayQueue(self.QUEUE_SIZE)
         self._end("pause invoked")
         try:
             self._player.get_dlna_player().pause()
@@ -236,10 +615,63 @@ class Integrator():
             # reset inner state
             self._end("exception in pause: " + str(e))
             raise e
+        if session is not None:
+            session.rel_time = self._position()
+            self._paused = session
         return self._state.view()
 
-    def stop(self) -> StateView:
+    def _position(self) -> float | None:
+        try:
+            return self._player.get_dlna_player().get_state().rel_time
+        except Exception as e:
+            logger.info(f"position of {self._player.get_name()} unknown, resuming from the start", exc_info=e)
+            return None
+
+    def _resume(self) -> StateView:
+        logger.debug('resume called')
+        session = self._paused
+        if session is None or self._current_track is None:
+            raise RequestCannotBeHandeledException(f"Nothing paused on {self._player.get_name()}")
+        self._paused = None
+        self._state = session.state
+        self._queue = session.queue
+        track = self._current_track
+        try:
+            dlna = self._player.get_dlna_player()
+            self._base_interval = self._choose_base_interval()
+            player_state = dlna.get_state()
+            if player_state.transport_state is TRANSPORT_STATE.PAUSED_PLAYBACK and player_state.current_url == track.url:
+                dlna.resume()
+            else:
+                # the renderer dropped it, e.g. it was in standby meanwhile
+                logger.debug(f"{self._player.get_name()} lost the paused track, playing it again")
+                dlna.play(track.url, metadata_raw=track.metadata)
+                self._seek(session.rel_time)
+                if self._next_track is not None:
+                    dlna.set_next(self._next_track.url, metadata_raw=self._next_track.metadata)
+            self._player_state = None
+            self._interval = self._base_interval
+            self._poller.start_job(self._scheduler_name(), self._poll, self._interval)
+            self._prefetch_later()
+        except Exception as e:
+            logger.info('error while resuming', exc_info=e)
+            # reset inner state
+            self._end("exception in resume: " + str(e))
+            raise e
+        return self._state.view()
+
+    def _seek(self, rel_time: float):
+        if not rel_time:
+            return
+        try:
+            self._player.get_dlna_player().seek(rel_time)
+        except Exception as e:
+            # not all renderers can seek, the track still plays
+            logger.info(f"seeking on {self._player.get_name()} failed, playing from the start", exc_info=e)
+
+    def _stop(self) -> StateView:
         logger.debug('stop called')
+        self._paused = None
         self._end("stop invoked")
         try:
             self._player.get_dlna_player().stop()
@@ -248,6 +680,3 @@ class Integrator():
             self._end("exception in stop: " + str(e))
             raise e
         return self._state.view()
-
-    def get_state(self) -> StateView:
-        return self._state.view()
@@ -0,0 +1,107 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+
+from dlna.items import Item
+
+logger = logging.getLogger(__file__)
+
+
+@dataclass
+class QueuedTrack():
+    url: str
+    item: Item
+    # rendered DIDL-Lite, None if the renderer gets no metadata
+    metadata: str
+
+
+class PlayQueue():
+    '''Bounded ring of a renderer's upcoming tracks, resolved ahead of time:
+    drawing or looking up the item and rendering its metadata happens in fill, while a track plays.
+    Handing the next track to the renderer then only takes it from the ring.
+    The tracks come from a source, which returns None when there are no more.
+    It is drawn from one at a time, so the tracks keep the source's order whoever draws.
+    '''
+
+    DEFAULT_SIZE = 3
+
+    _tracks: deque[QueuedTrack]
+    _source: Callable[[], QueuedTrack | None]
+
+    def __init__(self, size: int = DEFAULT_SIZE):
+        if size < 1:
+            raise ValueError(f"Invalid size {str(size)}")
+        self._size = size
+        # bounded by fill, put back tracks may exceed it
+        self._tracks = deque()
+        self._source = None
+        self._exhausted = False
+        self._lock = threading.Lock()
+        self._drawing = threading.Lock()
+        self._stats = {'prefetched': 0, 'hits': 0, 'misses': 0}
+
+    def reset(self, source: Callable[[], QueuedTrack | None] = None):
+        '''drops the prepared tracks, the following ones come from source'''
+        with self._drawing, self._lock:
+            self._tracks.clear()
+            self._source = source
+            self._exhausted = False
+
+    def pop(self) -> QueuedTrack | None:
+        '''the next track, resolved right now if it was not prepared (yet)'''
+        with self._lock:
+            if self._tracks:
+                self._stats['hits'] += 1
+                return self._tracks.popleft()
+        with self._drawing:
+            with self._lock:
+                # prepared while waiting
+                if self._tracks:
+                    self._stats['hits'] += 1
+                    return self._tracks.popleft()
+                if self._source is None or self._exhausted:
+                    return None
+                self._stats['misses'] += 1
+            return self._draw()
+
+    def push_front(self, track: QueuedTrack):
+        '''puts a track back, it is popped next'''
+        with self._lock:
+            self._tracks.appendleft(track)
+
+    def fill(self):
+        '''prepares tracks until the ring is full or the source has no more'''
+        while True:
+            with self._drawing:
+                with self._lock:
+                    if len(self._tracks) >= self._size or self._source is None or self._exhausted:
+                        return
+                track = self._draw()
+                if track is None:
+                    return
+                with self._lock:
+                    self._tracks.append(track)
+                    self._stats['prefetched'] += 1
+
+    def _draw(self) -> QueuedTrack | None:
+        track = self._source()
+        if track is None:
+            logger.debug('no more tracks')
+            with self._lock:
+                self._exhausted = True
+        return track
+
+    def is_exhausted(self) -> bool:
+        '''the source has no more tracks and the prepared ones are taken'''
+        with self._lock:
+            return self._exhausted and not self._tracks
+
+    def peek(self) -> list[QueuedTrack]:
+        with self._lock:
+            return list(self._tracks)
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return dict(self._stats, queued=len(self._tracks), size=self._size)
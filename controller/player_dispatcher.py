@@ -4,12 +4,15 @@ import logging
 from controller.player_wrapper import PlayerWrapper
 from controller.player_manager import PlayerManager
 from controller.scheduler import Scheduler
+from controller.poller import Poller
 from dlna.mediaserver import MediaServer
 from controller.integrator import Integrator
+from controller.candidate_sequence import CandidateSequence
 from controller.data.command import PlayCommand, Command
 from controller.data.exceptions import RequestCannotBeHandeledException
-from controller.data.state import StateView
+from controller.data.state import StateView, QueueView
 from controller.wakeup import ensure_online
+from dlna.eventing import EventListener
 
 
 logger = logging.getLogger(__file__)
@@ -27,6 +30,12 @@ class StatePerPlayer():
     state: StateView
 
 
+@dataclass
+class QueuePerPlayer():
+    player_name: str
+    queue: QueueView
+
+
 class PlayerDispatcher:
     '''Player dispatcher dispatches calls to players
     based on:
@@ -35,18 +44,28 @@ class PlayerDispatcher:
     * is the player capable of handling the format (audio/video)
 
     as a default the first player is chosen.
+
+    A target naming a configured group, or a list of targets, plays on all of them:
+    searched once, started in parallel and continued with the same tracks.
     '''
 
     _players_to_integrators: list[Mapping]
     _player_manager: PlayerManager
     _media_server: MediaServer
     _scheduler: Scheduler
+    _listener: EventListener
+    _groups: dict[str, list[str]]
+    _poller: Poller
 
-    def __init__(self, player_manager, media_server, scheduler) -> None:
+    def __init__(self, player_manager, media_server, scheduler, listener: EventListener = None,
+                 groups: dict[str, list[str]] = None, poller: Poller = None) -> None:
         self._players_to_integrators = []
+        self._groups = groups or {}
+        self._poller = poller
         self._player_manager = player_manager
         self._media_server = media_server
         self._scheduler = scheduler
+        self._listener = listener
 
     def _player_from_target(self, target: str) -> PlayerWrapper | None:
         if target:
@@ -60,7 +79,7 @@ class PlayerDispatcher:
             if m.player == player:
                 return m.integrator
 
-        i = Integrator(player, self._media_server, self._scheduler)
+        i = Integrator(player, self._media_server, self._scheduler, self._listener, self._poller)
         mapping = Mapping(player, i)
         self._players_to_integrators.append(mapping)
         return i
@@ -68,11 +87,48 @@ class PlayerDispatcher:
     def _player_available(self, player: PlayerWrapper) -> bool:
         if not player:
             return False
+        if player.is_circuit_open():
+            # fail fast instead of waiting for timeouts or waking it up
+            logger.debug(f"Player {player.get_name()} is not responding")
+            return False
         if not ensure_online(player):
             logger.debug(f"Player {player.get_name()} not online")
             return False
         return True
 
+    def _group_players(self, command: Command) -> list[PlayerWrapper] | None:
+        target = getattr(command, 'target', None)
+        if isinstance(target, str) and target in self._groups:
+            names = self._groups[target]
+        elif isinstance(target, (list, tuple)):
+            names = target
+        else:
+            return None
+
+        players = []
+        for name in names:
+            player = self._player_from_target(name)
+            if player is None:
+                msg = f"The requested player {name} is unknown"
+                logger.error(msg)
+                raise RequestCannotBeHandeledException(msg)
+            if player not in players:
+                players.append(player)
+        return players
+
+    def _decide_group(self, command: Command) -> list[Mapping] | None:
+        players = self._group_players(command)
+        if players is None:
+            return None
+
+        # the others play anyway
+        available = [p for p in players if self._player_available(p)]
+        if not available:
+            msg = f"None of the requested players {command.target} is available"
+            logger.error(msg)
+            raise RequestCannotBeHandeledException(msg)
+        return [Mapping(p, self._get_or_create_integrator(p)) for p in available]
+
     def _decide_integrator_by_target(self, command: Command) -> Integrator | None:
         if hasattr(command, 'target'):
             player = self._player_from_target(command.target)
@@ -109,30 +165,112 @@ class PlayerDispatcher:
         raise RequestCannotBeHandeledException(msg)
 
     def play(self, command: PlayCommand):
+        group = self._decide_group(command)
+        if group is not None:
+            return self._play_group(command, group)
         i = self._decide_integrator(command)
         return i.play(command)
 
+    def _play_group(self, command: PlayCommand, group: list[Mapping]) -> list[StatePerPlayer]:
+        sequence = None
+        if not command.url and not command.playlist:
+            # one search for all of them
+            sequence = CandidateSequence(self._media_server.search(**command.search_args()))
+        # started in parallel, as many at a time as the poller has workers
+        futures = {m.player.get_name(): m.integrator.submit_play(command, sequence) for m in group}
+        return self._on_group(group, lambda m: futures[m.player.get_name()].result())
+
+    def _on_group(self, group: list[Mapping], fn) -> list[StatePerPlayer]:
+        '''the states of the group's players fn succeeded for, raises if it failed for all'''
+        res = []
+        error = None
+        for m in group:
+            try:
+                res.append(StatePerPlayer(m.player.get_name(), fn(m)))
+            except Exception as e:
+                logger.info(f"Player {m.player.get_name()} of the group failed", exc_info=e)
+                error = error or e
+        if not res:
+            raise error
+        return res
+
     def pause(self, command: Command):
+        group = self._decide_group(command)
+        if group is not None:
+            return self._on_group(group, lambda m: m.integrator.pause())
         i = self._decide_integrator(command)
         return i.pause()
 
+    def resume(self, command: Command):
+        # on the players holding a paused session, the others are left alone
+        return self._on_active(command, lambda i: i.resume(), lambda i: i.is_paused(), 'paused')
+
     def stop(self, command: Command):
+        group = self._decide_group(command)
+        if group is not None:
+            return self._on_group(group, lambda m: m.integrator.stop())
         i = self._decide_integrator(command)
         return i.stop()
 
-    def state(self, command: Command = None):
+    def next_track(self, command: Command):
+        return self._skip(command, lambda i: i.next_track())
+
+    def previous_track(self, command: Command):
+        return self._skip(command, lambda i: i.previous_track())
+
+    def _skip(self, command: Command, fn):
+        return self._on_active(command, fn, lambda i: i.get_state().running, 'playing')
+
+    def _on_active(self, command: Command, fn, active, doing: str):
+        '''on the players playing or paused already, they are neither woken up nor searched for'''
+        players = self._group_players(command)
+        if players is not None:
+            group = [m for m in self._players_to_integrators if m.player in players]
+            if not group:
+                msg = f"None of the requested players {command.target} is {doing}"
+                logger.error(msg)
+                raise RequestCannotBeHandeledException(msg)
+            return self._on_group(group, lambda m: fn(m.integrator))
+        return fn(self._active_integrator(command, active, doing))
+
+    def _active_integrator(self, command: Command, active, doing: str) -> Integrator:
+        target = getattr(command, 'target', None)
+        if target:
+            player = self._player_from_target(target)
+            if player is None:
+                msg = f"The requested player {target} is unknown"
+                logger.error(msg)
+                raise RequestCannotBeHandeledException(msg)
+            candidates = [m for m in self._players_to_integrators if m.player == player]
+        else:
+            candidates = [m for m in self._players_to_integrators if active(m.integrator)]
+        if not candidates:
+            msg = f"No player is {doing}"
+            logger.error(msg)
+            raise RequestCannotBeHandeledException(msg)
+        return candidates[0].integrator
+
+    def get_queue_info(self) -> dict:
+        '''command queue depth and wait times per renderer'''
+        return {m.player.get_name(): m.integrator.get_queue_info() for m in self._players_to_integrators}
+
+    def _used(self, command: Command) -> list[Mapping]:
+        # the group's players used so far
+        players = self._group_players(command)
+        if players is not None:
+            return [m for m in self._players_to_integrators if m.player in players]
 
         # single result
         by_target = self._decide_integrator_by_target(command)
         if (by_target):
-            for m in self._players_to_integrators:
-                if by_target == m.integrator:
-                    return [StatePerPlayer(m.player.get_name(), m.integrator.get_state())]
+            return [m for m in self._players_to_integrators if by_target == m.integrator]
 
-        # state over all players used
-        res = []
-        for m in self._players_to_integrators:
-            s = StatePerPlayer(m.player.get_name(), m.integrator.get_state())
-            res.append(s)
+        # all players used
+        return list(self._players_to_integrators)
 
-        return res
+    def state(self, command: Command = None):
+        return [StatePerPlayer(m.player.get_name(), m.integrator.get_state()) for m in self._used(command)]
+
+    def queue(self, command: Command = None):
+        '''the tracks played now, next and after on each player'''
+        return [QueuePerPlayer(m.player.get_name(), m.integrator.get_play_queue()) for m in self._used(command)]
@@ -1,8 +1,10 @@
 import logging
 from typing import Dict
+from concurrent.futures import Executor
 
 from controller.scheduler import Scheduler
 from controller.player_wrapper import PlayerWrapper, discover, configure
+from dlna.description_cache import DescriptionCache
 
 logger = logging.getLogger(__file__)
 
@@ -20,9 +22,14 @@ class PlayerManager():
 
     _players: list[PlayerWrapper] = []
     _scheduler: Scheduler = None
+    _description_cache: DescriptionCache = None
+    _state_executor: Executor = None
 
-    def __init__(self, configs: dict, scheduler: Scheduler):
-        self._players = [configure(config) for config in configs]
+    def __init__(self, configs: dict, scheduler: Scheduler, description_cache: DescriptionCache = None,
+                 state_executor: Executor = None):
+        self._description_cache = description_cache
+        self._state_executor = state_executor
+        self._players = [configure(config, description_cache, state_executor) for config in configs]
         self._scheduler = scheduler
         self._scheduler.start_job('PLAYER_DISCOVERY', self._run_discovery, self.DEFAULT_DISCOVERY_INTERVAL, immediate=True)
 
@@ -33,7 +40,7 @@ class PlayerManager():
         return [p.to_view() for p in self._players]
 
     def _run_discovery(self):
-        discovered_players = discover()
+        discovered_players = discover(self._description_cache, self._state_executor)
 
         # for each newly discovered device we need to find an already existing one
         new_playerwrappers: list[PlayerWrapper] = []  # list of newly (previously unknown) devices
@@ -1,10 +1,15 @@
 from datetime import datetime
 import logging
+from concurrent.futures import Executor
 from dataclasses import dataclass, field, asdict
 
 import upnpclient
 
 from dlna.player import Player
+from dlna import upnp_control
+from dlna import ssdp
+from dlna.description_cache import DescriptionCache
+from dlna.call_policy import CallPolicy
 
 logger = logging.getLogger(__file__)
 
@@ -19,7 +24,14 @@ class PlayerMetadata():
     url: str = None
     mac: str = None
     capabilities: list[str] = field(default_factory=list)
-    send_metadata: bool = True
+    # a flag or the name of a metadata profile, see dlna.metadata
+    send_metadata: bool | str = True
+    # seconds the renderer may take to accept a new URI
+    accept_timeout: float = None
+    # arguments of dlna.call_policy.CallPolicy, e.g. connect_timeout, read_timeout, retries, failure_threshold
+    call_policy: dict = None
+    # the configId announced when discovered, changes with the device description
+    config_id: str = None
 
 
 class PlayerWrapper():
@@ -35,7 +47,13 @@ class PlayerWrapper():
     _last_seen: datetime = None
     _dlna_player: Player = None
 
+    # discovery only, playing is controlled by the lightweight upnp_control.Device
     _upnp_device: upnpclient.Device = None
+    _control_device: upnp_control.Device = None
+    _description_cache: DescriptionCache = None
+    _call_policy: CallPolicy = None
+    # get_state's queries are sent on this pool shared by all players, one after another without
+    _state_executor: Executor = None
 
     def _get_attr_preferred(self, attr):
         if self._configured_meta is not None and getattr(self._configured_meta, attr) is not None:
@@ -84,7 +102,7 @@ class PlayerWrapper():
     def get_mac(self) -> str:
         return self._get_attr_preferred('mac')
 
-    def include_metadata(self) -> bool:
+    def include_metadata(self) -> bool | str:
         return self._get_attr_preferred('send_metadata')
 
     def get_url(self) -> str:
@@ -96,39 +114,76 @@ class PlayerWrapper():
     def get_dlna_player(self) -> Player:
         if self._dlna_player is None:
             # ensure device
-            if self._upnp_device is None:
-                self._upnp_device = upnpclient.Device(self.get_url())
-            self._dlna_player = Player(self._upnp_device, self.include_metadata())
+            if self._control_device is None:
+                url = self.get_url()
+                timeout = self._call_policy.get_timeout()
+                description = None
+                if self._description_cache is not None:
+                    description = self._description_cache.get(url, self._get_attr_preferred('config_id'),
+                                                              on_change=self._on_description_change, timeout=timeout)
+                self._control_device = upnp_control.Device(url, description, timeout)
+            accept_timeout = self._get_attr_preferred('accept_timeout') or Player.DEFAULT_ACCEPT_TIMEOUT
+            self._dlna_player = Player(self._control_device, self.include_metadata(), concurrent=True,
+                                       change_aware=True, accept_timeout=accept_timeout, policy=self._call_policy,
+                                       executor=self._state_executor)
         return self._dlna_player
 
+    def get_timeout(self) -> tuple[float, float]:
+        '''(connect, read) timeout of the calls to the renderer'''
+        return self._call_policy.get_timeout()
+
+    def is_circuit_open(self) -> bool:
+        '''whether the renderer is known to be unresponsive right now'''
+        return self._call_policy.is_open()
+
+    def _on_description_change(self, description: bytes):
+        if self._control_device is not None:
+            self._control_device.update(description)
+
     def to_view(self):
         return {
             'configured_meta': asdict(self._configured_meta) if self._configured_meta is not None else None,
             'detected_meta': asdict(self._detected_meta) if self._detected_meta is not None else None,
-            'last_seen': self._last_seen.isoformat() if self._last_seen is not None else None
+            'last_seen': self._last_seen.isoformat() if self._last_seen is not None else None,
+            'statistics': self._dlna_player.get_statistics() if self._dlna_player is not None else None,
+            'call_policy': self._call_policy.get_info()
         }
 
 
-def _discover_players() -> list[upnpclient.Device]:
-    all_devices = upnpclient.discover()
-
-    for d in all_devices:
+def _discover_players() -> list[tuple[upnpclient.Device, str]]:
+    '''the renderers found, with the configId each announced'''
+    all_devices = []
+    for location, config_id in ssdp.search().items():
+        try:
+            d = upnpclient.Device(location)
+        except Exception as e:
+            logger.debug(f"ignoring device at {location}", exc_info=e)
+            continue
         logger.debug(f"discovered device {d}")
+        all_devices.append((d, config_id))
 
     def has_av_transport_service(d):
         for s in d.services:
             if 'AVTransport' == s.name:
                 return True
         return False
-    return list(filter(has_av_transport_service, all_devices))
+    return [(d, config_id) for d, config_id in all_devices if has_av_transport_service(d)]
+
+
+def _query_protocol_info(device: upnpclient.Device, policy: CallPolicy) -> dict:
+    # upnpclient's calls have no timeout of their own
+    service = device.ConnectionManager
+    client = upnp_control.ServiceClient(service.service_type, service.find_action('GetProtocolInfo').url,
+                                        timeout=policy.get_timeout())
+    return policy.call(client.GetProtocolInfo, idempotent=True)
 
 
-def _detect_capabilities(device: upnpclient.Device):
+def _detect_capabilities(device: upnpclient.Device, policy: CallPolicy):
     detected_capabilities = []
     for a in device.actions:
         if 'GetProtocolInfo' in str(a):
             logger.debug('can query for capabilities')
-            res = device.ConnectionManager.GetProtocolInfo()
+            res = _query_protocol_info(device, policy)
             if 'audio' in res['Sink']:
                 detected_capabilities.append('audio')
             if 'video' in res['Sink']:
@@ -138,36 +193,47 @@ def _detect_capabilities(device: upnpclient.Device):
     return detected_capabilities
 
 
-def _create_configured(config: dict) -> 'PlayerWrapper':
+def _create_configured(config: dict, description_cache: DescriptionCache = None,
+                       state_executor: Executor = None) -> 'PlayerWrapper':
     configured_meta = PlayerMetadata(**config)
     pw = PlayerWrapper()
+    pw._call_policy = CallPolicy(**(configured_meta.call_policy or {}))
     pw._last_seen = None
     pw._configured_meta = configured_meta
     pw._detected_meta = None
     pw._upnp_device = None
+    pw._control_device = None
+    pw._description_cache = description_cache
+    pw._state_executor = state_executor
     pw._dlna_player = None
     return pw
 
 
-def _create_discovered(device: upnpclient.Device) -> 'PlayerWrapper':
+def _create_discovered(device: upnpclient.Device, description_cache: DescriptionCache = None,
+                       state_executor: Executor = None, config_id: str = None) -> 'PlayerWrapper':
+    policy = CallPolicy()
     discovered_meta = PlayerMetadata(name=device.friendly_name, url=device.location, id=device.udn,
-                                     capabilities=_detect_capabilities(device))
+                                     capabilities=_detect_capabilities(device, policy), config_id=config_id)
     pw = PlayerWrapper()
+    pw._call_policy = policy
     pw._last_seen = datetime.now()
     pw._configured_meta = None
     pw._detected_meta = discovered_meta
     pw._upnp_device = device
+    pw._control_device = None
+    pw._description_cache = description_cache
+    pw._state_executor = state_executor
     pw._dlna_player = None
     return pw
 
 
-def discover() -> list[PlayerWrapper]:
+def discover(description_cache: DescriptionCache = None, state_executor: Executor = None) -> list[PlayerWrapper]:
     devices = _discover_players()
     res = []
-    for d in devices:
-        res.append(_create_discovered(d))
+    for d, config_id in devices:
+        res.append(_create_discovered(d, description_cache, state_executor, config_id))
     return res
 
 
-def configure(config) -> PlayerWrapper:
-    return _create_configured(config)
+def configure(config, description_cache: DescriptionCache = None, state_executor: Executor = None) -> PlayerWrapper:
+    return _create_configured(config, description_cache, state_executor)
@@ -0,0 +1,15 @@
+from controller.scheduler import HeapScheduler
+
+
+class Poller(HeapScheduler):
+    '''Triggers the state checks of all renderers from a single thread instead of a scheduler job each.
+    The checks due at about the same time are triggered as one batch on a fixed pool of threads,
+    the renderers themselves are queried on their command queues, which run on the same threads, one command
+    at a time each. So hundreds of renderers don't need hundreds of threads. Offers the job methods of the Scheduler.
+    '''
+
+    DEFAULT_WORKERS = 8
+    THREAD_NAME = 'Poller'
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, resolution: float = HeapScheduler.DEFAULT_RESOLUTION):
+        super().__init__(workers, resolution)
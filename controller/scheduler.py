@@ -1,19 +1,25 @@
+import heapq
 import logging
 import datetime
-
-from apscheduler.triggers.interval import IntervalTrigger
-from apscheduler.schedulers.blocking import BlockingScheduler, BaseScheduler
-from apscheduler.schedulers.background import BackgroundScheduler
+import threading
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__file__)
 
+BUILTIN = 'builtin'
+APSCHEDULER = 'apscheduler'
+
 
 class Scheduler():
+    '''Interval jobs by name on APScheduler, imported only when this backend is used'''
 
-    scheduler: BaseScheduler = None
+    scheduler = None
 
     def start(self, blocking=False):
         logger.debug("starting scheduler")
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        from apscheduler.schedulers.background import BackgroundScheduler
         if blocking:
             self.scheduler = BlockingScheduler()
         else:
@@ -21,7 +27,11 @@ class Scheduler():
 
         self.scheduler.start()
 
+    def shutdown(self):
+        self.scheduler.shutdown(wait=False)
+
     def start_job(self, name: str, process_to_run, seconds: int, immediate=False):
+        from apscheduler.triggers.interval import IntervalTrigger
         logger.debug(f"starting job for {name} with ")
         trig = IntervalTrigger(seconds=seconds)
         if immediate:
@@ -35,3 +45,220 @@ class Scheduler():
             return
         logger.debug(f"stopping job for {name}")
         self.scheduler.remove_job(name)
+
+    def run_job_now(self, name: str) -> bool:
+        '''runs a started job as soon as possible, its interval continues from then'''
+        job = self.scheduler.get_job(name)
+        if job is None:
+            return False
+        logger.debug(f"running job {name} now")
+        job.modify(next_run_time=datetime.datetime.now().astimezone())
+        return True
+
+    def reschedule_job(self, name: str, seconds: int) -> bool:
+        '''changes the interval of a started job, the next run is in seconds from now'''
+        from apscheduler.triggers.interval import IntervalTrigger
+        job = self.scheduler.get_job(name)
+        if job is None:
+            return False
+        logger.debug(f"rescheduling job {name} to {seconds}s")
+        job.reschedule(trigger=IntervalTrigger(seconds=seconds))
+        return True
+
+    def get_info(self) -> dict:
+        return {'backend': APSCHEDULER, 'jobs': len(self.scheduler.get_jobs()) if self.scheduler is not None else 0}
+
+
+class _Job():
+
+    __slots__ = ('name', 'fn', 'interval', 'due', 'running', 'rerun')
+
+    def __init__(self, name: str, fn, interval: float, due: float):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.due = due
+        self.running = False
+        # asked to run now while running, e.g. due to an event
+        self.rerun = False
+
+
+class HeapScheduler():
+    '''The Scheduler's interval jobs without APScheduler: a heap of due times watched by one thread,
+    the jobs due within resolution seconds are run as one batch on a pool of workers threads.
+    Adding, rescheduling and removing a job is O(log n). A job still running when due again is skipped,
+    runs missed while behind are not made up for.
+    '''
+
+    DEFAULT_WORKERS = 10
+    DEFAULT_RESOLUTION = 0.1
+    THREAD_NAME = 'Scheduler'
+
+    _jobs: dict[str, _Job]
+    _heap: list[tuple[float, int, _Job]]
+    _thread: threading.Thread
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, resolution: float = DEFAULT_RESOLUTION):
+        self._workers = workers
+        self._resolution = resolution
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.THREAD_NAME)
+        self._jobs = {}
+        self._heap = []
+        self._seq = 0
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+        self._stats = {'ticks': 0, 'runs': 0, 'skipped': 0, 'errors': 0, 'lag_seconds': 0.0,
+                       'last_lag_seconds': None, 'max_lag_seconds': 0.0, 'last_batch': 0, 'max_batch': 0}
+
+    def start(self, blocking=False):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        if blocking:
+            self._run()
+            return
+        self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    def start_job(self, name: str, process_to_run, seconds: float, immediate=False):
+        logger.debug(f"starting job {name} every {seconds}s")
+        now = monotonic()
+        with self._condition:
+            job = _Job(name, process_to_run, seconds, now if immediate else now + seconds)
+            self._jobs[name] = job
+            self._push(job)
+
+    def stop_job(self, name: str):
+        with self._condition:
+            # left in the heap, skipped when popped
+            if self._jobs.pop(name, None) is not None:
+                logger.debug(f"stopped job {name}")
+
+    def run_job_now(self, name: str) -> bool:
+        '''runs a started job as soon as possible, its interval continues from then'''
+        with self._condition:
+            job = self._jobs.get(name)
+            if job is None:
+                return False
+            if job.running:
+                # the running one may have missed what made it necessary
+                job.rerun = True
+            else:
+                self._reschedule(job, monotonic())
+            return True
+
+    def reschedule_job(self, name: str, seconds: float) -> bool:
+        '''changes the interval of a started job, the next run is in seconds from now'''
+        with self._condition:
+            job = self._jobs.get(name)
+            if job is None:
+                return False
+            job.interval = seconds
+            self._reschedule(job, monotonic() + seconds)
+            return True
+
+    # internal methods, called with the condition held
+
+    def _reschedule(self, job: _Job, due: float):
+        # the entry with the former due time becomes stale
+        job.due = due
+        self._push(job)
+
+    def _push(self, job: _Job):
+        self._seq += 1
+        heapq.heappush(self._heap, (job.due, self._seq, job))
+        self._condition.notify()
+
+    def _compact(self):
+        # too many stale entries of removed or rescheduled jobs
+        self._heap = [(job.due, seq, job) for seq, job in enumerate(self._jobs.values())]
+        heapq.heapify(self._heap)
+        self._seq = len(self._heap)
+
+    def _due(self, now: float) -> list[_Job]:
+        batch = {}
+        while self._heap and self._heap[0][0] <= now + self._resolution:
+            due, _, job = heapq.heappop(self._heap)
+            if self._jobs.get(job.name) is not job or job.due != due:
+                continue
+            batch[job.name] = job
+        return list(batch.values())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._running:
+                        return
+                    if len(self._heap) > 2 * len(self._jobs) + 64:
+                        self._compact()
+                    now = monotonic()
+                    batch = self._due(now)
+                    if batch:
+                        break
+                    timeout = self._heap[0][0] - now - self._resolution if self._heap else None
+                    self._condition.wait(timeout)
+                self._tick(now, batch)
+
+    def _tick(self, now: float, batch: list[_Job]):
+        lag = max(0.0, now - min(job.due for job in batch))
+        self._stats['ticks'] += 1
+        self._stats['lag_seconds'] += lag
+        self._stats['last_lag_seconds'] = lag
+        self._stats['max_lag_seconds'] = max(self._stats['max_lag_seconds'], lag)
+        self._stats['last_batch'] = len(batch)
+        self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+        if lag > 1:
+            logger.debug(f"running {len(batch)} jobs {lag:.1f}s late")
+        for job in batch:
+            # the interval counts from when it was due, unless that is behind already
+            next_due = job.due + job.interval
+            self._reschedule(job, next_due if next_due > now else now + job.interval)
+            if job.running:
+                self._stats['skipped'] += 1
+                continue
+            job.running = True
+            self._stats['runs'] += 1
+            self._executor.submit(self._execute, job)
+
+    def _execute(self, job: _Job):
+        try:
+            job.fn()
+        except Exception as e:
+            logger.info(f"job {job.name} failed", exc_info=e)
+            with self._condition:
+                self._stats['errors'] += 1
+        finally:
+            with self._condition:
+                job.running = False
+                if job.rerun and self._jobs.get(job.name) is job:
+                    self._reschedule(job, monotonic())
+                job.rerun = False
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        '''the pool of workers, to run other short tasks on as well'''
+        return self._executor
+
+    def get_info(self) -> dict:
+        with self._condition:
+            stats = dict(self._stats)
+            ticks = stats['ticks']
+            lag_seconds = stats.pop('lag_seconds')
+            for k in ('last_lag_seconds', 'max_lag_seconds'):
+                if stats[k] is not None:
+                    stats[k] = round(stats[k], 3)
+            stats['avg_lag_seconds'] = round(lag_seconds / ticks, 3) if ticks else None
+            stats['backend'] = BUILTIN
+            stats['jobs'] = len(self._jobs)
+            stats['workers'] = self._workers
+            return stats
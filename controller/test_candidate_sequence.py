@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import MagicMock
+
+from controller.candidate_sequence import CandidateSequence
+
+
+class TestCandidateSequence(unittest.TestCase):
+
+    def _response(self, matches: int = 3) -> MagicMock:
+        response = MagicMock()
+        response.get_matches.return_value = matches
+        response.random_item.side_effect = range(100)
+        return response
+
+    def test_same_items_per_position(self):
+        response = self._response()
+        s = CandidateSequence(response)
+
+        # the first one asking draws, the other one gets the same
+        self.assertEqual([0, 1, 2], [s.item(p) for p in range(3)])
+        self.assertEqual([0, 1, 2], [s.item(p) for p in range(3)])
+        self.assertEqual(3, response.random_item.call_count)
+        self.assertIs(response, s.get_search_response())
+
+    def test_skipped_positions_drawn(self):
+        s = CandidateSequence(self._response())
+        self.assertEqual(2, s.item(2))
+        self.assertEqual(0, s.item(0))
+
+    def test_nothing_found(self):
+        response = self._response(0)
+        s = CandidateSequence(response)
+        self.assertIsNone(s.item(0))
+        response.random_item.assert_not_called()
+
+    def test_window(self):
+        s = CandidateSequence(self._response())
+        s.item(CandidateSequence.WINDOW)
+        self.assertIsNone(s.item(0))
+        self.assertEqual(1, s.item(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
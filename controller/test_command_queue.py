@@ -0,0 +1,156 @@
+import unittest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from controller.command_queue import CommandQueue, INTERACTIVE, BACKGROUND
+
+
+class TestCommandQueue(unittest.TestCase):
+
+    def _block(self, q: CommandQueue) -> threading.Event:
+        '''occupies the worker until the returned event is set'''
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        q.submit(blocker)
+        started.wait(5)
+        return release
+
+    def test_call(self):
+        q = CommandQueue('test')
+        self.assertEqual(42, q.call(lambda: 42))
+
+        info = q.get_info()
+        self.assertEqual(1, info['executed'])
+        self.assertEqual(0, info['depth'])
+        self.assertIsNotNone(info['avg_wait_seconds'])
+
+    def test_serialized_on_one_thread(self):
+        q = CommandQueue('test')
+        threads = set()
+        futures = [q.submit(lambda: threads.add(threading.current_thread().name)) for _ in range(10)]
+        for f in futures:
+            f.result(5)
+
+        self.assertEqual({'Commands test'}, threads)
+
+    def test_priority(self):
+        q = CommandQueue('test')
+        order = []
+        release = self._block(q)
+
+        q.submit(lambda: order.append('poll'), BACKGROUND)
+        q.submit(lambda: order.append('play'), INTERACTIVE)
+        last = q.submit(lambda: order.append('renew'), BACKGROUND)
+        self.assertEqual(3, q.get_depth())
+
+        release.set()
+        last.result(5)
+        self.assertEqual(['play', 'poll', 'renew'], order)
+
+    def test_coalesce(self):
+        q = CommandQueue('test')
+        executed = []
+        release = self._block(q)
+
+        futures = [q.submit(lambda i=i: executed.append(i) or i, INTERACTIVE, key='control') for i in range(3)]
+        other = q.submit(lambda: 'poll', BACKGROUND, key='poll')
+        self.assertEqual(2, q.get_depth())
+
+        release.set()
+        # all callers get the result of the last one
+        self.assertEqual([2, 2, 2], [f.result(5) for f in futures])
+        self.assertEqual('poll', other.result(5))
+        self.assertEqual([2], executed)
+        self.assertEqual(2, q.get_info()['coalesced'])
+
+    def test_running_not_coalesced(self):
+        q = CommandQueue('test')
+        started = threading.Event()
+        release = threading.Event()
+
+        def first():
+            started.set()
+            release.wait(5)
+            return 'first'
+        f1 = q.submit(first, key='control')
+        started.wait(5)
+        f2 = q.submit(lambda: 'second', key='control')
+        release.set()
+
+        self.assertEqual('first', f1.result(5))
+        self.assertEqual('second', f2.result(5))
+
+    def test_error(self):
+        q = CommandQueue('test')
+
+        def fail():
+            raise ValueError('nope')
+        with self.assertRaises(ValueError):
+            q.call(fail)
+        # the worker goes on
+        self.assertEqual(1, q.call(lambda: 1))
+        self.assertEqual(1, q.get_info()['errors'])
+
+    def test_call_from_worker(self):
+        q = CommandQueue('test')
+        # would wait for itself if queued
+        self.assertEqual(2, q.call(lambda: q.call(lambda: 2)))
+
+    def test_wait_time(self):
+        q = CommandQueue('test')
+        release = self._block(q)
+        f = q.submit(lambda: None)
+        threading.Timer(0.1, release.set).start()
+        f.result(5)
+
+        self.assertTrue(q.get_info()['max_wait_seconds'] >= 0.1)
+
+    def test_executor(self):
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='Shared')
+        q = CommandQueue('test', executor)
+        threads = set()
+        futures = [q.submit(lambda: threads.add(threading.current_thread().name)) for _ in range(10)]
+        for f in futures:
+            f.result(5)
+        self.assertEqual(2, q.call(lambda: q.call(lambda: 2)))
+        executor.shutdown()
+
+        self.assertTrue(all(t.startswith('Shared') for t in threads))
+        self.assertEqual(11, q.get_info()['executed'])
+
+    def test_executor_one_at_a_time(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        q = CommandQueue('test', executor)
+        running = []
+        overlaps = []
+
+        def command():
+            running.append(1)
+            overlaps.append(len(running))
+            threading.Event().wait(0.01)
+            running.pop()
+        futures = [q.submit(command) for _ in range(10)]
+        for f in futures:
+            f.result(5)
+        executor.shutdown()
+
+        self.assertEqual([1] * 10, overlaps)
+
+    def test_executor_threads_bounded(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        before = threading.active_count()
+        queues = [CommandQueue(f"test {n}", executor) for n in range(50)]
+        futures = [q.submit(lambda: threading.Event().wait(0.01)) for q in queues for _ in range(2)]
+        for f in futures:
+            f.result(5)
+
+        self.assertTrue(threading.active_count() <= before + 4)
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
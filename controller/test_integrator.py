@@ -1,12 +1,17 @@
 import unittest
+import threading
+from time import sleep
 from unittest.mock import patch, call, MagicMock
 from dataclasses import dataclass
 
-from controller.data.exceptions import RequestInvalidException
+from controller.data.exceptions import RequestInvalidException, RequestCannotBeHandeledException
 from controller.data.command import PlayCommand
 from dlna.player import State as PlayerState, TRANSPORT_STATE
 from controller.data.state import State
 from controller.integrator import Integrator, PROGRESS_COUNT_MAX
+from controller.poller import Poller
+from controller.command_queue import BACKGROUND
+from controller.candidate_sequence import CandidateSequence
 
 
 @dataclass
@@ -26,6 +31,11 @@ class MyItem():
         return self.url
 
 
+def didl(item: MyItem) -> str:
+    # stands for the metadata rendered by the player
+    return f"<item>{item.get_title()}</item>"
+
+
 @dataclass
 class MySearchResponse():
     items: list[MyItem]
@@ -34,7 +44,7 @@ class MySearchResponse():
     def get_matches(self):
         return len(self.items)
 
-    def random_item(self):
+    def random_item(self, deck=None):
         # not really random, just for testing :)
         res = self.items[self.index % len(self.items)]
         self.index += 1
@@ -72,6 +82,7 @@ class TestIntegratorBase(unittest.TestCase):
         self.PLAYER.get_name.return_value = self.PLAYER_NAME
         self.PLAYER_DLNA = MagicMock()
         self.PLAYER.get_dlna_player.return_value = self.PLAYER_DLNA
+        self.PLAYER_DLNA.render_metadata.side_effect = didl
 
         self.SCHEDULER = MagicMock()
         return Integrator(self.PLAYER, self.FAKE_SERVER, self.SCHEDULER)
@@ -202,6 +213,520 @@ class TestIntegratorOtherFunctions(TestIntegratorBase):
         self.SCHEDULER.start_job.assert_not_called()
 
 
+class TestIntegratorCommandQueue(TestIntegratorBase):
+
+    def test_poll_queued(self):
+        i = self._testee()
+        self._initial_play_url(i)
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, self.URL, None, 5)
+
+        i._poll()
+        # queued behind the poll
+        i._commands.call(lambda: None, BACKGROUND)
+        self.PLAYER_DLNA.get_state.assert_called_once()
+
+    def test_poll_after_end_skipped(self):
+        i = self._testee()
+        self._initial_play_url(i)
+        i.stop()
+        self.PLAYER_DLNA.reset_mock()
+
+        i._poll()
+        self.PLAYER_DLNA.get_state.assert_not_called()
+
+    def test_poll_serialized_with_commands(self):
+        i = self._testee()
+        self._initial_play_url(i, loop=True)
+        self.PLAYER_DLNA.reset_mock()
+        threads = []
+
+        def get_state():
+            threads.append(threading.current_thread().name)
+            return PlayerState(TRANSPORT_STATE.PLAYING, 'other', None, 5)
+        self.PLAYER_DLNA.get_state.side_effect = get_state
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        i._commands.submit(blocker)
+        started.wait(5)
+        # not queried while a command talks to the renderer
+        i._poll()
+        self.PLAYER_DLNA.get_state.assert_not_called()
+        release.set()
+        i._commands.call(lambda: None, BACKGROUND)
+
+        self.assertEqual(['Commands ' + self.PLAYER_NAME], threads)
+
+    def test_poll_error(self):
+        i = self._testee()
+        self._initial_play_url(i)
+        self.PLAYER_DLNA.get_state.side_effect = OSError('unreachable')
+
+        i._poll()
+        i._commands.call(lambda: None, BACKGROUND)
+        self.assertFalse(i._state.running)
+        self.assertEqual('exception in looping: unreachable', i._state.stop_reason)
+
+    def test_poller(self):
+        self._testee()
+        poller = MagicMock()
+        poller.get_executor.return_value = None
+        i = Integrator(self.PLAYER, self.FAKE_SERVER, self.SCHEDULER, poller=poller)
+        i.play(PlayCommand(url=self.URL))
+
+        poller.start_job.assert_called_once_with(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)
+        i.stop()
+        poller.stop_job.assert_called_with(self.SCHEDULER_NAME)
+        self.SCHEDULER.start_job.assert_not_called()
+
+    def test_commands_on_poller_threads_bounded(self):
+        self._testee()
+        poller = Poller(workers=4)
+        poller.start()
+        before = threading.active_count()
+        integrators = []
+        for n in range(30):
+            player = MagicMock()
+            player.get_name.return_value = f"Renderer {n}"
+            player.get_dlna_player.return_value.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, self.URL,
+                                                                                     None, 5)
+            integrators.append(Integrator(player, self.FAKE_SERVER, self.SCHEDULER, poller=poller))
+        try:
+            for i in integrators:
+                i.play(PlayCommand(url=self.URL))
+                i._poll()
+            for i in integrators:
+                i._commands.call(lambda: None, BACKGROUND)
+                self.assertTrue(i._state.running)
+            self.assertTrue(threading.active_count() <= before + 4)
+        finally:
+            poller.shutdown()
+
+    def test_commands_on_queue(self):
+        i = self._testee()
+        threads = []
+        self.PLAYER_DLNA.play.side_effect = lambda *args, **kwargs: threads.append(threading.current_thread().name)
+
+        self._initial_play_url(i)
+        self.assertEqual(['Commands ' + self.PLAYER_NAME], threads)
+        self.assertEqual(1, i.get_queue_info()['executed'])
+
+    def test_quick_plays_coalesced(self):
+        i = self._testee()
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        i._commands.submit(blocker)
+        started.wait(5)
+        results = []
+        threads = []
+        for u in ('u1', 'u2', 'u3'):
+            t = threading.Thread(target=lambda u=u: results.append(i.play(PlayCommand(url=u, artist=None, title=None,
+                                                                                      loop=False))))
+            t.start()
+            threads.append(t)
+            # one after the other, each replaces the queued one before
+            while i._commands.get_depth() != 1 or i.get_queue_info()['coalesced'] != len(threads) - 1:
+                sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        self.PLAYER_DLNA.play.assert_called_once_with('u3')
+        self.assertEqual(3, len(results))
+        self.assertEqual(2, i.get_queue_info()['coalesced'])
+
+    def test_different_commands_not_coalesced(self):
+        i = self._testee()
+        self._initial_play_url(i)
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PAUSED_PLAYBACK, self.URL, None, 1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait(5)
+        i._commands.submit(blocker)
+        started.wait(5)
+        results = {}
+        threads = []
+        for name, fn in (('pause', i.pause), ('resume', i.resume)):
+            t = threading.Thread(target=lambda name=name, fn=fn: results.update({name: fn()}))
+            t.start()
+            threads.append(t)
+            while i._commands.get_depth() != len(threads):
+                sleep(0.001)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        # the pause is not dropped, so there is something to resume
+        self.PLAYER_DLNA.pause.assert_called_once()
+        self.PLAYER_DLNA.resume.assert_called_once()
+        self.assertFalse(results['pause'].running)
+        self.assertTrue(results['resume'].running)
+        self.assertEqual(0, i.get_queue_info()['coalesced'])
+
+
+class TestIntegratorGroup(TestIntegratorBase):
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_shared_sequence_lockstep(self, mediaserver_search_mock):
+        items = [MyItem(f"title {n}", 'artist', f"url-{n}") for n in range(5)]
+        sequence = CandidateSequence(MySearchResponse(items))
+        first = self._testee()
+        first_dlna = self.PLAYER_DLNA
+        second = self._testee()
+        second_dlna = self.PLAYER_DLNA
+
+        cmd = PlayCommand(artist='artist', loop=True)
+        first.submit_play(cmd, sequence).result(5)
+        # lagging behind does not matter
+        second.play(cmd, sequence)
+
+        mediaserver_search_mock.assert_not_called()
+        for dlna in (first_dlna, second_dlna):
+            dlna.play.assert_called_once_with('url-0', metadata_raw=didl(items[0]))
+            dlna.set_next.assert_called_once_with('url-1', metadata_raw=didl(items[1]))
+
+        # the next track goes on in lockstep as well
+        for i, dlna in ((first, first_dlna), (second, second_dlna)):
+            dlna.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, 'url-1', 'url-1', 0)
+            i._loop_process()
+            dlna.set_next.assert_called_with('url-2', metadata_raw=didl(items[2]))
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_own_search_after_group(self, mediaserver_search_mock):
+        mediaserver_search_mock.return_value = self.DEFAULT_RESPONSE
+        i = self._testee()
+        i.play(PlayCommand(artist='artist'), CandidateSequence(MySearchResponse([MyItem('t', 'a', 'u')])))
+
+        self._initial_play_item(i, PlayCommand(title='must go'))
+        mediaserver_search_mock.assert_called_once_with(title='must go')
+
+
+class TestIntegratorPlayQueue(TestIntegratorBase):
+
+    ITEMS = [MyItem(f"title {n}", 'artist', f"url-{n}") for n in range(6)]
+
+    def _prepared(self, i: Integrator):
+        # the background work queued behind is done
+        i._commands.call(lambda: None, BACKGROUND)
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_prefetched(self, mediaserver_search_mock):
+        mediaserver_search_mock.return_value = MySearchResponse(self.ITEMS)
+        i = self._testee()
+        i.play(PlayCommand(artist='artist', loop=True))
+        self._prepared(i)
+
+        queue = i.get_play_queue()
+        self.assertEqual('url-0', queue.playing.url)
+        self.assertEqual('url-1', queue.next.url)
+        self.assertEqual(['url-2', 'url-3', 'url-4'], [t.url for t in queue.upcoming])
+        self.assertEqual('title 2', queue.upcoming[0].title)
+        # rendered ahead, the next track is taken from the ring
+        self.PLAYER_DLNA.render_metadata.reset_mock()
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, 'url-1', None, 0)
+        i._loop_process()
+        self.PLAYER_DLNA.set_next.assert_called_with('url-2', metadata_raw=didl(self.ITEMS[2]))
+        self.assertNotIn(call(self.ITEMS[2]), self.PLAYER_DLNA.render_metadata.call_args_list)
+        self.assertEqual(1, i.get_queue_info()['play_queue']['hits'])
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_not_looping_not_prefetched(self, mediaserver_search_mock):
+        mediaserver_search_mock.return_value = MySearchResponse(self.ITEMS)
+        i = self._testee()
+        i.play(PlayCommand(artist='artist'))
+        self._prepared(i)
+
+        self.assertEqual([], i.get_play_queue().upcoming)
+        self.assertEqual(0, i.get_queue_info()['play_queue']['prefetched'])
+
+    def test_queue_after_stop(self):
+        i = self._testee()
+        self._initial_play_url(i, loop=True)
+        self.assertEqual(self.URL, i.get_play_queue().next.url)
+        i.stop()
+        queue = i.get_play_queue()
+        self.assertIsNone(queue.playing)
+        self.assertEqual([], queue.upcoming)
+
+    def _playlist_testee(self) -> Integrator:
+        self._testee()
+        server = MagicMock()
+        server.get_item.side_effect = lambda object_id: {'64$1': self.ITEMS[1], '64$2': self.ITEMS[2]}.get(object_id)
+        return Integrator(self.PLAYER, server, self.SCHEDULER)
+
+    def test_playlist(self):
+        i = self._playlist_testee()
+        res = i.play(PlayCommand(playlist=['http://x/a.mp3', '64$1', '64$unknown', '64$2']))
+        self.assertEqual('http://x/a.mp3', res.last_played_url)
+        self.PLAYER_DLNA.play.assert_called_once_with('http://x/a.mp3', metadata_raw=None)
+        self.PLAYER_DLNA.set_next.assert_called_once_with('url-1', metadata_raw=didl(self.ITEMS[1]))
+        self._prepared(i)
+        self.assertEqual(['url-2'], [t.url for t in i.get_play_queue().upcoming])
+
+        # the unknown one is skipped
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, 'url-1', None, 0)
+        i._loop_process()
+        self.PLAYER_DLNA.set_next.assert_called_with('url-2', metadata_raw=didl(self.ITEMS[2]))
+        self.assertEqual(2, i._state.played_count)
+
+        # the last one is playing, nothing follows
+        self.PLAYER_DLNA.set_next.reset_mock()
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, 'url-2', None, 0)
+        i._loop_process()
+        self.PLAYER_DLNA.set_next.assert_not_called()
+        self.assertTrue(i._state.running)
+
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.STOPPED, 'url-2', None, 0)
+        i._loop_process()
+        self._assert_state(i._state, last_played_url='url-2', last_played_artist='artist', last_played_title='title 2',
+                           stop_reason="end of playlist")
+
+    def test_playlist_loop(self):
+        i = self._playlist_testee()
+        i.play(PlayCommand(playlist=['64$1', 'http://x/a.mp3'], loop=True))
+        self._prepared(i)
+
+        queue = i.get_play_queue()
+        self.assertEqual(['url-1', 'http://x/a.mp3'], [queue.playing.url, queue.next.url])
+        self.assertEqual(['url-1', 'http://x/a.mp3', 'url-1'], [t.url for t in queue.upcoming])
+
+    def test_playlist_invalid(self):
+        i = self._playlist_testee()
+        for playlist in ('http://x/a.mp3', ['64$1', 2]):
+            with self.assertRaises(RequestInvalidException):
+                i.play(PlayCommand(playlist=playlist))
+
+    def test_playlist_nothing_found(self):
+        i = self._playlist_testee()
+        res = i.play(PlayCommand(playlist=['64$unknown'], loop=True))
+        self.assertFalse(res.running)
+        self.assertEqual("nothing found in media server", res.stop_reason)
+        self.PLAYER_DLNA.play.assert_not_called()
+
+
+class TestIntegratorSkip(TestIntegratorBase):
+
+    ITEMS = [MyItem(f"title {n}", 'artist', f"url-{n}") for n in range(6)]
+
+    def _playing(self, mediaserver_search_mock, loop=True) -> Integrator:
+        mediaserver_search_mock.return_value = MySearchResponse(self.ITEMS)
+        i = self._testee()
+        i.play(PlayCommand(artist='artist', loop=loop))
+        # the background work queued behind is done
+        i._commands.call(lambda: None, BACKGROUND)
+        self.PLAYER_DLNA.reset_mock()
+        self.SCHEDULER.reset_mock()
+        return i
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_next(self, mediaserver_search_mock):
+        i = self._playing(mediaserver_search_mock)
+
+        res = i.next_track()
+        self.assertEqual('url-1', res.last_played_url)
+        self.assertEqual(2, res.played_count)
+        # the prepared one, no search, no rendering, the observer goes on
+        self.PLAYER_DLNA.play.assert_called_once_with('url-1', metadata_raw=didl(self.ITEMS[1]))
+        self.PLAYER_DLNA.set_next.assert_called_once_with('url-2', metadata_raw=didl(self.ITEMS[2]))
+        self.assertNotIn(call(self.ITEMS[1]), self.PLAYER_DLNA.render_metadata.call_args_list)
+        mediaserver_search_mock.assert_called_once()
+        self.SCHEDULER.start_job.assert_not_called()
+        self.SCHEDULER.stop_job.assert_not_called()
+        self.assertEqual('url-2', i._state.next_play_url)
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_previous(self, mediaserver_search_mock):
+        i = self._playing(mediaserver_search_mock)
+        i.next_track()
+        self.PLAYER_DLNA.reset_mock()
+
+        res = i.previous_track()
+        self.assertEqual('url-0', res.last_played_url)
+        self.PLAYER_DLNA.play.assert_called_once_with('url-0', metadata_raw=didl(self.ITEMS[0]))
+        # continues where it was
+        self.PLAYER_DLNA.set_next.assert_called_once_with('url-1', metadata_raw=didl(self.ITEMS[1]))
+        self.assertEqual(['url-2', 'url-3'], [t.url for t in i.get_play_queue().upcoming][:2])
+
+        self.assertEqual('url-1', i.next_track().last_played_url)
+        self.PLAYER_DLNA.set_next.assert_called_with('url-2', metadata_raw=didl(self.ITEMS[2]))
+
+        self.assertEqual('url-0', i.previous_track().last_played_url)
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.previous_track()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_previous_after_transition(self, mediaserver_search_mock):
+        i = self._playing(mediaserver_search_mock)
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, 'url-1', None, 0)
+        i._loop_process()
+
+        self.assertEqual('url-0', i.previous_track().last_played_url)
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_next_not_looping(self, mediaserver_search_mock):
+        i = self._playing(mediaserver_search_mock, loop=False)
+
+        # the same search goes on
+        self.assertEqual('url-1', i.next_track().last_played_url)
+        mediaserver_search_mock.assert_called_once()
+        self.PLAYER_DLNA.set_next.assert_not_called()
+
+    def test_next_url(self):
+        i = self._testee()
+        self._initial_play_url(i, loop=True)
+
+        self.assertEqual(self.URL, i.next_track().last_played_url)
+        self.assertEqual(self.URL, i.previous_track().last_played_url)
+        self.assertEqual(3, i._state.played_count)
+
+    def test_not_playing(self):
+        i = self._testee()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.next_track()
+        self._initial_play_url(i)
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.previous_track()
+        i.pause()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.next_track()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_next_error(self, mediaserver_search_mock):
+        i = self._playing(mediaserver_search_mock)
+        self.PLAYER_DLNA.play.side_effect = OSError("test-error")
+
+        with self.assertRaises(OSError):
+            i.next_track()
+        self.assertEqual("exception in skip: test-error", i._state.stop_reason)
+
+    def test_history_bounded(self):
+        i = self._testee()
+        self._initial_play_url(i, loop=True)
+        for _ in range(Integrator.HISTORY_SIZE + 5):
+            i.next_track()
+        self.assertEqual(Integrator.HISTORY_SIZE, len(i._history))
+
+
+class TestIntegratorResume(TestIntegratorBase):
+
+    ITEMS = [MyItem(f"title {n}", 'artist', f"url-{n}") for n in range(6)]
+
+    def _paused(self, mediaserver_search_mock, rel_time=42.0) -> Integrator:
+        mediaserver_search_mock.return_value = MySearchResponse(self.ITEMS)
+        i = self._testee()
+        i.play(PlayCommand(artist='artist', loop=True))
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PAUSED_PLAYBACK, 'url-0', 'url-1', 42,
+                                                              200.0, rel_time)
+        res = i.pause()
+        self.assertFalse(res.running)
+        self.assertEqual("pause invoked", res.stop_reason)
+        self.PLAYER_DLNA.reset_mock()
+        self.SCHEDULER.reset_mock()
+        return i
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_resume(self, mediaserver_search_mock):
+        i = self._paused(mediaserver_search_mock)
+        self.assertTrue(i.is_paused())
+
+        res = i.resume()
+        self.assertFalse(i.is_paused())
+        self.assertTrue(res.running)
+        self.assertTrue(res.looping)
+        self.assertEqual('url-0', res.last_played_url)
+        self.assertEqual(1, res.played_count)
+        self.assertEqual("Spielt Medien von artist", res.description)
+        # just continued, nothing searched or sent again
+        self.PLAYER_DLNA.resume.assert_called_once_with()
+        self.PLAYER_DLNA.play.assert_not_called()
+        self.PLAYER_DLNA.seek.assert_not_called()
+        mediaserver_search_mock.assert_called_once()
+        self.SCHEDULER.start_job.assert_called_once_with(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)
+
+        # the session goes on where it was
+        self.assertEqual('url-1', i.next_track().last_played_url)
+        self.PLAYER_DLNA.set_next.assert_called_with('url-2', metadata_raw=didl(self.ITEMS[2]))
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_resume_dropped(self, mediaserver_search_mock):
+        i = self._paused(mediaserver_search_mock)
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.NO_MEDIA_PRESENT, None, None, 0)
+
+        self.assertTrue(i.resume().running)
+        self.PLAYER_DLNA.play.assert_called_once_with('url-0', metadata_raw=didl(self.ITEMS[0]))
+        self.PLAYER_DLNA.seek.assert_called_once_with(42.0)
+        self.PLAYER_DLNA.set_next.assert_called_once_with('url-1', metadata_raw=didl(self.ITEMS[1]))
+        self.PLAYER_DLNA.resume.assert_not_called()
+        mediaserver_search_mock.assert_called_once()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_resume_seek_fails(self, mediaserver_search_mock):
+        i = self._paused(mediaserver_search_mock)
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.STOPPED, 'url-0', None, 0)
+        self.PLAYER_DLNA.seek.side_effect = OSError('not seekable')
+
+        # plays from the start
+        self.assertTrue(i.resume().running)
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_position_unknown(self, mediaserver_search_mock):
+        mediaserver_search_mock.return_value = MySearchResponse(self.ITEMS)
+        i = self._testee()
+        i.play(PlayCommand(artist='artist', loop=True))
+        self.PLAYER_DLNA.get_state.side_effect = OSError('unreachable')
+        self.assertEqual("pause invoked", i.pause().stop_reason)
+
+        self.PLAYER_DLNA.get_state.side_effect = None
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.STOPPED, None, None, 0)
+        self.assertTrue(i.resume().running)
+        self.PLAYER_DLNA.seek.assert_not_called()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_nothing_paused(self, mediaserver_search_mock):
+        i = self._testee()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.resume()
+
+        i = self._paused(mediaserver_search_mock)
+        i.resume()
+        # resumed already
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.resume()
+
+        i.pause()
+        i.stop()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.resume()
+
+        # replaced by a new play
+        i.play(PlayCommand(url=self.URL))
+        i.pause()
+        i.play(PlayCommand(url=self.URL))
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.resume()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_resume_error(self, mediaserver_search_mock):
+        i = self._paused(mediaserver_search_mock)
+        self.PLAYER_DLNA.resume.side_effect = OSError("test-error")
+
+        with self.assertRaises(OSError):
+            i.resume()
+        self.assertEqual("exception in resume: test-error", i._state.stop_reason)
+        with self.assertRaises(RequestCannotBeHandeledException):
+            i.resume()
+
+
 class TestIntegratorPlayFunctions(TestIntegratorBase):
 
     def test_play_url_initial(self):
@@ -233,7 +758,7 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
 
         mediaserver_search_mock.assert_called_with(title='must go')
         self.SCHEDULER.stop_job.assert_called_with(self.SCHEDULER_NAME)
-        self.PLAYER_DLNA.play.assert_called_with(self.DEFAULT_ITEM.url, item=self.DEFAULT_ITEM)
+        self.PLAYER_DLNA.play.assert_called_with(self.DEFAULT_ITEM.url, metadata_raw=didl(self.DEFAULT_ITEM))
 
     @patch("controller.test_integrator.FakeServer.search")
     def test_play_item_not_found(self, mediaserver_search_mock):
@@ -252,6 +777,42 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
 
         self._assert_state(i._state, stop_reason="nothing found in media server")
 
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_play_item_sampled_vanished(self, mediaserver_search_mock):
+        i = self._testee()
+
+        # counted one match, but sampling it finds nothing anymore
+        sampled = MagicMock()
+        sampled.get_matches.return_value = 1
+        sampled.random_item.return_value = None
+        mediaserver_search_mock.return_value = sampled
+
+        res = i.play(PlayCommand(title='must go', loop=True))
+        self._assert_state(i._state, stop_reason="nothing found in media server")
+        self.assertEqual(res, i._state.view())
+        self.PLAYER_DLNA.play.assert_not_called()
+
+    @patch("controller.test_integrator.FakeServer.search")
+    def test_play_item_deck_kept(self, mediaserver_search_mock):
+        i = self._testee()
+
+        response = MagicMock()
+        response.get_matches.return_value = 1
+        response.random_item.return_value = self.DEFAULT_ITEM
+        mediaserver_search_mock.return_value = response
+
+        i.play(PlayCommand(title='must go'))
+        deck = response.random_item.call_args.args[0]
+        i.pause()
+
+        # the same search continues the shuffle order
+        i.play(PlayCommand(title='must go'))
+        self.assertIs(deck, response.random_item.call_args.args[0])
+
+        # a different one starts a new order
+        i.play(PlayCommand(title='narco'))
+        self.assertIsNot(deck, response.random_item.call_args.args[0])
+
     @patch("controller.test_integrator.FakeServer.search")
     def test_play_item_second(self, mediaserver_search_mock):
         i = self._testee()
@@ -272,7 +833,7 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         mediaserver_search_mock.assert_called_with(title='must go')
         self.SCHEDULER.stop_job.assert_called()
         self.SCHEDULER.start_job.assert_called()
-        self.PLAYER_DLNA.play.assert_called_with('url-queen', item=testItem)
+        self.PLAYER_DLNA.play.assert_called_with('url-queen', metadata_raw=didl(testItem))
 
         # prepare mocks for second call
         self.PLAYER_DLNA.play.reset_mock()
@@ -292,13 +853,13 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         mediaserver_search_mock.assert_called_with(title='narco')
         self.SCHEDULER.stop_job.assert_called()
         self.SCHEDULER.start_job.assert_called()
-        self.PLAYER_DLNA.play.assert_called_with('url-liquido', item=testItem)
+        self.PLAYER_DLNA.play.assert_called_with('url-liquido', metadata_raw=didl(testItem))
 
     def test_play_url_with_loops_not_looping(self):
         i = self._testee()
 
         self._initial_play_url(i)
-        self.SCHEDULER.start_job.assert_has_calls([call(self.SCHEDULER_NAME, i._loop_process, self.SCHEDULER_INTERVAL)])
+        self.SCHEDULER.start_job.assert_has_calls([call(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)])
         self.SCHEDULER.stop_job.assert_has_calls([call(self.SCHEDULER_NAME)])
         self.PLAYER_DLNA.play.assert_has_calls([call('a-track')])
 
@@ -317,7 +878,7 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
 
         cmd = PlayCommand(url=self.URL, loop=True)
         self._initial_play_url(i, True)
-        self.SCHEDULER.start_job.assert_has_calls([call(self.SCHEDULER_NAME, i._loop_process, self.SCHEDULER_INTERVAL)])
+        self.SCHEDULER.start_job.assert_has_calls([call(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)])
         self.SCHEDULER.stop_job.assert_has_calls([call(self.SCHEDULER_NAME)])
         self.PLAYER_DLNA.play.assert_has_calls([call('a-track')])
 
@@ -371,7 +932,7 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         self.SCHEDULER.start_job.assert_not_called()
         self.SCHEDULER.stop_job.assert_not_called()
         self.PLAYER_DLNA.get_state.assert_called_with()
-        self.PLAYER_DLNA.play.assert_called_with(self.DEFAULT_ITEM.url, item=self.DEFAULT_ITEM)
+        self.PLAYER_DLNA.play.assert_called_with(self.DEFAULT_ITEM.url, metadata_raw=didl(self.DEFAULT_ITEM))
 
     def test_play_url_with_loops_shutdown(self):
         i = self._testee()
@@ -548,7 +1109,7 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         self.PLAYER_DLNA.reset_mock()
         self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, item_2.url, None, 0)
         i._loop_process()
-        self.PLAYER_DLNA.set_next.assert_called_with(item_3.url, item=item_3)
+        self.PLAYER_DLNA.set_next.assert_called_with(item_3.url, metadata_raw=didl(item_3))
         self.PLAYER_DLNA.reset_mock()
         self._assert_state(i._state, current_command=cmd, last_played_url=item_2.url, played_count=2,
                            last_played_artist=item_2.actor, last_played_title=item_2.title,
@@ -601,8 +1162,8 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         self.PLAYER_DLNA.reset_mock()
         self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.STOPPED, item_2.url, None, 0)
         i._loop_process()
-        self.PLAYER_DLNA.play.assert_called_with(item_3.url, item=item_3)
-        self.PLAYER_DLNA.set_next.assert_called_with(item_1.url, item=item_1)
+        self.PLAYER_DLNA.play.assert_called_with(item_3.url, metadata_raw=didl(item_3))
+        self.PLAYER_DLNA.set_next.assert_called_with(item_1.url, metadata_raw=didl(item_1))
         self._assert_state(i._state, current_command=cmd, last_played_url=item_3.url, played_count=2,
                            last_played_artist=item_3.actor, last_played_title=item_3.title,
                            running=True, looping=True, description="Spielt Medien mit 'must go'",
@@ -698,8 +1259,197 @@ class TestIntegratorPlayFunctions(TestIntegratorBase):
         self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.PLAYING, item_2.url, None, 100)
         i._loop_process()
         self.PLAYER_DLNA.play.assert_not_called()
-        self.PLAYER_DLNA.set_next.assert_called_with(item_3.url, item=item_3)
+        self.PLAYER_DLNA.set_next.assert_called_with(item_3.url, metadata_raw=didl(item_3))
         self._assert_state(i._state, current_command=cmd, last_played_url=item_2.url, played_count=2,
                            last_played_artist=item_2.actor, last_played_title=item_2.title,
                            running=True, looping=True, description="Spielt Medien mit 'must go'",
                            next_play_url=item_3.url, next_play_item=item_3)
+
+
+class TestIntegratorEventing(TestIntegratorBase):
+
+    def _testee(self):
+        i = super()._testee()
+        self.LISTENER = MagicMock()
+        self.LISTENER.register.return_value = 'http://me/cb'
+        self.PLAYER_DLNA.get_event_url.return_value = 'http://renderer/evt'
+        i._listener = self.LISTENER
+        return i
+
+    def test_renewal_interval(self):
+        i = self._testee()
+        self.assertEqual(900, i._renewal_interval(1800))
+        self.assertEqual(30, i._renewal_interval(60))
+        # short timeouts are renewed before they expire
+        self.assertEqual(25, i._renewal_interval(30))
+        self.assertEqual(15, i._renewal_interval(20))
+        self.assertEqual(2, i._renewal_interval(4))
+
+    @patch("controller.integrator.Subscription")
+    def test_subscribed_before_playing(self, subscription):
+        subscription.return_value.get_timeout.return_value = 300
+        i = self._testee()
+        order = []
+        subscription.return_value.subscribe.side_effect = lambda: order.append('subscribe')
+        self.PLAYER_DLNA.play.side_effect = lambda *args, **kwargs: order.append('play')
+
+        i.play(PlayCommand(url=self.URL))
+        # waiting for the renderer to accept the track gets its events
+        self.assertEqual(['subscribe', 'play'], order)
+
+    @patch("controller.integrator.Subscription")
+    def test_play_subscribes(self, subscription):
+        subscription.return_value.get_timeout.return_value = 300
+        subscription.return_value.is_active.return_value = True
+        i = self._testee()
+
+        i.play(PlayCommand(url=self.URL, loop=True))
+        subscription.assert_called_with('http://renderer/evt', 'http://me/cb', request_timeout=self.PLAYER.get_timeout())
+        subscription.return_value.subscribe.assert_called_once()
+        self.SCHEDULER.start_job.assert_has_calls([
+            call('Event_Renewal_' + self.PLAYER_NAME, i._renew, 150),
+            call(self.SCHEDULER_NAME, i._poll, Integrator.EVENT_FALLBACK_INTERVAL)])
+
+        # events trigger a check
+        i._on_event({'TransportState': 'STOPPED'})
+        self.SCHEDULER.run_job_now.assert_called_once_with(self.SCHEDULER_NAME)
+        self.PLAYER_DLNA.on_transport_state.assert_called_once_with('STOPPED')
+        i._on_event({'Volume': '3'})
+        self.SCHEDULER.run_job_now.assert_called_once()
+
+        # subscribed once only
+        i.play(PlayCommand(url=self.URL, loop=True))
+        subscription.return_value.subscribe.assert_called_once()
+
+    @patch("controller.integrator.Subscription")
+    def test_play_subscription_failed(self, subscription):
+        subscription.return_value.subscribe.side_effect = OSError('not supported')
+        i = self._testee()
+
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.LISTENER.unregister.assert_called_with('http://me/cb')
+        self.SCHEDULER.start_job.assert_called_once_with(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)
+
+    @patch("controller.integrator.Subscription")
+    def test_renewal_failed(self, subscription):
+        subscription.return_value.get_timeout.return_value = 300
+        subscription.return_value.get_callback_url.return_value = 'http://me/cb'
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.SCHEDULER.reset_mock()
+
+        # the renderer restarted, it accepts a new subscription
+        subscription.return_value.renew.side_effect = OSError('gone')
+        i._renew_subscription()
+        self.LISTENER.unregister.assert_called_with('http://me/cb')
+        self.assertEqual(2, subscription.return_value.subscribe.call_count)
+        self.SCHEDULER.start_job.assert_called_with(self.SCHEDULER_NAME, i._poll, Integrator.EVENT_FALLBACK_INTERVAL)
+        self.SCHEDULER.reset_mock()
+
+        # the renderer does not accept subscriptions anymore, polling takes over
+        subscription.return_value.subscribe.side_effect = OSError('gone')
+        i._renew_subscription()
+        self.assertIsNone(i._subscription)
+        self.SCHEDULER.start_job.assert_called_once_with(self.SCHEDULER_NAME, i._poll, self.SCHEDULER_INTERVAL)
+
+    @patch("controller.integrator.Subscription")
+    def test_stop_unsubscribes(self, subscription):
+        subscription.return_value.get_timeout.return_value = 300
+        subscription.return_value.is_active.return_value = True
+        subscription.return_value.get_callback_url.return_value = 'http://me/cb'
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.SCHEDULER.reset_mock()
+
+        i.stop()
+        subscription.return_value.unsubscribe.assert_called_once()
+        self.LISTENER.unregister.assert_called_once_with('http://me/cb')
+        # no renewal job left
+        self.SCHEDULER.stop_job.assert_any_call('Event_Renewal_' + self.PLAYER_NAME)
+        self.SCHEDULER.start_job.assert_not_called()
+        self.assertIsNone(i._subscription)
+
+        # a renewal queued before does nothing
+        i._renew_subscription()
+        subscription.return_value.renew.assert_not_called()
+
+        # subscribed again when played again
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.assertEqual(2, subscription.return_value.subscribe.call_count)
+
+    @patch("controller.integrator.Subscription")
+    def test_end_unsubscribes(self, subscription):
+        subscription.return_value.get_timeout.return_value = 300
+        subscription.return_value.is_active.return_value = True
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL))
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(TRANSPORT_STATE.STOPPED, self.URL, None, 0)
+
+        i._loop_process()
+        self.assertEqual('not looping', i._state.stop_reason)
+        subscription.return_value.unsubscribe.assert_called_once()
+        self.SCHEDULER.stop_job.assert_any_call('Event_Renewal_' + self.PLAYER_NAME)
+
+    def test_event_when_stopped(self):
+        i = self._testee()
+        i._on_event({'TransportState': 'STOPPED'})
+        self.SCHEDULER.run_job_now.assert_not_called()
+
+
+class TestIntegratorAdaptivePolling(TestIntegratorBase):
+
+    def _playing(self, i, duration, rel_time, transport_state=TRANSPORT_STATE.PLAYING):
+        self.PLAYER_DLNA.get_state.return_value = PlayerState(transport_state, self.URL, self.URL, 0, duration, rel_time)
+        self.SCHEDULER.reset_mock()
+        i._loop_process()
+
+    def test_intervals(self):
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.SCHEDULER.reschedule_job.return_value = True
+
+        # long track: back off
+        self._playing(i, 600, 10)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, Integrator.MAX_CHECK_INTERVAL)
+
+        # check just before the end
+        self._playing(i, 600, 570)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, 28)
+
+        # right after the end
+        self._playing(i, 600, 599)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, 2)
+
+        # unchanged interval, nothing to do
+        self._playing(i, 600, 599)
+        self.SCHEDULER.reschedule_job.assert_not_called()
+
+        # unknown duration
+        self._playing(i, None, None)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, self.SCHEDULER_INTERVAL)
+
+    @patch("controller.integrator.monotonic")
+    def test_learn_transition(self, monotonic):
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL, loop=True))
+        self.SCHEDULER.reschedule_job.return_value = True
+
+        monotonic.return_value = 100
+        self._playing(i, None, None, TRANSPORT_STATE.TRANSITIONING)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, Integrator.DEFAULT_TRANSITION_SECONDS)
+
+        monotonic.return_value = 112
+        self._playing(i, 600, 1)
+        self.assertAlmostEqual(0.7 * 2 + 0.3 * 12, i._transition_seconds)
+        self.assertIsNone(i._transition_started)
+
+        # the next transition is expected to take longer
+        self._playing(i, None, None, TRANSPORT_STATE.TRANSITIONING)
+        self.SCHEDULER.reschedule_job.assert_called_once_with(self.SCHEDULER_NAME, 5.0)
+
+    def test_not_running(self):
+        i = self._testee()
+        i.play(PlayCommand(url=self.URL, loop=False))
+        # ends as the track stopped, nothing to reschedule
+        self._playing(i, 600, 0, TRANSPORT_STATE.STOPPED)
+        self.SCHEDULER.reschedule_job.assert_not_called()
@@ -0,0 +1,100 @@
+import unittest
+import threading
+
+from controller.play_queue import PlayQueue, QueuedTrack
+
+
+def source(count: int):
+    '''tracks 0 to count-1, then nothing more'''
+    tracks = iter([QueuedTrack(f"url-{n}", None, f"didl {n}") for n in range(count)])
+    return lambda: next(tracks, None)
+
+
+class TestPlayQueue(unittest.TestCase):
+
+    def test_fill_and_pop(self):
+        q = PlayQueue(2)
+        q.reset(source(5))
+        q.fill()
+        self.assertEqual(['url-0', 'url-1'], [t.url for t in q.peek()])
+
+        self.assertEqual('didl 0', q.pop().metadata)
+        q.fill()
+        self.assertEqual(['url-1', 'url-2'], [t.url for t in q.peek()])
+        info = q.get_info()
+        self.assertEqual(3, info['prefetched'])
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(0, info['misses'])
+
+    def test_pop_not_prepared(self):
+        q = PlayQueue()
+        self.assertIsNone(q.pop())
+
+        q.reset(source(1))
+        self.assertEqual('url-0', q.pop().url)
+        self.assertEqual(1, q.get_info()['misses'])
+
+    def test_exhausted(self):
+        q = PlayQueue()
+        q.reset(source(1))
+        q.fill()
+        # the last one is still to be played
+        self.assertFalse(q.is_exhausted())
+        self.assertEqual('url-0', q.pop().url)
+        self.assertTrue(q.is_exhausted())
+        self.assertIsNone(q.pop())
+
+        q.reset(source(1))
+        self.assertFalse(q.is_exhausted())
+
+    def test_push_front(self):
+        q = PlayQueue(2)
+        q.reset(source(5))
+        q.fill()
+        q.push_front(QueuedTrack('back', None, None))
+        self.assertEqual(['back', 'url-0', 'url-1'], [t.url for t in q.peek()])
+        # nothing drawn until there is room again
+        q.fill()
+        self.assertEqual(3, len(q.peek()))
+        self.assertEqual('back', q.pop().url)
+
+    def test_reset(self):
+        q = PlayQueue()
+        q.reset(source(5))
+        q.fill()
+        q.reset()
+        self.assertEqual([], q.peek())
+        self.assertIsNone(q.pop())
+
+    def test_order_kept_while_filling(self):
+        q = PlayQueue(3)
+        drawing = threading.Event()
+        release = threading.Event()
+        tracks = source(5)
+
+        def slow():
+            drawing.set()
+            release.wait(5)
+            return tracks()
+        q.reset(slow)
+        filling = threading.Thread(target=q.fill)
+        filling.start()
+        drawing.wait(5)
+        popped = []
+        popping = threading.Thread(target=lambda: popped.append(q.pop()))
+        popping.start()
+        release.set()
+        popping.join(5)
+        filling.join(5)
+
+        # either taken from the ring or drawn after the fill's draw
+        self.assertEqual('url-0', popped[0].url)
+        self.assertEqual('url-1', q.peek()[0].url)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            PlayQueue(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+from concurrent.futures import Future
 from unittest.mock import MagicMock, patch, call
 
 from controller.player_dispatcher import PlayerDispatcher
@@ -28,7 +29,7 @@ class TestPlayerDispatcher(unittest.TestCase):
 
     DEFAULT_URL = 'http://bla'
 
-    def _testee(self):
+    def _testee(self, groups: dict = None):
 
         def true_on_audio(type: str):
             if "audio" == type:
@@ -52,9 +53,12 @@ class TestPlayerDispatcher(unittest.TestCase):
         self.FAKE_PLAYER_A.reset_mock()
         self.FAKE_PLAYER_B.reset_mock()
 
+        self.FAKE_PLAYER_A.is_circuit_open.return_value = False
+        self.FAKE_PLAYER_B.is_circuit_open.return_value = False
+
         self.FAKE_MANAGER.get_players.return_value = [self.FAKE_PLAYER_A, self.FAKE_PLAYER_B]
 
-        return PlayerDispatcher(self.FAKE_MANAGER, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        return PlayerDispatcher(self.FAKE_MANAGER, self.FAKE_SERVER, self.FAKE_SCHEDULER, groups=groups)
 
     @patch("controller.player_dispatcher.Integrator")
     @patch("controller.player_dispatcher.ensure_online")
@@ -64,7 +68,7 @@ class TestPlayerDispatcher(unittest.TestCase):
         i = integrator_constructor.return_value
         self._testee().pause(None)
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_A, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_A, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.pause.assert_called_with()
         ensure_online.assert_called_with(self.FAKE_PLAYER_A)
 
@@ -76,7 +80,7 @@ class TestPlayerDispatcher(unittest.TestCase):
 
         self._testee().pause(Command('B'))
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.pause.assert_called_with()
         ensure_online.assert_called_with(self.FAKE_PLAYER_B)
 
@@ -88,10 +92,21 @@ class TestPlayerDispatcher(unittest.TestCase):
 
         self._testee().stop(Command('B'))
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.stop.assert_called_with()
         ensure_online.assert_called_with(self.FAKE_PLAYER_B)
 
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_queue_info(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrator_constructor.return_value.get_queue_info.return_value = {'depth': 0}
+
+        d = self._testee()
+        self.assertEqual({}, d.get_queue_info())
+        d.play(PlayCommand(target='A', url=self.DEFAULT_URL))
+        self.assertEqual({'A': {'depth': 0}}, d.get_queue_info())
+
     @patch("controller.player_dispatcher.Integrator")
     @patch("controller.player_dispatcher.ensure_online")
     def test_state(self, ensure_online, integrator_constructor):
@@ -131,7 +146,7 @@ class TestPlayerDispatcher(unittest.TestCase):
         t = self._testee()
         t.play(c)
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.play.assert_called_with(c)
         ensure_online.assert_called_with(self.FAKE_PLAYER_B)
 
@@ -152,7 +167,7 @@ class TestPlayerDispatcher(unittest.TestCase):
         stateful_dispatcher.play(c)
         stateful_dispatcher.play(c)
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.play.assert_called_with(c)
         ensure_online.assert_called_with(self.FAKE_PLAYER_B)
 
@@ -162,6 +177,22 @@ class TestPlayerDispatcher(unittest.TestCase):
         self.FAKE_PLAYER_B.get_name.assert_called()
         self.assertTrue(state_res[0].player_name, 'B')
 
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_skips_open_circuit(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        t = self._testee()
+        self.FAKE_PLAYER_A.is_circuit_open.return_value = True
+
+        t.play(PlayCommand(url=self.DEFAULT_URL))
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
+        # not even checked for being online
+        ensure_online.assert_called_once_with(self.FAKE_PLAYER_B)
+
+        with self.assertRaises(RequestCannotBeHandeledException):
+            t.play(PlayCommand(target='A', url=self.DEFAULT_URL))
+        ensure_online.assert_called_once_with(self.FAKE_PLAYER_B)
+
     @patch("controller.player_dispatcher.Integrator")
     @patch("controller.player_dispatcher.ensure_online")
     def test_play_target_but_offline(self, ensure_online, integrator_constructor):
@@ -185,7 +216,7 @@ class TestPlayerDispatcher(unittest.TestCase):
         c = PlayCommand(url=self.DEFAULT_URL, type='audio')
         self._testee().play(c)
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_A, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_A, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.play.assert_called_with(c)
         ensure_online.assert_called_with(self.FAKE_PLAYER_A)
 
@@ -211,7 +242,7 @@ class TestPlayerDispatcher(unittest.TestCase):
         c = PlayCommand(url=self.DEFAULT_URL, type='video')
         self._testee().play(c)
 
-        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER)
+        integrator_constructor.assert_called_with(self.FAKE_PLAYER_B, self.FAKE_SERVER, self.FAKE_SCHEDULER, None, None)
         i.play.assert_called_with(c)
         ensure_online.assert_called_with(self.FAKE_PLAYER_B)
 
@@ -227,3 +258,176 @@ class TestPlayerDispatcher(unittest.TestCase):
         integrator_constructor.assert_not_called()
         i.play.assert_not_called()
         ensure_online.has_calls(call(self.FAKE_PLAYER_A), call(self.FAKE_PLAYER_B))
+
+    def _integrators_for_group(self, integrator_constructor) -> list[MagicMock]:
+        integrators = [MagicMock(), MagicMock()]
+        for n, i in enumerate(integrators):
+            f = Future()
+            f.set_result(f"state {n}")
+            i.submit_play.return_value = f
+        integrator_constructor.side_effect = integrators
+        return integrators
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_group_list(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        server = MagicMock()
+        t = self._testee()
+        t._media_server = server
+
+        c = PlayCommand(target=['A', 'B'], artist='x')
+        res = t.play(c)
+
+        # searched once for both
+        server.search.assert_called_once_with(artist='x')
+        sequences = [i.submit_play.call_args[0][1] for i in integrators]
+        self.assertIs(sequences[0], sequences[1])
+        self.assertIs(server.search.return_value, sequences[0].get_search_response())
+        integrators[0].play.assert_not_called()
+        self.assertEqual(['A', 'B'], [s.player_name for s in res])
+        self.assertEqual(['state 0', 'state 1'], [s.state for s in res])
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_configured_group_url(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+
+        c = PlayCommand(target='Everywhere', url=self.DEFAULT_URL)
+        t = self._testee({'Everywhere': ['B', 'A']})
+        res = t.play(c)
+
+        integrators[0].submit_play.assert_called_once_with(c, None)
+        integrators[1].submit_play.assert_called_once_with(c, None)
+        self.assertEqual(['B', 'A'], [s.player_name for s in res])
+        self.assertEqual(['B', 'A'], [s.player_name for s in t.state(Command('Everywhere'))])
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_group_playlist(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        server = MagicMock()
+        t = self._testee()
+        t._media_server = server
+
+        c = PlayCommand(target=['A', 'B'], playlist=[self.DEFAULT_URL, '64$1'])
+        t.play(c)
+
+        # each plays the list on its own
+        server.search.assert_not_called()
+        for i in integrators:
+            i.submit_play.assert_called_once_with(c, None)
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_queue(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        for n, i in enumerate(integrators):
+            i.get_play_queue.return_value = f"queue {n}"
+
+        t = self._testee()
+        self.assertEqual([], t.queue(None))
+        t.play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+        self.assertEqual([('A', 'queue 0'), ('B', 'queue 1')], [(q.player_name, q.queue) for q in t.queue(None)])
+        self.assertEqual([('B', 'queue 1')], [(q.player_name, q.queue) for q in t.queue(Command('B'))])
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_next_track(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        for n, i in enumerate(integrators):
+            i.get_state.return_value.running = n == 1
+            i.next_track.return_value = f"next {n}"
+
+        t = self._testee()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            t.next_track(None)
+        t.play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+        ensure_online.reset_mock()
+
+        # the one playing, without waking anything up
+        self.assertEqual('next 1', t.next_track(None))
+        self.assertEqual('next 0', t.next_track(Command('A')))
+        self.assertEqual(['next 0', 'next 1'], [s.state for s in t.next_track(Command(['A', 'B']))])
+        ensure_online.assert_not_called()
+
+        t.previous_track(Command('B'))
+        integrators[1].previous_track.assert_called_once_with()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            t.next_track(Command('C'))
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_resume(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        for n, i in enumerate(integrators):
+            i.is_paused.return_value = n == 1
+            i.resume.return_value = f"resumed {n}"
+
+        t = self._testee()
+        with self.assertRaises(RequestCannotBeHandeledException):
+            t.resume(None)
+        t.play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+        ensure_online.reset_mock()
+
+        # the one paused, without waking the first player up
+        self.assertEqual('resumed 1', t.resume(None))
+        self.assertEqual('resumed 1', t.resume(Command('B')))
+        self.assertEqual(['resumed 0', 'resumed 1'], [s.state for s in t.resume(Command(['A', 'B']))])
+        ensure_online.assert_not_called()
+        integrators[0].is_paused.return_value = False
+        integrators[1].is_paused.return_value = False
+        with self.assertRaises(RequestCannotBeHandeledException):
+            t.resume(None)
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_group_partly_available(self, ensure_online, integrator_constructor):
+        ensure_online.side_effect = lambda p: p == self.FAKE_PLAYER_B
+        self._integrators_for_group(integrator_constructor)
+
+        res = self._testee().play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+        self.assertEqual(['B'], [s.player_name for s in res])
+
+        ensure_online.side_effect = None
+        ensure_online.return_value = False
+        with self.assertRaises(RequestCannotBeHandeledException):
+            self._testee().play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_play_group_member_fails(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+        failed = Future()
+        failed.set_exception(OSError('unreachable'))
+        integrators[0].submit_play.return_value = failed
+
+        res = self._testee().play(PlayCommand(target=['A', 'B'], url=self.DEFAULT_URL))
+        self.assertEqual(['B'], [s.player_name for s in res])
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_group_unknown_player(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+
+        with self.assertRaises(RequestCannotBeHandeledException):
+            self._testee().play(PlayCommand(target=['A', 'C'], url=self.DEFAULT_URL))
+        integrator_constructor.assert_not_called()
+
+    @patch("controller.player_dispatcher.Integrator")
+    @patch("controller.player_dispatcher.ensure_online")
+    def test_stop_group(self, ensure_online, integrator_constructor):
+        ensure_online.return_value = True
+        integrators = self._integrators_for_group(integrator_constructor)
+
+        res = self._testee().stop(Command(['A', 'B']))
+        for i in integrators:
+            i.stop.assert_called_once_with()
+        self.assertEqual(['A', 'B'], [s.player_name for s in res])
@@ -20,6 +20,18 @@ class TestPlayerWrapper(unittest.TestCase):
     DEFAULT_FRIENDLY_NAME = 'Chekov'
     DEFAULT_LOCATION = 'http://bla.foo'
     DEFAULT_UDN = '123456789'
+    DEFAULT_CONFIG_ID = '7'
+
+    def setUp(self):
+        # the fake devices answer through upnpclient's interface
+        patcher = patch('controller.player_wrapper._query_protocol_info',
+                        side_effect=lambda device, policy: device.ConnectionManager.GetProtocolInfo())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # the devices answering the SSDP search
+        patcher = patch('dlna.ssdp.search', return_value={self.DEFAULT_LOCATION: self.DEFAULT_CONFIG_ID})
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def _create_discoverable_player(self):
         disc_player = MagicMock()
@@ -69,10 +81,10 @@ class TestPlayerWrapper(unittest.TestCase):
         # check json dumpable
         json.dumps(p.to_view())
 
-    @patch('upnpclient.discover')
-    def test_simple_discovered(self, upnp_discover):
+    @patch('upnpclient.Device')
+    def test_simple_discovered(self, upnp_device):
         discoverable_player = self._create_discoverable_player()
-        upnp_discover.return_value = [discoverable_player]
+        upnp_device.return_value = discoverable_player
 
         players = discover()
         self.assertEqual(1, len(players))
@@ -96,24 +108,24 @@ class TestPlayerWrapper(unittest.TestCase):
         # check json dumpable
         json.dumps(p.to_view())
 
-    @patch('upnpclient.discover')
-    def test_non_discoverable(self, upnp_discover):
+    @patch('upnpclient.Device')
+    def test_non_discoverable(self, upnp_device):
         discoverable_player = self._create_discoverable_player()
 
         non_av_service = MagicMock()
         non_av_service.name = 'No-real-service'
         discoverable_player.services = [non_av_service]
 
-        upnp_discover.return_value = [discoverable_player]
+        upnp_device.return_value = discoverable_player
 
         players = discover()
         self.assertEqual(0, len(players))
 
-    @patch('upnpclient.discover')
-    def test_non_capability_detectable(self, upnp_discover):
+    @patch('upnpclient.Device')
+    def test_non_capability_detectable(self, upnp_device):
         # test1: sink without any format -> no capabilities
         discoverable_player = self._create_discoverable_player()
-        upnp_discover.return_value = [discoverable_player]
+        upnp_device.return_value = discoverable_player
         protocol = {'Sink': 'only-5d-cinema'}
         discoverable_player.ConnectionManager.GetProtocolInfo.return_value = protocol
 
@@ -127,7 +139,7 @@ class TestPlayerWrapper(unittest.TestCase):
 
         # tes2: no action defined -> no capabilities
         discoverable_player = self._create_discoverable_player()
-        upnp_discover.return_value = [discoverable_player]
+        upnp_device.return_value = discoverable_player
         discoverable_player.actions = []
         players = discover()
         self.assertEqual(1, len(players))
@@ -137,11 +149,11 @@ class TestPlayerWrapper(unittest.TestCase):
         self.assertFalse(p.can_play_type('video'))
         self.assertFalse(p.can_play_type('image'))
 
-    @patch('upnpclient.discover')
-    def test_all_capabilities(self, upnp_discover):
+    @patch('upnpclient.Device')
+    def test_all_capabilities(self, upnp_device):
 
         discoverable_player = self._create_discoverable_player()
-        upnp_discover.return_value = [discoverable_player]
+        upnp_device.return_value = discoverable_player
         protocol = {'Sink': 'audio-video-and-image'}
         discoverable_player.ConnectionManager.GetProtocolInfo.return_value = protocol
 
@@ -153,17 +165,44 @@ class TestPlayerWrapper(unittest.TestCase):
         self.assertTrue(p.can_play_type('video'))
         self.assertTrue(p.can_play_type('image'))
 
-    @patch('upnpclient.Device')
+    @patch('dlna.upnp_control.Device')
     def test_configured(self, device_constructor: MagicMock):
 
         p = configure(self.DEFAULT_CONFIG)
         p.get_dlna_player()
-        device_constructor.assert_called_with(self.DEFAULT_CONFIG['url'])
+        device_constructor.assert_called_with(self.DEFAULT_CONFIG['url'], None, (3, 5))
 
         device_constructor.reset_mock()
         p.get_dlna_player()
         device_constructor.assert_not_called()
 
+    @patch('dlna.upnp_control.Device')
+    @patch('upnpclient.Device')
+    def test_discovered_config_id(self, upnp_device, device_constructor: MagicMock):
+        upnp_device.return_value = self._create_discoverable_player()
+        cache = MagicMock()
+        cache.get.return_value = b'<root/>'
+
+        p = discover(cache)[0]
+        p.get_dlna_player()
+        upnp_device.assert_called_once_with(self.DEFAULT_LOCATION)
+        # a description cached before another configId was announced is not used
+        self.assertEqual((self.DEFAULT_LOCATION, self.DEFAULT_CONFIG_ID), cache.get.call_args.args)
+
+    @patch('dlna.upnp_control.Device')
+    def test_configured_description_cache(self, device_constructor: MagicMock):
+        cache = MagicMock()
+        cache.get.return_value = b'<root/>'
+
+        p = configure(self.DEFAULT_CONFIG, cache)
+        p.get_dlna_player()
+        device_constructor.assert_called_with(self.DEFAULT_CONFIG['url'], b'<root/>', (3, 5))
+
+        # a changed description updates the device in place
+        on_change = cache.get.call_args[1]['on_change']
+        on_change(b'<root>changed</root>')
+        device_constructor.return_value.update.assert_called_with(b'<root>changed</root>')
+
     def test_configured_and_discovered(self):
         p = configure(self.DEFAULT_CONFIG)
         pd = self.create_discovered_player()
@@ -0,0 +1,37 @@
+import unittest
+import threading
+
+from controller.poller import Poller
+
+
+class TestPoller(unittest.TestCase):
+
+    def test_poll(self):
+        poller = Poller(workers=2)
+        poller.start()
+        polled = threading.Event()
+        threads = []
+
+        def poll():
+            threads.append(threading.current_thread().name)
+            polled.set()
+        try:
+            poller.start_job('Media_Observer_a', poll, 60)
+            self.assertTrue(poller.run_job_now('Media_Observer_a'))
+            self.assertTrue(polled.wait(5))
+        finally:
+            poller.shutdown()
+
+        self.assertTrue(threads[0].startswith('Poller'))
+        info = poller.get_info()
+        self.assertEqual(2, info['workers'])
+        self.assertEqual(1, info['runs'])
+
+    def test_defaults(self):
+        poller = Poller()
+        self.assertEqual(Poller.DEFAULT_WORKERS, poller.get_info()['workers'])
+        self.assertEqual(Poller.DEFAULT_RESOLUTION, poller._resolution)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
-from controller.scheduler import Scheduler
+from controller.scheduler import Scheduler, HeapScheduler
 import unittest
+import threading
+from time import sleep
 
 
 class TestScheduler(unittest.TestCase):
@@ -7,6 +9,7 @@ class TestScheduler(unittest.TestCase):
     DEFAULT_NAME = 'asdf'
     DEFAULT_INTERVAL = 10
 
+    # the APScheduler backend
     def _testee(self) -> Scheduler:
         return Scheduler()
 
@@ -56,3 +59,160 @@ class TestScheduler(unittest.TestCase):
         self.assertEqual(0, len(s.scheduler.get_jobs()))  # no jobs
         s.start_job(self.DEFAULT_NAME, self._noop, self.DEFAULT_INTERVAL, immediate=True)
         self.assertEqual(1, len(s.scheduler.get_jobs()))  # 1 job
+
+    def test_run_job_now(self):
+        s = self._testee()
+        s.start()
+        ran = threading.Event()
+
+        self.assertFalse(s.run_job_now(self.DEFAULT_NAME))
+        s.start_job(self.DEFAULT_NAME, ran.set, 3600)
+        self.assertTrue(s.run_job_now(self.DEFAULT_NAME))
+        self.assertTrue(ran.wait(2))
+        # the job is kept
+        self.assertEqual(1, len(s.scheduler.get_jobs()))
+        s.scheduler.shutdown()
+
+    def test_reschedule_job(self):
+        s = self._testee()
+        s.start()
+
+        self.assertFalse(s.reschedule_job(self.DEFAULT_NAME, 5))
+        s.start_job(self.DEFAULT_NAME, self._noop, 3600)
+        self.assertTrue(s.reschedule_job(self.DEFAULT_NAME, 5))
+        self.assertEqual(5, s.scheduler.get_job(self.DEFAULT_NAME).trigger.interval.total_seconds())
+        s.scheduler.shutdown()
+
+
+class TestHeapScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = HeapScheduler(workers=2, resolution=0.01)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def _counter(self):
+        calls = []
+        return calls, lambda: calls.append(threading.current_thread().name)
+
+    def test_interval(self):
+        calls, fn = self._counter()
+        self.scheduler.start_job('a', fn, 0.05)
+        sleep(0.28)
+        self.assertTrue(3 <= len(calls) <= 7, len(calls))
+        self.assertTrue(all(name.startswith('Scheduler') for name in calls))
+
+        self.scheduler.stop_job('a')
+        count = len(calls)
+        sleep(0.1)
+        self.assertEqual(count, len(calls))
+        self.assertEqual(0, self.scheduler.get_info()['jobs'])
+
+    def test_immediate_and_run_now(self):
+        calls, fn = self._counter()
+        self.scheduler.start_job('a', fn, 60, immediate=True)
+        sleep(0.05)
+        self.assertEqual(1, len(calls))
+
+        self.assertTrue(self.scheduler.run_job_now('a'))
+        sleep(0.05)
+        self.assertEqual(2, len(calls))
+        self.assertFalse(self.scheduler.run_job_now('unknown'))
+
+    def test_reschedule(self):
+        calls, fn = self._counter()
+        self.scheduler.start_job('a', fn, 60)
+        self.assertTrue(self.scheduler.reschedule_job('a', 0.05))
+        sleep(0.08)
+        self.assertEqual(1, len(calls))
+        self.assertFalse(self.scheduler.reschedule_job('unknown', 1))
+
+    def test_batch(self):
+        calls, fn = self._counter()
+        for n in range(20):
+            self.scheduler.start_job(str(n), fn, 60, immediate=True)
+        sleep(0.1)
+
+        self.assertEqual(20, len(calls))
+        info = self.scheduler.get_info()
+        self.assertEqual(20, info['max_batch'])
+        self.assertEqual(1, info['ticks'])
+        self.assertIsNotNone(info['avg_lag_seconds'])
+        # a fixed number of threads
+        self.assertTrue(len({name for name in calls}) <= 2)
+
+    def test_skip_if_running(self):
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+        self.scheduler.start_job('a', slow, 0.02)
+        sleep(0.15)
+        release.set()
+        sleep(0.01)
+
+        self.assertEqual(1, len(calls))
+        self.assertTrue(self.scheduler.get_info()['skipped'] >= 3)
+
+    def test_run_now_while_running(self):
+        release = threading.Event()
+        started = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+        self.scheduler.start_job('a', slow, 60, immediate=True)
+        started.wait(5)
+        self.scheduler.run_job_now('a')
+        release.set()
+        sleep(0.05)
+
+        # done again once the running one finished
+        self.assertEqual(2, len(calls))
+
+    def test_error(self):
+        def fail():
+            raise ValueError('nope')
+        calls, fn = self._counter()
+        self.scheduler.start_job('a', fail, 60, immediate=True)
+        self.scheduler.start_job('b', fn, 60, immediate=True)
+        sleep(0.05)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, self.scheduler.get_info()['errors'])
+
+    def test_lag(self):
+        release = threading.Event()
+        scheduler = HeapScheduler(workers=1)
+        # due while the poller is not running yet
+        scheduler.start_job('a', release.set, 0.01, immediate=True)
+        sleep(0.1)
+        scheduler.start()
+        release.wait(5)
+        scheduler.shutdown()
+
+        self.assertTrue(scheduler.get_info()['max_lag_seconds'] >= 0.1)
+
+    def test_stale_entries_compacted(self):
+        calls, fn = self._counter()
+        self.scheduler.start_job('a', fn, 60)
+        for n in range(500):
+            self.scheduler.reschedule_job('a', 60 + n)
+        self.scheduler.run_job_now('a')
+        sleep(0.05)
+
+        self.assertEqual(1, len(calls))
+        self.assertTrue(len(self.scheduler._heap) < 100)
+
+    def test_blocking(self):
+        scheduler = HeapScheduler(workers=1)
+        scheduler.start_job('a', scheduler.shutdown, 0.01, immediate=True)
+        # returns once shut down by the job
+        scheduler.start(blocking=True)
+        self.assertEqual(1, scheduler.get_info()['runs'])
@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 
 from controller.webserver import WebServer
 from controller.appinfo import AppInfo
+from controller.player_dispatcher import StatePerPlayer
 from controller.data.exceptions import RequestCannotBeHandeledException, RequestInvalidException
 
 
@@ -68,6 +69,14 @@ class TestWebServer(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.DEFAULT_DISPATCHER.state.assert_called()
 
+    def test_queue(self):
+        client = self.client()
+
+        self.DEFAULT_DISPATCHER.queue.return_value = {'foo': 'bar'}
+        response = client.get("/queue", json=self.DEFAULT_TARGET_JSON)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('a', self.DEFAULT_DISPATCHER.queue.call_args[0][0].target)
+
     def test_stop(self):
         client = self.client()
 
@@ -84,6 +93,28 @@ class TestWebServer(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.DEFAULT_DISPATCHER.pause.assert_called()
 
+    def test_resume(self):
+        client = self.client()
+
+        self.DEFAULT_DISPATCHER.resume.return_value = {'foo': 'bar'}
+        response = client.post("/resume", json=self.DEFAULT_TARGET_JSON)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('a', self.DEFAULT_DISPATCHER.resume.call_args[0][0].target)
+
+    def test_next_and_previous(self):
+        client = self.client()
+
+        self.DEFAULT_DISPATCHER.next_track.return_value = {'foo': 'bar'}
+        response = client.post("/next", json=self.DEFAULT_TARGET_JSON)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('a', self.DEFAULT_DISPATCHER.next_track.call_args[0][0].target)
+
+        self.DEFAULT_DISPATCHER.previous_track.side_effect = RequestCannotBeHandeledException('No previous track')
+        response = client.post("/previous", json=self.DEFAULT_TARGET_JSON)
+        self.assertEqual(500, response.status_code)
+        self.assertEqual(b'No previous track', response.data)
+        self.DEFAULT_DISPATCHER.previous_track.side_effect = None
+
     def test_play_404(self):
         client = self.client()
 
@@ -102,6 +133,29 @@ class TestWebServer(unittest.TestCase):
         self.assertEqual(200, response.status_code)
         self.DEFAULT_DISPATCHER.play.assert_called()
 
+    def test_play_group(self):
+        client = self.client()
+
+        self.DEFAULT_DISPATCHER.play.side_effect = None
+        self.DEFAULT_DISPATCHER.play.return_value = [StatePerPlayer('A', TestWebServer.MyState(None)),
+                                                     StatePerPlayer('B', TestWebServer.MyState('foo'))]
+        response = client.post("/play", json={'target': ['A', 'B'], 'artist': 'x'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['A', 'B'], self.DEFAULT_DISPATCHER.play.call_args[0][0].target)
+
+        self.DEFAULT_DISPATCHER.play.return_value = [StatePerPlayer('A', TestWebServer.MyState(None))]
+        response = client.post("/play", json={'target': ['A', 'B'], 'artist': 'x'})
+        self.assertEqual(404, response.status_code)
+
+    def test_play_playlist(self):
+        client = self.client()
+
+        self.DEFAULT_DISPATCHER.play.side_effect = None
+        self.DEFAULT_DISPATCHER.play.return_value = TestWebServer.MyState('foo')
+        response = client.post("/play", json={'target': 'a', 'playlist': ['http://x/a.mp3', '64$1']})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(['http://x/a.mp3', '64$1'], self.DEFAULT_DISPATCHER.play.call_args[0][0].playlist)
+
     def test_play_request_invalid(self):
         client = self.client()
 
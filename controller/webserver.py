@@ -36,7 +36,11 @@ class WebServer():
         self.app.add_url_rule(rule="/play", view_func=self.play, methods=['POST'])
         self.app.add_url_rule(rule="/stop", view_func=self.stop, methods=['POST'])
         self.app.add_url_rule(rule="/pause", view_func=self.pause, methods=['POST'])
+        self.app.add_url_rule(rule="/resume", view_func=self.resume, methods=['POST'])
+        self.app.add_url_rule(rule="/next", view_func=self.next_track, methods=['POST'])
+        self.app.add_url_rule(rule="/previous", view_func=self.previous_track, methods=['POST'])
         self.app.add_url_rule(rule="/state", view_func=self.current_state, methods=['GET'])
+        self.app.add_url_rule(rule="/queue", view_func=self.queue, methods=['GET'])
         self.app.add_url_rule(rule="/exit", view_func=self.exit, methods=['GET', 'POST'])
         self.app.add_url_rule(rule="/info", view_func=self.info, methods=['GET'])
 
@@ -83,11 +87,18 @@ class WebServer():
                                    title=content.get('title'),
                                    target=content.get('target'),
                                    type=content.get('type'),
-                                   loop=content.get('loop', False))
+                                   loop=content.get('loop', False),
+                                   playlist=content.get('playlist'))
         logger.debug(f"extracted information {str(play_command)}")
 
         try:
             state = self.dispatcher.play(play_command)
+            # a group results in the state per player
+            if isinstance(state, list):
+                if all(s.state.last_played_url is None for s in state):
+                    return self._make_response_and_add_cors("Kein passenden Titel gefunden", 404)
+                return self._make_response_and_add_cors(jsonify(state), 200)
+
             if (state.last_played_url is None):
                 return self._make_response_and_add_cors("Kein passenden Titel gefunden", 404)
 
@@ -124,8 +135,20 @@ class WebServer():
     def pause(self):
         return self._commandable_method(self.dispatcher.pause)
 
+    def resume(self):
+        return self._commandable_method(self.dispatcher.resume)
+
+    def next_track(self):
+        return self._commandable_method(self.dispatcher.next_track)
+
+    def previous_track(self):
+        return self._commandable_method(self.dispatcher.previous_track)
+
     def current_state(self):
         return self._commandable_method(self.dispatcher.state)
 
+    def queue(self):
+        return self._commandable_method(self.dispatcher.queue)
+
     def info(self):
         return self.appinfo.get()
@@ -0,0 +1,159 @@
+import random
+import logging
+import threading
+from time import monotonic, sleep
+from http.client import HTTPException
+from urllib.error import HTTPError
+
+logger = logging.getLogger(__file__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    '''the renderer is known to be unresponsive, the call was not even tried'''
+
+
+class CircuitBreaker():
+    '''Opens after failure_threshold consecutive failures, so further calls fail fast.
+    After reset_timeout a single trial call is let through: its success closes the circuit again.
+    '''
+
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_RESET_TIMEOUT = 30
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened: float = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    def get_state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened is None:
+            return CLOSED
+        if monotonic() - self._opened >= self._reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def is_open(self) -> bool:
+        '''whether calls would fail fast right now'''
+        with self._lock:
+            state = self._state()
+            return state == OPEN or (state == HALF_OPEN and self._trial)
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._opened is not None:
+                logger.debug('circuit closed again')
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or (self._opened is None and self._failures >= self._failure_threshold):
+                if not self._trial:
+                    self._stats['opened'] += 1
+                # a failed trial waits another reset_timeout
+                self._opened = monotonic()
+                self._trial = False
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return dict(self._stats, state=self._state(), failures=self._failures)
+
+
+class CallPolicy():
+    '''How calls to a single renderer are made: bounded connect and read timeouts,
+    retries with jittered exponential backoff for idempotent queries, and a circuit breaker.
+    Only network errors are retried, errors reported by the renderer itself (SOAP faults, HTTP error statuses)
+    prove it responsive.
+    '''
+
+    DEFAULT_CONNECT_TIMEOUT = 3
+    DEFAULT_READ_TIMEOUT = 5
+    DEFAULT_RETRIES = 2
+    DEFAULT_BACKOFF = 0.2
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 failure_threshold: int = CircuitBreaker.DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CircuitBreaker.DEFAULT_RESET_TIMEOUT):
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'retries': 0, 'failures': 0}
+
+    def get_timeout(self) -> tuple[float, float]:
+        '''(connect, read) timeout in seconds'''
+        return (self._connect_timeout, self._read_timeout)
+
+    def is_open(self) -> bool:
+        return self._breaker.is_open()
+
+    def _delay(self, attempt: int) -> float:
+        # full jitter: renderers recovering from a hiccup don't get all retries at the same moment
+        return random.uniform(0, self._backoff * (2 ** attempt))
+
+    def call(self, fn, idempotent: bool = False):
+        '''calls fn following the policy, raises CircuitOpenError without calling if the circuit is open'''
+        if not self._breaker.allow():
+            raise CircuitOpenError('renderer is not responding')
+        with self._lock:
+            self._stats['calls'] += 1
+        attempts = 1 + (self._retries if idempotent else 0)
+        for attempt in range(attempts):
+            try:
+                result = fn()
+            except HTTPError:
+                # an OSError, but answered with an error status
+                self._breaker.record_success()
+                raise
+            except (OSError, HTTPException) as e:
+                if attempt + 1 >= attempts:
+                    with self._lock:
+                        self._stats['failures'] += 1
+                    self._breaker.record_failure()
+                    raise
+                logger.debug(f"retrying after {e!r}")
+                with self._lock:
+                    self._stats['retries'] += 1
+                sleep(self._delay(attempt))
+            except Exception:
+                # answered, e.g. with a SOAP fault
+                self._breaker.record_success()
+                raise
+            else:
+                self._breaker.record_success()
+                return result
+
+    def get_info(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+        res['circuit'] = self._breaker.get_info()
+        res['connect_timeout'], res['read_timeout'] = self.get_timeout()
+        return res
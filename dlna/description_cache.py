@@ -0,0 +1,145 @@
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from time import time
+
+from dlna import dlna_helper
+from dlna.upnp_control import NAMESPACE_DEVICE
+
+logger = logging.getLogger(__file__)
+
+
+def identify(description: bytes) -> tuple[str, str]:
+    '''UDN and configId (UPnP 1.1) of a device description, either may be None'''
+    root = ET.fromstring(description)
+    return root.findtext(f"{{{NAMESPACE_DEVICE}}}device/{{{NAMESPACE_DEVICE}}}UDN"), root.get('configId')
+
+
+def _content(entry: dict) -> bytes:
+    return base64.b64decode(entry['content'])
+
+
+class DescriptionCache():
+    '''Device descriptions kept on disk, so the first command after a restart needs no round trip.
+    Cached descriptions are returned right away. Ones older than max_age are revalidated in the
+    background with a conditional GET, a changed description (e.g. another UDN or configId after a
+    firmware update) replaces the entry and is handed to the on_change callback.
+    '''
+
+    DEFAULT_DIRECTORY = 'cache/descriptions'
+    DEFAULT_MAX_AGE = 60*60
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_age: float = DEFAULT_MAX_AGE):
+        self._directory = directory
+        self._max_age = max_age
+        self._refreshing: dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidations': 0, 'not_modified': 0, 'changes': 0,
+                       'errors': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, location: str) -> str:
+        return os.path.join(self._directory, hashlib.sha1(location.encode('utf-8')).hexdigest() + '.json')
+
+    def _read(self, location: str) -> dict | None:
+        try:
+            with open(self._path(location), encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.info(f"ignoring unreadable cached description of {location}", exc_info=e)
+            return None
+        # same file name for another url would be a hash collision
+        return entry if entry.get('location') == location and 'content' in entry else None
+
+    def _write(self, entry: dict):
+        path = self._path(entry['location'])
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def get(self, location: str, config_id: str = None, on_change=None, timeout: tuple[float, float] = None) -> bytes:
+        '''the description of the device at location, config_id as announced by the device (if known)'''
+        entry = self._read(location)
+        if entry is not None and (config_id is None or config_id == entry.get('config_id')):
+            with self._lock:
+                self._stats['hits'] += 1
+                if time() - entry['validated'] >= self._max_age:
+                    self._revalidate(entry, on_change, timeout)
+            return _content(entry)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return self._fetch(location, None, timeout)
+
+    def _fetch(self, location: str, cached: dict | None, timeout: tuple[float, float] = None) -> bytes:
+        headers = {"Connection": "keep-alive"}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        response = dlna_helper.http_request('GET', location, headers, timeout=timeout)
+        if cached is not None and response.getcode() == 304:
+            cached['validated'] = time()
+            self._write(cached)
+            with self._lock:
+                self._stats['not_modified'] += 1
+            return _content(cached)
+
+        description = response.read()
+        udn, config_id = identify(description)
+        # kept as received, its encoding is the one the XML declaration names
+        entry = {'location': location, 'udn': udn, 'config_id': config_id,
+                 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                 'validated': time(), 'content': base64.b64encode(description).decode('ascii')}
+        self._write(entry)
+        return description
+
+    def _revalidate(self, entry: dict, on_change, timeout: tuple[float, float]):
+        # called with lock held
+        location = entry['location']
+        if location in self._refreshing:
+            return
+        t = threading.Thread(target=self._refresh, args=(entry, on_change, timeout), name=f"DescriptionRefresh {location}",
+                             daemon=True)
+        self._refreshing[location] = t
+        t.start()
+
+    def _refresh(self, cached: dict, on_change, timeout: tuple[float, float]):
+        location = cached['location']
+        try:
+            description = self._fetch(location, cached, timeout)
+            with self._lock:
+                self._stats['revalidations'] += 1
+            if description != _content(cached):
+                logger.debug(f"description of {location} changed")
+                with self._lock:
+                    self._stats['changes'] += 1
+                if on_change is not None:
+                    on_change(description)
+        except Exception as e:
+            logger.info(f"revalidating description of {location} failed", exc_info=e)
+            with self._lock:
+                self._stats['errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.pop(location, None)
+
+    def clear(self):
+        for name in os.listdir(self._directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(self._directory, name))
+
+    def get_info(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+        res['entries'] = sum(1 for name in os.listdir(self._directory) if name.endswith('.json'))
+        res['directory'] = self._directory
+        return res
@@ -1,54 +1,90 @@
-from urllib.request import urlopen, Request
+import xml.etree.ElementTree as ET
+from urllib.error import HTTPError
+from xml.sax.saxutils import escape
+
+from dlna.http_pool import HTTPConnectionPools
 
 XML_HEADER = '<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n'
 NAMESPACE_DC = 'http://purl.org/dc/elements/1.1/'
 NAMESPACE_UPNP = 'urn:schemas-upnp-org:metadata-1-0/upnp/'
 NAMESPACE_DIDL = 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/'
+NAMESPACE_SOAP = 'http://schemas.xmlsoap.org/soap/envelope/'
+NAMESPACE_CONTROL = 'urn:schemas-upnp-org:control-1-0'
+
+SOAP_ENVELOPE = (XML_HEADER +
+                 '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+                 ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+                 '<u:{action} xmlns:u="{service_type}">{arguments}</u:{action}>'
+                 '</s:Body></s:Envelope>')
+
+# keep-alive connections shared by all SOAP traffic
+_POOLS = HTTPConnectionPools()
+
+
+class SOAPError(Exception):
+    '''an UPnP error returned by a device'''
+
+    def __init__(self, code: int, description: str):
+        self.code = code
+        self.description = description
+        super().__init__(f"{code}: {description}")
 
 
 def create_header(type, method):
     soapaction = '"urn:schemas-upnp-org:service:{t}:1#{m}"'.format(t=type, m=method)
     return {"Content-type": 'text/xml; charset="utf-8"',
             "Soapaction": soapaction,
-            "Connection": "close",
+            "Connection": "keep-alive",
             "Accept": "text/html, image/gif, image/jpeg, *; q=.2, */*; q=.2",
             "USER-AGENT": "dlna_mediacontroller/0.1 UPnP/1.0"
             }
 
 
-def send_request(url, headers, body):
-    req = Request(url, body.encode('utf-8'), headers)
-    return urlopen(req)
+def send_request(url, headers, body, stream=False):
+    return _POOLS.request('POST', url, body.encode('utf-8'), headers, stream)
+
+
+def http_request(method: str, url: str, headers: dict, body: bytes = None, timeout: tuple[float, float] = None):
+    '''plain request over the shared keep-alive connections, e.g. for GENA eventing'''
+    return _POOLS.request(method, url, body, headers, timeout=timeout)
 
 
-def namespace_free_res_element(xml_str):
-    ''' Workaround since python 3.6's xml.etree.ElementTree does not allow to print a string without namespace'''
-    # first parse the prefix
-    res_location_idx = xml_str.find('res')
-    # before that there is some kind of <
-    prefix_idx = xml_str.find('<', 0, res_location_idx)
-    # prefix now is ns0:
-    prefix = xml_str[prefix_idx+1:res_location_idx-1]
+def get_pool_statistics() -> dict:
+    return _POOLS.get_info()
 
-    # now cut openening and ending tag
-    # heavily rely on formatting:
-    # remove opening tag
-    result = xml_str.replace("<" + prefix + ":res", "<res")
-    # remove ending tag
-    result = result.replace(prefix + ':res>', 'res>')
 
-    # cut namespace definition
-    # in '... xmlns:ns0="urn:schemas-up..." ...' we shall find the ns0 and cut something before and after
-    prefix_idx = result.find(prefix)
+def soap_call(url: str, service_type: str, action: str, arguments: list[tuple[str, object]]) -> dict:
+    '''invokes a SOAP action, arguments in the order of the service description. Returns the out arguments.'''
+    args = ''.join(f"<{name}>{escape(str(value)) if value is not None else ''}</{name}>" for name, value in arguments)
+    body = SOAP_ENVELOPE.format(action=action, service_type=service_type, arguments=args)
+    headers = {"Content-type": 'text/xml; charset="utf-8"',
+               "Soapaction": f'"{service_type}#{action}"',
+               "Connection": "keep-alive",
+               "USER-AGENT": "dlna_mediacontroller/0.1 UPnP/1.0"}
+    try:
+        response = send_request(url, headers, body)
+    except HTTPError as e:
+        raise soap_error(e) from e
+    return parse_soap_response(response.read())
 
-    # now search things in front of prefix which usually is xmlns:
-    namespace_begin_idx = result.rfind(' ', 0, prefix_idx)
 
-    # find cut point the =. Therefore search first quote and following quote
-    first_quote_after_prefix_idx = result.find('"', prefix_idx)
-    second_quote_after_prefix_idx = result.find('"', first_quote_after_prefix_idx+1)
-    # ergo cut everything 'till second_quote_after_prefix (+1 for the ")
+def parse_soap_response(content: bytes | str) -> dict:
+    root = ET.fromstring(content)
+    body = root.find(f"{{{NAMESPACE_SOAP}}}Body")
+    if body is None or len(body) == 0:
+        return {}
+    # out arguments are unqualified children of the action's response element
+    return {child.tag: child.text or '' for child in body[0]}
 
-    result = result[0:namespace_begin_idx] + result[second_quote_after_prefix_idx+1:]
 
-    return result
+def soap_error(e: HTTPError) -> Exception:
+    '''the UPnP error within a fault response, the HTTPError itself if there is none'''
+    try:
+        root = ET.fromstring(e.read())
+    except ET.ParseError:
+        return e
+    code = root.find(f".//{{{NAMESPACE_CONTROL}}}errorCode")
+    description = root.find(f".//{{{NAMESPACE_CONTROL}}}errorDescription")
+    if code is None:
+        return e
+    return SOAPError(int(code.text), description.text if description is not None else None)
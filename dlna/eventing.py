@@ -0,0 +1,247 @@
+import uuid
+import socket
+import logging
+import threading
+from xml.parsers import expat
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+from dlna import dlna_helper
+
+# http://upnp.org/specs/arch/UPnP-arch-DeviceArchitecture-v1.1.pdf, chapter 4 Eventing
+
+logger = logging.getLogger(__file__)
+
+
+def _local_name(name: str) -> str:
+    # expat without namespace processing keeps the prefix
+    return name.rpartition(':')[2]
+
+
+def _reject_dtd(*args):
+    # events come from the network, entities could expand without bounds
+    raise ValueError('no DTD accepted in events')
+
+
+def _parse(content: bytes | str, start, end=None, data=None):
+    parser = expat.ParserCreate()
+    parser.StartDoctypeDeclHandler = _reject_dtd
+    parser.EntityDeclHandler = _reject_dtd
+    parser.StartElementHandler = start
+    if end is not None:
+        parser.EndElementHandler = end
+    if data is not None:
+        parser.CharacterDataHandler = data
+    parser.Parse(content, True)
+
+
+class _LastChangeParser():
+    '''Collects the state variables of one instance from the LastChange events of a NOTIFY propertyset'''
+
+    def __init__(self, instance_id: str):
+        self.values: dict[str, str] = {}
+        self._instance_id = instance_id
+        self._text: list[str] = None
+        self._in_instance = False
+
+    def parse(self, content: bytes | str) -> dict[str, str]:
+        _parse(content, self._start_property, self._end_property, self._data)
+        return self.values
+
+    def _start_property(self, name, attrs):
+        if _local_name(name) == 'LastChange':
+            self._text = []
+
+    def _end_property(self, name):
+        if _local_name(name) == 'LastChange':
+            text, self._text = ''.join(self._text), None
+            if text.strip():
+                _parse(text, self._start_event, self._end_event)
+
+    def _data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def _start_event(self, name, attrs):
+        if _local_name(name) == 'InstanceID':
+            self._in_instance = attrs.get('val') == self._instance_id
+        elif self._in_instance:
+            self.values[_local_name(name)] = attrs.get('val')
+
+    def _end_event(self, name):
+        if _local_name(name) == 'InstanceID':
+            self._in_instance = False
+
+
+def parse_last_change(content: bytes | str, instance_id: str = '0') -> dict[str, str]:
+    '''parses a NOTIFY propertyset, returns the state variables of LastChange for the instance'''
+    return _LastChangeParser(instance_id).parse(content)
+
+
+def local_address_for(url: str) -> str:
+    '''the own address used to reach the given url, which is where the device has to send its events'''
+    parts = urlsplit(url)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        # connecting an udp socket sends nothing, it just selects the route
+        s.connect((parts.hostname, parts.port or 80))
+        return s.getsockname()[0]
+
+
+def _parse_timeout(value: str | None, default: int) -> int:
+    if value is None:
+        return default
+    value = value.strip().lower()
+    if value.startswith('second-') and value[7:].isdigit():
+        return int(value[7:])
+    # 'infinite' is deprecated, renew now and then anyway
+    return default
+
+
+class Subscription():
+    '''GENA subscription to the events of a single service'''
+
+    DEFAULT_TIMEOUT = 1800
+
+    _sid: str = None
+
+    def __init__(self, event_url: str, callback_url: str, timeout: int = DEFAULT_TIMEOUT,
+                 request_timeout: tuple[float, float] = None):
+        self._event_url = event_url
+        self._callback_url = callback_url
+        self._requested_timeout = timeout
+        self._timeout = timeout
+        # (connect, read) timeout of the requests, the same as the renderer's calls
+        self._request_timeout = request_timeout
+        self._sid = None
+
+    def is_active(self) -> bool:
+        return self._sid is not None
+
+    def get_sid(self) -> str:
+        return self._sid
+
+    def get_callback_url(self) -> str:
+        return self._callback_url
+
+    def get_timeout(self) -> int:
+        '''seconds the device granted until the subscription has to be renewed'''
+        return self._timeout
+
+    def subscribe(self):
+        response = dlna_helper.http_request('SUBSCRIBE', self._event_url, {
+            'CALLBACK': f"<{self._callback_url}>",
+            'NT': 'upnp:event',
+            'TIMEOUT': f"Second-{self._requested_timeout}"}, timeout=self._request_timeout)
+        self._accept(response)
+        logger.debug(f"subscribed to {self._event_url} with {self._sid} for {self._timeout}s")
+
+    def renew(self):
+        if self._sid is None:
+            raise ValueError('not subscribed')
+        try:
+            response = dlna_helper.http_request('SUBSCRIBE', self._event_url, {
+                'SID': self._sid,
+                'TIMEOUT': f"Second-{self._requested_timeout}"}, timeout=self._request_timeout)
+        except Exception:
+            # the device forgot about us, e.g. after a restart
+            self._sid = None
+            raise
+        self._accept(response)
+
+    def unsubscribe(self):
+        sid, self._sid = self._sid, None
+        if sid is None:
+            return
+        try:
+            dlna_helper.http_request('UNSUBSCRIBE', self._event_url, {'SID': sid}, timeout=self._request_timeout)
+        except Exception as e:
+            logger.debug(f"unsubscribing {sid} failed, it expires anyway", exc_info=e)
+
+    def _accept(self, response):
+        sid = response.headers.get('SID')
+        if not sid:
+            raise ValueError(f"no SID in response of {self._event_url}")
+        self._sid = sid
+        self._timeout = _parse_timeout(response.headers.get('TIMEOUT'), self._requested_timeout)
+
+
+class _NotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_NOTIFY(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status = self.server.listener._notify(self.path.lstrip('/'), self.headers, body)
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class EventListener():
+    '''Local HTTP server receiving GENA NOTIFY requests.
+    Every registered subscriber gets its own callback path, its callback is invoked with the
+    LastChange state variables on the listener's thread.
+    '''
+
+    DEFAULT_PORT = 0
+
+    _server: ThreadingHTTPServer = None
+
+    def __init__(self, host: str = None, port: int = DEFAULT_PORT):
+        # host is the address devices send events to, derived per device if not given
+        self._host = host
+        self._port = port
+        self._server = None
+        self._callbacks: dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._stats = {'notifications': 0, 'unknown': 0, 'errors': 0}
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('', self._port), _NotifyHandler)
+        self._server.daemon_threads = True
+        self._server.listener = self
+        threading.Thread(target=self._server.serve_forever, name='EventListener', daemon=True).start()
+        logger.debug(f"listening for events on port {self.get_port()}")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def get_port(self) -> int:
+        return self._server.server_address[1]
+
+    def register(self, device_url: str, callback) -> str:
+        '''registers a callback for events, returns the url to subscribe with'''
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._callbacks[token] = callback
+        host = self._host or local_address_for(device_url)
+        return f"http://{host}:{self.get_port()}/{token}"
+
+    def unregister(self, callback_url: str):
+        with self._lock:
+            self._callbacks.pop(urlsplit(callback_url).path.lstrip('/'), None)
+
+    def _notify(self, token: str, headers, body: bytes) -> int:
+        with self._lock:
+            callback = self._callbacks.get(token)
+            if callback is None or headers.get('NT') != 'upnp:event' or headers.get('NTS') != 'upnp:propchange':
+                self._stats['unknown'] += 1
+                return 412
+            self._stats['notifications'] += 1
+        try:
+            callback(parse_last_change(body))
+        except Exception as e:
+            with self._lock:
+                self._stats['errors'] += 1
+            logger.info('error while handling event', exc_info=e)
+        return 200
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._callbacks),
+                        port=self.get_port() if self._server is not None else None)
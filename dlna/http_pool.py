@@ -0,0 +1,257 @@
+import logging
+import threading
+import select
+from io import BytesIO
+from time import monotonic
+from http.client import HTTPConnection, HTTPSConnection, HTTPResponse, RemoteDisconnected, HTTPMessage
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__file__)
+
+# errors of a kept-alive connection the server closed in the meantime, safe to retry on a fresh connection
+STALE_CONNECTION_ERRORS = (RemoteDisconnected, BrokenPipeError, ConnectionResetError, ConnectionAbortedError)
+
+
+class PooledResponse():
+    '''Fully read HTTP response, the connection it came from is already back in the pool'''
+
+    def __init__(self, url: str, status: int, reason: str, headers: HTTPMessage, data: bytes):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+    def getcode(self) -> int:
+        return self.status
+
+    def close(self):
+        pass
+
+
+class StreamingResponse(PooledResponse):
+    '''HTTP response read directly from the socket.
+    Its connection goes back to the pool when the body was read completely and is dropped when closed before.
+    '''
+
+    def __init__(self, url: str, response: HTTPResponse, finish):
+        super().__init__(url, response.status, response.reason, response.headers, None)
+        self._response = response
+        self._finish = finish
+
+    def read(self, amt: int = None) -> bytes:
+        try:
+            data = self._response.read(amt)
+        except Exception:
+            self.close()
+            raise
+        if self._response.isclosed():
+            self._complete(not self._response.will_close)
+        return data
+
+    def close(self):
+        self._complete(False)
+        self._response.close()
+
+    def _complete(self, reusable: bool):
+        finish, self._finish = self._finish, None
+        if finish is not None:
+            finish(reusable)
+
+
+class HTTPConnectionPool():
+    '''Keep-alive HTTP/1.1 connections to a single host.
+    At most max_size connections are open at the same time, further requests wait for a free one.
+    Idle connections are closed after idle_timeout and checked for being closed by the server before reuse.
+    '''
+
+    DEFAULT_MAX_SIZE = 4
+    DEFAULT_IDLE_TIMEOUT = 30
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, scheme: str, netloc: str, max_size: int = DEFAULT_MAX_SIZE,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT, timeout: float = DEFAULT_TIMEOUT):
+        self._connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        self._netloc = netloc
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._idle: list[tuple[HTTPConnection, float]] = []
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'reused': 0, 'opened': 0, 'discarded': 0, 'in_use': 0}
+
+    def _new_connection(self) -> HTTPConnection:
+        with self._lock:
+            self._stats['opened'] += 1
+        return self._connection_class(self._netloc, timeout=self._timeout)
+
+    def _is_healthy(self, conn: HTTPConnection, last_used: float) -> bool:
+        if monotonic() - last_used > self._idle_timeout:
+            return False
+        if conn.sock is None:
+            return False
+        # an idle keep-alive socket must not be readable, otherwise the server closed it (or sent garbage)
+        try:
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _acquire(self) -> tuple[HTTPConnection, bool]:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if self._is_healthy(conn, last_used):
+                return conn, True
+            self._discard(conn)
+        return self._new_connection(), False
+
+    def _release(self, conn: HTTPConnection):
+        with self._lock:
+            self._idle.append((conn, monotonic()))
+
+    def _discard(self, conn: HTTPConnection):
+        with self._lock:
+            self._stats['discarded'] += 1
+        conn.close()
+
+    def request(self, method: str, url: str, body: bytes = None, headers: dict = None,
+                stream: bool = False, timeout: tuple[float, float] = None) -> PooledResponse:
+        '''sends a request, stream returns before the body was read. Such a response must be read completely or closed.
+        timeout is (connect, read) in seconds for this request, the pool's timeout otherwise.'''
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        self._slots.acquire()
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['in_use'] += 1
+        try:
+            conn, response = self._send(method, path, body, headers or {}, timeout)
+        except Exception:
+            self._done()
+            raise
+
+        if stream and response.status < 400:
+            return StreamingResponse(url, response, lambda reusable: self._finish(conn, reusable))
+
+        reusable = False
+        try:
+            data = response.read()
+            reusable = not response.will_close
+        finally:
+            self._finish(conn, reusable)
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.headers, BytesIO(data))
+        return PooledResponse(url, response.status, response.reason, response.headers, data)
+
+    def _send(self, method, path, body, headers, timeout) -> tuple[HTTPConnection, HTTPResponse]:
+        conn, reused = self._acquire()
+        try:
+            response = self._exchange(conn, method, path, body, headers, timeout)
+            if reused:
+                with self._lock:
+                    self._stats['reused'] += 1
+            return conn, response
+        except STALE_CONNECTION_ERRORS:
+            self._discard(conn)
+            if not reused:
+                raise
+            logger.debug(f"kept-alive connection to {self._netloc} was closed, retrying")
+        except Exception:
+            self._discard(conn)
+            raise
+
+        conn = self._new_connection()
+        try:
+            return conn, self._exchange(conn, method, path, body, headers, timeout)
+        except Exception:
+            self._discard(conn)
+            raise
+
+    def _finish(self, conn: HTTPConnection, reusable: bool):
+        if reusable:
+            self._release(conn)
+        else:
+            self._discard(conn)
+        self._done()
+
+    def _done(self):
+        with self._lock:
+            self._stats['in_use'] -= 1
+        self._slots.release()
+
+    def _exchange(self, conn: HTTPConnection, method, path, body, headers, timeout=None):
+        if timeout is not None:
+            connect_timeout, read_timeout = timeout
+            if conn.sock is None:
+                conn.timeout = connect_timeout
+                conn.connect()
+            conn.sock.settimeout(read_timeout)
+        elif conn.sock is not None:
+            # kept alive after a request with a timeout of its own
+            conn.sock.settimeout(self._timeout)
+        conn.request(method, path, body, headers)
+        return conn.getresponse()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def get_info(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+            res['idle'] = len(self._idle)
+            res['open'] = res['idle'] + res['in_use']
+            res['max_size'] = self._max_size
+            res['reuse_ratio'] = round(res['reused'] / res['requests'], 3) if res['requests'] else 0.0
+            return res
+
+
+class HTTPConnectionPools():
+    '''One HTTPConnectionPool per scheme, host and port'''
+
+    def __init__(self, max_size: int = HTTPConnectionPool.DEFAULT_MAX_SIZE,
+                 idle_timeout: float = HTTPConnectionPool.DEFAULT_IDLE_TIMEOUT,
+                 timeout: float = HTTPConnectionPool.DEFAULT_TIMEOUT):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._timeout = timeout
+        self._pools: dict[str, HTTPConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, url: str) -> HTTPConnectionPool:
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = HTTPConnectionPool(parts.scheme, parts.netloc, self._max_size, self._idle_timeout, self._timeout)
+                self._pools[key] = pool
+            return pool
+
+    def request(self, method: str, url: str, body: bytes = None, headers: dict = None,
+                stream: bool = False, timeout: tuple[float, float] = None) -> PooledResponse:
+        return self.get_pool(url).request(method, url, body, headers, stream, timeout)
+
+    def close(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        for p in pools:
+            p.close()
+
+    def get_info(self) -> dict:
+        with self._lock:
+            pools = dict(self._pools)
+        return {key: p.get_info() for key, p in pools.items()}
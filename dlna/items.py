@@ -1,70 +1,127 @@
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
 from dlna import dlna_helper
 
+_DC = f"{{{dlna_helper.NAMESPACE_DC}}}"
+_UPNP = f"{{{dlna_helper.NAMESPACE_UPNP}}}"
+_DIDL = f"{{{dlna_helper.NAMESPACE_DIDL}}}"
+
+# child element tag -> slot it is recorded in
+_FIELDS = {
+    _DC + 'title': '_title',
+    _DC + 'creator': '_creator',
+    _UPNP + 'actor': '_actor',
+    _UPNP + 'artist': '_artist',
+    _UPNP + 'author': '_author',
+    _UPNP + 'album': '_album',
+    _UPNP + 'originalTrackNumber': '_original_track_number',
+    _UPNP + 'class': '_class',
+}
+_RES_TAG = _DIDL + 'res'
+
+
+def _render_res(attributes: dict[str, str], url: str | None) -> str:
+    # namespaced attributes would need their declaration, they are not used by renderers anyway
+    attrs = ''.join(f" {k}={quoteattr(v)}" for k, v in attributes.items() if not k.startswith('{'))
+    return f"<res{attrs}>{escape(url) if url is not None else ''}</res>"
+
 
-# TODO str(item) should yield something nice
 class Item():
+    '''Compact record of a media server's item.
+    All values are extracted once while parsing, the XML element itself is not kept.
+    '''
+
+    __slots__ = ('_id', '_ref_id', '_title', '_creator', '_actor', '_artist', '_author', '_album',
+                 '_original_track_number', '_class', '_url', '_res_attributes', '_res')
 
     def __init__(self, item_element: ET.Element):
-        self._element: ET.Element = item_element
+        self._id: str = item_element.get('id')
+        self._ref_id: str = item_element.get('refID')
+        self._title: str = None
+        self._creator: str = None
+        self._actor: str = None
+        self._artist: str = None
+        self._author: str = None
+        self._album: str = None
+        self._original_track_number: str = None
+        self._class: str = None
+        self._url: str = None
+        self._res_attributes: dict[str, str] = None
+        self._res: str = None
+        for child in item_element:
+            slot = _FIELDS.get(child.tag)
+            if slot is not None:
+                # same as find(): the first occurrence wins
+                if getattr(self, slot) is None:
+                    setattr(self, slot, child.text)
+            elif child.tag == _RES_TAG and self._res_attributes is None:
+                self._url = child.text
+                self._res_attributes = dict(child.attrib)
+                self._res = _render_res(self._res_attributes, child.text)
+
+    def __repr__(self):
+        return f"Item(id={self._id!r}, title={self._title!r}, artist={self._artist!r})"
+
+    def get_id(self):
+        return self._id
+
+    def get_ref_id(self):
+        return self._ref_id
 
     def get_title(self):
-        e = self._element.find('dc:title', {'dc': dlna_helper.NAMESPACE_DC})
-        if e is None:
-            return None
-        return e.text
+        return self._title
 
     def get_actor(self):
-        e = self._element.find('upnp:actor', {'upnp': dlna_helper.NAMESPACE_UPNP})
-        if e is None:
-            return None
-        return e.text
+        return self._actor
 
     def get_artist(self):
-        e = self._element.find('upnp:artist', {'upnp': dlna_helper.NAMESPACE_UPNP})
-        if e is None:
-            return None
-        return e.text
+        return self._artist
 
     def get_author(self):
-        e = self._element.find('upnp:author', {'upnp': dlna_helper.NAMESPACE_UPNP})
-        if e is None:
-            return None
-        return e.text
+        return self._author
 
     def get_creator(self):
-        e = self._element.find('dc:creator', {'dc': dlna_helper.NAMESPACE_DC})
-        if e is None:
-            return None
-        return e.text
+        return self._creator
+
+    def get_album(self):
+        return self._album
+
+    def get_original_track_number(self):
+        return self._original_track_number
 
     def get_class(self):
-        e = self._element.find('upnp:class', {'upnp': dlna_helper.NAMESPACE_UPNP})
-        if e is None:
-            return None
-        return e.text
+        return self._class
 
     def get_url(self):
-        e = self._element.find('d:res', {'d': dlna_helper.NAMESPACE_DIDL})
-        if e is None:
-            return None
-        return e.text
+        return self._url
+
+    def get_res_attributes(self) -> dict[str, str]:
+        return dict(self._res_attributes) if self._res_attributes is not None else {}
 
     def get_res(self):
-        e = self._element.find('d:res', {'d': dlna_helper.NAMESPACE_DIDL})
-        if e is None:
+        if self._res_attributes is None:
             return None
+        e = ET.Element(_RES_TAG, self._res_attributes)
+        e.text = self._url
         return e
 
     def get_res_as_string(self):
-        res = ET.tostring(self.get_res(), encoding="utf-8", method="xml")
-        # we need res to be of type str here
-        if type(res) is bytes:
-            res = res.decode('utf-8')
-        return dlna_helper.namespace_free_res_element(res)
+        return self._res
 
     def get_item(self):
-        return self._element
+        '''rebuilds a DIDL-Lite item element from the recorded values'''
+        e = ET.Element(_DIDL + 'item')
+        for name, value in (('id', self._id), ('refID', self._ref_id)):
+            if value is not None:
+                e.set(name, value)
+        for tag, slot in _FIELDS.items():
+            value = getattr(self, slot)
+            if value is not None:
+                ET.SubElement(e, tag).text = value
+        res = self.get_res()
+        if res is not None:
+            e.append(res)
+        return e
 
     def get_item_as_string(self):
-        return ET.tostring(self._element, encoding="utf-8", method="xml")
+        return ET.tostring(self.get_item(), encoding="utf-8", method="xml")
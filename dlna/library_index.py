@@ -0,0 +1,172 @@
+import logging
+import datetime
+import time
+from array import array
+
+from dlna.items import Item
+from dlna.search_responses import SearchResponse
+
+logger = logging.getLogger(__file__)
+
+
+# substrings of up to this length index the tokens, longer parts are looked up by one of theirs
+GRAM = 3
+
+
+class _Store():
+    '''Immutable, array-backed snapshot of a library.
+    Items are kept in the media server's sort order (artist, album, track, title),
+    so ascending positions are already correctly sorted results.
+    '''
+
+    def __init__(self, items: list[Item], classes: dict[str, str]):
+        self.items: list[Item] = items
+        self.titles: list[str] = [_fold(i.get_title()) for i in items]
+        self.artists: list[str] = [_fold(i.get_artist()) for i in items]
+        self.title_tokens: dict[str, array] = _token_index(self.titles)
+        self.artist_tokens: dict[str, array] = _token_index(self.artists)
+        self.title_grams: dict[str, set[str]] = _gram_index(self.title_tokens)
+        self.artist_grams: dict[str, set[str]] = _gram_index(self.artist_tokens)
+        # positions per type, the upnp class or one derived from it
+        upnp_classes = [i.get_class() or '' for i in items]
+        self.types: dict[str, frozenset[int]] = {
+            type: frozenset(pos for pos, c in enumerate(upnp_classes) if c == prefix or c.startswith(prefix + '.'))
+            for type, prefix in classes.items()}
+
+
+def _fold(value: str | None) -> str:
+    return value.casefold() if value else ''
+
+
+def _token_index(values: list[str]) -> dict[str, array]:
+    index: dict[str, array] = {}
+    for pos, value in enumerate(values):
+        for token in set(value.split()):
+            index.setdefault(token, array('I')).append(pos)
+    return index
+
+
+def _gram_index(tokens) -> dict[str, set[str]]:
+    '''the tokens containing each substring of up to GRAM characters'''
+    index: dict[str, set[str]] = {}
+    for token in tokens:
+        for n in range(1, GRAM + 1):
+            for start in range(len(token) - n + 1):
+                index.setdefault(token[start:start + n], set()).add(token)
+    return index
+
+
+def _tokens_containing(grams: dict[str, set[str]], part: str) -> set[str]:
+    if len(part) <= GRAM:
+        return grams.get(part, set())
+    # the tokens of the part's rarest gram, the others are checked directly
+    fewest = min((grams.get(part[start:start + GRAM], set()) for start in range(len(part) - GRAM + 1)), key=len)
+    return {token for token in fewest if part in token}
+
+
+def _sort_key(item: Item):
+    track = item.get_original_track_number()
+    return (_fold(item.get_artist()), _fold(item.get_album()),
+            int(track) if track and track.isdigit() else 0, _fold(item.get_title()))
+
+
+class LibraryIndex():
+    '''Local in-memory index of a media server's library.
+    It crawls the ContentDirectory once via Browse and afterwards answers searches locally,
+    with the same "contains" semantics the media server uses for title and artist.
+    '''
+
+    DEFAULT_PAGE_SIZE = 500
+    DEFAULT_REFRESH_INTERVAL = 60*60*6
+
+    CLASSES = {'audio': 'object.item.audioItem',
+               'video': 'object.item.videoItem',
+               'image': 'object.item.imageItem'}
+
+    _store: _Store = None
+
+    def __init__(self, media_server, page_size: int = DEFAULT_PAGE_SIZE):
+        self._media_server = media_server
+        self._page_size = page_size
+        self._store = None
+        self._last_build: str = None
+        self._build_duration: float = None
+
+    def is_warm(self) -> bool:
+        return self._store is not None
+
+    def get_info(self) -> dict:
+        return {
+            'warm': self.is_warm(),
+            'items': len(self._store.items) if self._store is not None else 0,
+            'last_build': self._last_build,
+            'build_duration': self._build_duration
+        }
+
+    def build(self):
+        '''crawls the whole library and replaces the current snapshot when done'''
+        logger.debug("building library index")
+        started = time.monotonic()
+        items = self._crawl()
+        items.sort(key=_sort_key)
+        # swapping the reference is atomic, searches never see a half-built store
+        self._store = _Store(items, self.CLASSES)
+        self._build_duration = time.monotonic() - started
+        self._last_build = datetime.datetime.now().isoformat()
+        logger.debug(f"library index built with {len(items)} items in {self._build_duration:.2f}s")
+
+    def _crawl(self) -> list[Item]:
+        items: list[Item] = []
+        seen_ids = set()
+        containers = ['0']
+        while containers:
+            container_id = containers.pop()
+            start = 0
+            while True:
+                response = self._media_server.browse(container_id, start, self._page_size)
+                for i in response.get_items():
+                    # same as the live search: ignore references to other items
+                    if i.get_ref_id() is not None or i.get_id() in seen_ids:
+                        continue
+                    seen_ids.add(i.get_id())
+                    items.append(i)
+                containers.extend(response.get_container_ids())
+                returned = response.get_returned()
+                start += returned
+                if returned == 0 or start >= response.get_matches():
+                    break
+        return items
+
+    def _class_candidates(self, store: _Store, type: str) -> frozenset[int]:
+        positions = store.types.get(type)
+        if positions is None:
+            raise ValueError(f"cannot work with type {type}")
+        return positions
+
+    def _contains_candidates(self, tokens: dict[str, array], grams: dict[str, set[str]], values: list[str],
+                             query: str) -> set[int]:
+        q = _fold(query.strip())
+        res = None
+        # every whitespace-free part of the query must be part of a single token of the value
+        for part in q.split():
+            matching = set()
+            for token in _tokens_containing(grams, part):
+                matching.update(tokens[token])
+            res = matching if res is None else res & matching
+            if not res:
+                return set()
+        return {pos for pos in res if q in values[pos]}
+
+    def search(self, title=None, artist=None, type='audio', max_size=200) -> SearchResponse:
+        store = self._store
+        if store is None:
+            raise ValueError("library index not built yet")
+
+        candidates = self._class_candidates(store, type)
+        if title and title.strip():
+            candidates &= self._contains_candidates(store.title_tokens, store.title_grams, store.titles, title)
+        if artist and artist.strip():
+            candidates &= self._contains_candidates(store.artist_tokens, store.artist_grams, store.artists, artist)
+
+        positions = sorted(candidates)
+        return SearchResponse.from_items([store.items[p] for p in positions[:max_size]], len(positions))
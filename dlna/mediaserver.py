@@ -1,6 +1,9 @@
 import logging
+from xml.sax.saxutils import escape
+
 from dlna import dlna_helper
-from dlna.search_responses import SearchResponse
+from dlna.search_responses import SearchResponse, PagedSearchResponse, SampledSearchResponse
+from dlna.search_cache import SearchCache, search_key
 
 logger = logging.getLogger(__file__)
 
@@ -15,13 +18,29 @@ class MediaServer():
                 <ContainerID xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">0</ContainerID>
                 <SearchCriteria xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">{type} and @refID exists false {criteria}</SearchCriteria>
                 <Filter xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">*</Filter>
-                <StartingIndex xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="ui4">0</StartingIndex>
+                <StartingIndex xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="ui4">{start}</StartingIndex>
                 <RequestedCount xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="ui4">{max_size}</RequestedCount>
-                <SortCriteria xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">+upnp:artist,+upnp:album,+upnp:originalTrackNumber,+dc:title</SortCriteria>
+                <SortCriteria xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">{sort}</SortCriteria>
             </m:Search>
         </SOAP-ENV:Body>
     </SOAP-ENV:Envelope>
     '''
+    BROWSE = '''<?xml version="1.0"?>
+    <SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/"
+     SOAP-ENV:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/">
+        <SOAP-ENV:Body>
+            <m:Browse xmlns:m="urn:schemas-upnp-org:service:ContentDirectory:1">
+                <ObjectID xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">{object_id}</ObjectID>
+                <BrowseFlag xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">{flag}</BrowseFlag>
+                <Filter xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string">*</Filter>
+                <StartingIndex xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="ui4">{start}</StartingIndex>
+                <RequestedCount xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="ui4">{count}</RequestedCount>
+                <SortCriteria xmlns:dt="urn:schemas-microsoft-com:datatypes" dt:dt="string"></SortCriteria>
+            </m:Browse>
+        </SOAP-ENV:Body>
+    </SOAP-ENV:Envelope>
+    '''
+    SORT = '+upnp:artist,+upnp:album,+upnp:originalTrackNumber,+dc:title'
     TITLE_PATTERN = ' and dc:title contains "{q}"'
     ARTIST_PATTERN = ' and upnp:artist contains "{q}"'
 
@@ -29,8 +48,38 @@ class MediaServer():
     VIDEO = 'upnp:class derivedfrom "object.item.videoItem"'
     IMAGE = 'upnp:class derivedfrom "object.item.imageItem"'
 
-    def __init__(self, url):
+    DEFAULT_MAX_SIZE = 200
+    DEFAULT_PAGE_SIZE = 50
+    DEFAULT_CRAWL_LIMIT = 1000
+
+    def __init__(self, url, page_size: int = None, sampling: bool = False, crawl_limit: int = DEFAULT_CRAWL_LIMIT):
         self._url = url
+        # when set, searches are paged and not limited to DEFAULT_MAX_SIZE
+        self._page_size = page_size
+        # items loaded in background at most by a paged search without max_size, the others are fetched when drawn
+        self._crawl_limit = crawl_limit
+        # when set, searches only count and draw single items at random offsets
+        self._sampling = sampling
+        self._index = None
+        self._cache: SearchCache = None
+
+    def set_index(self, index):
+        '''attach a local library index, used instead of a live search as soon as it is warm'''
+        self._index = index
+
+    def set_cache(self, cache: SearchCache):
+        '''attach a cache for live search responses'''
+        self._cache = cache
+
+    def get_url(self):
+        return self._url
+
+    def get_info(self) -> dict:
+        return {
+            'url': self._url,
+            'index': self._index.get_info() if self._index is not None else None,
+            'cache': self._cache.get_info() if self._cache is not None else None
+        }
 
     def _type_str_to_type_criteria(self, type_str):
         if 'image' == type_str:
@@ -57,29 +106,96 @@ class MediaServer():
             raise ValueError(f"Invalid size {str(size_int)}")
         return str(size_int)
 
-    def search(self, title=None, artist=None, type='audio', max_size=200):
+    def search(self, title=None, artist=None, type='audio', max_size=None):
+        paged = self._page_size is not None
+        if max_size is None and not paged:
+            max_size = self.DEFAULT_MAX_SIZE
 
-        # size
-        size_criteria = self._size_to_size_criteria(max_size)
+        # size, None means unlimited which is only possible in paged mode
+        size_criteria = self._size_to_size_criteria(max_size) if max_size is not None else None
+        limit = int(size_criteria) if size_criteria is not None else None
         # type criteria
         type_criteria = self._type_str_to_type_criteria(type)
+
+        if self._index is not None and self._index.is_warm():
+            logger.debug("answering search from library index")
+            return self._index.search(title=title, artist=artist, type=type, max_size=limit)
+
+        def load():
+            if self._sampling:
+                return self._sampled_search(title, artist, type_criteria)
+            if paged:
+                return self._paged_search(title, artist, type_criteria, self._page_size, limit)
+            return self._search_page(title, artist, type_criteria, 0, size_criteria)
+
+        if self._cache is not None:
+            return self._cache.get(search_key(title, artist, type, limit or 0), load)
+        return load()
+
+    def search_iter(self, title=None, artist=None, type='audio', page_size=DEFAULT_PAGE_SIZE, start=0, limit=None):
+        '''generator yielding the matching items, fetching them page by page while iterating'''
+        type_criteria = self._type_str_to_type_criteria(type)
+        page_criteria = int(self._size_to_size_criteria(page_size))
+        for page in self._pages(title, artist, type_criteria, page_criteria, start, limit):
+            yield from page.get_items()
+
+    def _paged_search(self, title, artist, type_criteria, page_size, limit) -> PagedSearchResponse:
+        pages = self._pages(title, artist, type_criteria, page_size, 0, limit if limit is not None else self._crawl_limit)
+        # the first page is fetched right now, all others in background
+        first_page = next(pages)
+        # drawn before their page arrived, single items are fetched at their offset
+        return PagedSearchResponse(first_page, pages,
+                                   lambda index: self._search_page(title, artist, type_criteria, index, 1), limit)
+
+    def _sampled_search(self, title, artist, type_criteria) -> SampledSearchResponse:
+        # RequestedCount 0 means "all" to a ContentDirectory, so ask for one to get TotalMatches.
+        # No sorting needed for random access, but the servers' natural order stays stable between requests.
+        count_page = self._search_page(title, artist, type_criteria, 0, 1, sort='')
+        return SampledSearchResponse(count_page,
+                                     lambda index: self._search_page(title, artist, type_criteria, index, 1, sort=''))
+
+    def _pages(self, title, artist, type_criteria, page_size, start, limit):
+        fetched = 0
+        while True:
+            count = page_size if limit is None else min(page_size, limit - fetched)
+            page = self._search_page(title, artist, type_criteria, start, count)
+            yield page
+            returned = page.get_returned()
+            fetched += returned
+            start += returned
+            if returned == 0 or start >= page.get_matches() or (limit is not None and fetched >= limit):
+                return
+
+    def _search_page(self, title, artist, type_criteria, start, size_criteria, sort=SORT) -> SearchResponse:
         # additional query options
         search_query_criteria = ''
         if (not self._is_blank(title)):
             search_query_criteria += (self.TITLE_PATTERN.format(q=title))
         if (not self._is_blank(artist)):
             search_query_criteria += (self.ARTIST_PATTERN.format(q=artist))
-        query = self.QUERY.format(criteria=search_query_criteria, type=type_criteria, max_size=size_criteria)
+        query = self.QUERY.format(criteria=search_query_criteria, type=type_criteria, start=start, max_size=size_criteria,
+                                  sort=sort)
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug(f"query string: {query}")
-        response = self._send_request(self._create_header(), query)
-        return SearchResponse(response.read().decode("utf-8"))
+        return SearchResponse.from_stream(self._send_request(self._create_header(), query))
+
+    def browse(self, object_id='0', start=0, count=200):
+        '''browses the direct children (items and containers) of the given container'''
+        return self._browse(object_id, 'BrowseDirectChildren', start, count)
+
+    def get_item(self, object_id: str):
+        '''the item with the given id, None if it is a container'''
+        return self._browse(object_id, 'BrowseMetadata', 0, 1).first_item()
+
+    def _browse(self, object_id, flag, start, count) -> SearchResponse:
+        query = self.BROWSE.format(object_id=escape(object_id), flag=flag, start=int(start), count=int(count))
+        return SearchResponse.from_stream(self._send_request(dlna_helper.create_header('ContentDirectory', 'Browse'), query))
 
     def _is_blank(self, str):
         return not (str and str.strip())
 
     def _send_request(self, header, body):
-        return dlna_helper.send_request(self._url, header, body)
+        return dlna_helper.send_request(self._url, header, body, stream=True)
 
     def _create_header(self):
         return dlna_helper.create_header('ContentDirectory', 'Search')
@@ -0,0 +1,101 @@
+import logging
+import threading
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from dlna.mediaserver import MediaServer
+from dlna.search_responses import MergedSearchResponse
+
+logger = logging.getLogger(__file__)
+
+
+class MediaServerGroup():
+    '''Searches all media servers in parallel and merges their results.
+    It returns as soon as enough candidates arrived. Responses of slower servers
+    are still added to the result until the deadline passed.
+    '''
+
+    DEFAULT_DEADLINE = 5
+    DEFAULT_ENOUGH = 50
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, media_servers: list[MediaServer], deadline: float = DEFAULT_DEADLINE,
+                 enough: int = DEFAULT_ENOUGH, workers: int = DEFAULT_WORKERS):
+        self._media_servers = media_servers
+        self._deadline = deadline
+        self._enough = enough
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='MediaServerSearch')
+        self._lock = threading.Lock()
+        self._stats = {'searches': 0, 'early_returns': 0, 'late_responses': 0, 'timeouts': 0, 'errors': 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def search(self, **kwargs) -> MergedSearchResponse:
+        self._count('searches')
+        started = monotonic()
+        pending: set[Future] = {self._executor.submit(m.search, **kwargs) for m in self._media_servers}
+        merged = MergedSearchResponse()
+        errors = []
+        candidates = 0
+
+        while pending and candidates < self._enough:
+            remaining = self._deadline - (monotonic() - started)
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    response = f.result()
+                except Exception as e:
+                    logger.info('error while searching a media server', exc_info=e)
+                    self._count('errors')
+                    errors.append(e)
+                    continue
+                merged.add(response)
+                candidates += response.get_matches()
+
+        if pending:
+            if candidates >= self._enough:
+                self._count('early_returns')
+            else:
+                self._count('timeouts')
+                logger.debug(f"{len(pending)} media server(s) did not answer within {self._deadline}s")
+            for f in pending:
+                f.add_done_callback(lambda f: self._add_late(merged, f, started))
+        elif errors and len(errors) == len(self._media_servers):
+            # nobody answered, same behavior as a single media server
+            raise errors[0]
+        return merged
+
+    def get_item(self, object_id: str):
+        '''the item of the first media server knowing the id, ids are unique per server only'''
+        errors = []
+        for m in self._media_servers:
+            try:
+                item = m.get_item(object_id)
+            except Exception as e:
+                # e.g. a fault for an unknown id
+                errors.append(e)
+                continue
+            if item is not None:
+                return item
+        if errors and len(errors) == len(self._media_servers):
+            raise errors[0]
+        return None
+
+    def _add_late(self, merged: MergedSearchResponse, f: Future, started: float):
+        if f.exception() is not None:
+            self._count('errors')
+            return
+        if monotonic() - started > self._deadline:
+            logger.debug("ignoring media server response after deadline")
+            return
+        self._count('late_responses')
+        merged.add(f.result())
+
+    def get_info(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        return {'fan_out': stats, 'media_servers': [m.get_info() for m in self._media_servers]}
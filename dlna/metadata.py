@@ -0,0 +1,118 @@
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+from dlna.items import Item
+
+logger = logging.getLogger(__file__)
+
+# http://upnp.org/specs/av/UPnP-av-AVDataStructureTemplate-v1.pdf
+META_DATA = ('<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/"'
+             ' xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/"'
+             ' xmlns:dc="http://purl.org/dc/elements/1.1/">'
+             '<item id={id} parentID={parentid} restricted="1">{inner_info}</item>'
+             '</DIDL-Lite>')
+
+# tag and item getter, in the order they are rendered
+FIELDS = (('dc:title', 'get_title'),
+          ('dc:creator', 'get_creator'),
+          ('upnp:author', 'get_author'),
+          ('upnp:actor', 'get_actor'),
+          ('upnp:artist', 'get_artist'),
+          ('upnp:class', 'get_class'))
+
+# utf-8 with escaping, which is what DIDL-Lite requires
+PROFILE_DEFAULT = 'default'
+# for renderers failing on non ascii characters in titles and names: umlauts are transliterated,
+# the rest becomes character references. The URL is left as it is, it has to match the media server's
+PROFILE_ASCII = 'ascii'
+PROFILES = (PROFILE_DEFAULT, PROFILE_ASCII)
+
+GERMAN_CHAR_MAP = {ord('ä'): 'ae', ord('Ä'): 'Ae',
+                   ord('ö'): 'oe', ord('Ö'): 'Oe',
+                   ord('ü'): 'ue', ord('Ü'): 'Ue',
+                   ord('ß'): 'ss'}
+
+
+def profile_of(send_metadata) -> str:
+    '''the configured send_metadata is either a flag or the name of a profile'''
+    if isinstance(send_metadata, str):
+        if send_metadata not in PROFILES:
+            raise ValueError(f"Invalid metadata profile {send_metadata}")
+        return send_metadata
+    return PROFILE_DEFAULT
+
+
+def _encode(text: str, profile: str) -> str:
+    '''a field value as the profile needs it, after escaping'''
+    if profile == PROFILE_ASCII:
+        return text.translate(GERMAN_CHAR_MAP).encode('ascii', 'xmlcharrefreplace').decode('ascii')
+    return text
+
+
+def render(item: Item, profile: str = PROFILE_DEFAULT) -> str:
+    '''renders the DIDL-Lite metadata of an item'''
+    inner_info = ''.join(f"<{tag}>{_encode(escape(value), profile)}</{tag}>"
+                         for tag, getter in FIELDS if (value := getattr(item, getter)()) is not None)
+    res = item.get_res_as_string()
+    if res is not None:
+        inner_info += res
+    return META_DATA.format(id=quoteattr(item.get_id() or str(uuid.uuid4())),
+                            parentid=quoteattr(str(uuid.uuid4())), inner_info=inner_info)
+
+
+class MetadataCache():
+    '''Bounded LRU cache of rendered metadata keyed by item and profile,
+    so scheduling the next track of a known item does no XML work at all.
+    '''
+
+    DEFAULT_MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError(f"Invalid size {str(max_entries)}")
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, item: Item, profile: str = PROFILE_DEFAULT) -> str:
+        # ids are unique per media server only, the url tells servers apart
+        key = (item.get_id(), item.get_url(), profile)
+        with self._lock:
+            metadata = self._entries.get(key)
+            if metadata is not None:
+                self._stats['hits'] += 1
+                self._entries.move_to_end(key)
+                return metadata
+            self._stats['misses'] += 1
+
+        metadata = render(item, profile)
+        with self._lock:
+            self._entries[key] = metadata
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return metadata
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_info(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self._max_entries)
+
+
+# shared by all players, an item played on several renderers is rendered once per profile
+_CACHE = MetadataCache()
+
+
+def get_metadata(item: Item, profile: str = PROFILE_DEFAULT) -> str:
+    return _CACHE.get(item, profile)
+
+
+def get_cache_statistics() -> dict:
+    return _CACHE.get_info()
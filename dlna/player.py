@@ -1,12 +1,18 @@
-import uuid
 import logging
+import threading
 from enum import Enum
 from dataclasses import dataclass
-from time import sleep
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
 
 import upnpclient
 
 from dlna.items import Item
+from dlna import dlna_helper
+from dlna import metadata
+from dlna import upnp_control
+from dlna.call_policy import CallPolicy
 
 TRANSPORT_STATE = Enum('TransportState', ['STOPPED', 'PLAYING', 'TRANSITIONING', 'PAUSED_PLAYBACK',
                                           'RECORDING', 'PAUSED_RECORDING', 'NO_MEDIA_PRESENT'])
@@ -20,6 +26,29 @@ class State():
     current_url: str
     next_url: str
     progress_count: int
+    # seconds, None if the renderer does not know
+    track_duration: float = None
+    rel_time: float = None
+
+
+def parse_time(value: str | None) -> float | None:
+    '''parses H+:MM:SS[.F+] as used by TrackDuration and RelTime, None for NOT_IMPLEMENTED and the like'''
+    if not value:
+        return None
+    parts = value.strip().lstrip('+').split(':')
+    if len(parts) != 3:
+        return None
+    try:
+        hours, minutes, seconds = int(parts[0]), int(parts[1]), float(parts[2])
+    except ValueError:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def format_time(seconds: float) -> str:
+    '''H:MM:SS as used by TrackDuration, RelTime and Seek'''
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
 
 
 # a player using the upnpclient pip package
@@ -27,116 +56,255 @@ class Player():
 
     # http://www.upnp.org/specs/av/UPnP-av-AVTransport-v3-Service-20101231.pdf
     # http://upnp.org/specs/av/UPnP-av-ContentDirectory-v4-Service.pdf
-    # http://upnp.org/specs/av/UPnP-av-AVDataStructureTemplate-v1.pdf
     # http://www.upnp.org/specs/av/UPnP-av-ContentDirectory-v1-Service.pdf
     # https://developer.sony.com/develop/audio-control-api/get-started/play-dlna-file#tutorial-step-3
-    META_DATA = '''
-    <DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/"
-    xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/"
-    xmlns:dc="http://purl.org/dc/elements/1.1/">
-        <item id="{id}" parentID="{parentid}" restricted="1">
-            {inner_info}
-        </item>
-    </DIDL-Lite>
-    '''
-
-    TITLE_DATA = '<dc:title>{value}</dc:title>'
-    CREATOR_DATA = '<dc:creator>{value}</dc:creator>'
-    AUTHOR_DATA = '<upnp:author>{value}</upnp:author>'
-    ACTOR_DATA = '<upnp:actor>{value}</upnp:actor>'
-    ARTIST_DATA = '<upnp:artist>{value}</upnp:artist>'
-    CLASS_DATA = '<upnp:class>{value}</upnp:class>'
-
-    GERMAN_CHAR_MAP = {ord('ä'): 'ae', ord('Ä'): 'Ae',
-                       ord('ö'): 'oe', ord('Ö'): 'Oe',
-                       ord('ü'): 'ue', ord('Ü'): 'Ue',
-                       ord('ß'): 'ss'}
 
     _device: upnpclient.Device
     _include_metadata: bool
-
-    def __init__(self, device: upnpclient.Device, include_metadata: bool):
+    _metadata_profile: str
+    _pooled: bool
+    _concurrent: bool
+    _change_aware: bool
+    _executor: ThreadPoolExecutor
+    _accept_timeout: float
+
+    # waiting for the renderer to accept a new URI: first retry after WAIT_INITIAL_DELAY, doubling up to WAIT_MAX_DELAY
+    DEFAULT_ACCEPT_TIMEOUT = 2.0
+    WAIT_INITIAL_DELAY = 0.02
+    WAIT_MAX_DELAY = 0.4
+    # default size of the pool get_state's queries are sent on, shared by all players
+    STATE_QUERY_WORKERS = 4
+
+    def __init__(self, device: upnpclient.Device | upnp_control.Device, include_metadata: bool | str, pooled: bool = False,
+                 concurrent: bool = False, change_aware: bool = False, accept_timeout: float = DEFAULT_ACCEPT_TIMEOUT,
+                 policy: CallPolicy = None, executor: ThreadPoolExecutor = None):
         self._device = device
-        self._include_metadata = include_metadata
+        # either a flag or the name of the metadata profile the renderer needs
+        self._include_metadata = bool(include_metadata)
+        self._metadata_profile = metadata.profile_of(include_metadata)
+        # pooled sends the actions over the shared keep-alive connections instead of upnpclient's,
+        # an upnp_control.Device always does
+        self._pooled = pooled
+        # concurrent sends get_state's queries at the same time on the executor shared by all players,
+        # without one they are sent one after another
+        self._concurrent = concurrent and executor is not None
+        self._executor = executor
+        # change_aware reuses the media info while the same track keeps playing,
+        # forgetting it counts the changes so a query running meanwhile does not store outdated info
+        self._change_aware = change_aware
+        self._last_media: tuple = None
+        self._media_changes = 0
+        self._accept_timeout = accept_timeout
+        # timeouts, retries and circuit breaker, calls are made once and unguarded without
+        self._policy = policy
+        # transport state reported by an event, wakes up waiting for a state
+        self._event_transport_state: str = None
+        self._transport_changed = threading.Condition()
+        self._lock = threading.Lock()
+        self._stats = {'polls': 0, 'soap_calls': 0, 'media_info_skipped': 0, 'poll_seconds': 0.0, 'last_poll_seconds': None,
+                       'accepts': 0, 'accept_timeouts': 0, 'accept_seconds': 0.0, 'last_accept_seconds': None,
+                       'max_accept_seconds': 0.0}
+        self._started = monotonic()
 
     # external methods
 
     def stop(self):
-        self._device.AVTransport.Stop(InstanceID=0)
+        self._forget_media()
+        self._call('Stop', InstanceID=0)
 
     def pause(self):
-        self._device.AVTransport.Pause(InstanceID=0)
+        self._forget_media()
+        self._call('Pause', InstanceID=0)
 
     def play(self, url_to_play, **kwargs):
+        self._forget_media()
 
         metadata = self._prepare_metadata(**kwargs)
-        self._device.AVTransport.SetAVTransportURI(InstanceID=0, CurrentURI=url_to_play, CurrentURIMetaData=metadata)
+        with self._transport_changed:
+            self._event_transport_state = None
+        self._call('SetAVTransportURI', InstanceID=0, CurrentURI=url_to_play, CurrentURIMetaData=metadata)
 
         # see spec 2.4.9.2, we must wait until one of these states
         self._wait_for_transport_state([TRANSPORT_STATE.STOPPED, TRANSPORT_STATE.PLAYING, TRANSPORT_STATE.PAUSED_PLAYBACK])
 
         # play message
-        self._device.AVTransport.Play(InstanceID=0, Speed='1')
+        self._call('Play', InstanceID=0, Speed='1')
+
+    def resume(self):
+        '''continues the paused track'''
+        self._forget_media()
+        self._call('Play', InstanceID=0, Speed='1')
+
+    def seek(self, position: float):
+        '''jumps to position seconds into the current track'''
+        self._forget_media()
+        self._call('Seek', InstanceID=0, Unit='REL_TIME', Target=format_time(position))
 
     def set_next(self, url_to_play, **kwargs):
+        self._forget_media()
 
         metadata = self._prepare_metadata(**kwargs)
-        self._device.AVTransport.SetNextAVTransportURI(InstanceID=0, NextURI=url_to_play, NextURIMetaData=metadata)
+        self._call('SetNextAVTransportURI', InstanceID=0, NextURI=url_to_play, NextURIMetaData=metadata)
 
     def get_state(self) -> State:
-
-        transport_info = self._device.AVTransport.GetTransportInfo(InstanceID=0)
-        position_info = self._device.AVTransport.GetPositionInfo(InstanceID=0)
-        media_info = self._device.AVTransport.GetMediaInfo(InstanceID=0)
+        started = monotonic()
+        with self._lock:
+            last_media, media_changes = self._last_media, self._media_changes
+        actions = ['GetTransportInfo', 'GetPositionInfo']
+        if not self._change_aware:
+            actions.append('GetMediaInfo')
+        results = self._call_all(actions)
+        transport_info, position_info = results[0], results[1]
 
         transport_state = transport_info.get('CurrentTransportState', None)
         rel_count = int(position_info.get('RelCount', None))
 
+        if self._change_aware:
+            media_info = self._unchanged_media_info(last_media, TRANSPORT_STATE[transport_state],
+                                                    position_info.get('TrackURI'), rel_count)
+            if media_info is None:
+                media_info = self._call('GetMediaInfo', InstanceID=0)
+            else:
+                self._count('media_info_skipped')
+            with self._lock:
+                if media_changes == self._media_changes:
+                    self._last_media = (TRANSPORT_STATE[transport_state], position_info.get('TrackURI'), rel_count, media_info)
+        else:
+            media_info = results[2]
+
+        duration = monotonic() - started
+        with self._lock:
+            self._stats['polls'] += 1
+            self._stats['poll_seconds'] += duration
+            self._stats['last_poll_seconds'] = duration
+
         current_URI = media_info.get('CurrentURI')
         next_URI = media_info.get('NextURI')
 
         logger.debug(f"current transport_state: {transport_state}, current track: {current_URI}, current rel-count: {rel_count}")
 
-        return State(TRANSPORT_STATE[transport_state], current_URI, next_URI, rel_count)
+        return State(TRANSPORT_STATE[transport_state], current_URI, next_URI, rel_count,
+                     parse_time(position_info.get('TrackDuration')), parse_time(position_info.get('RelTime')))
+
+    def render_metadata(self, item: Item) -> str | None:
+        '''the metadata play and set_next would send along with the item, to be passed as metadata_raw later'''
+        return self._prepare_metadata(item=item)
+
+    def get_event_url(self) -> str:
+        '''url to subscribe to AVTransport's events'''
+        service = self._device.AVTransport
+        if isinstance(service, upnp_control.ServiceClient):
+            return service.get_event_url()
+        # upnpclient keeps the url from the device description, it does not support eventing itself
+        return urljoin(service._url_base, service._event_sub_url)
+
+    def on_transport_state(self, transport_state: str):
+        '''to be called with the TransportState of AVTransport's events'''
+        with self._transport_changed:
+            self._event_transport_state = transport_state
+            self._transport_changed.notify_all()
+
+    def get_statistics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        minutes = (monotonic() - self._started) / 60
+        polls = stats.pop('polls')
+        poll_seconds = stats.pop('poll_seconds')
+        accept_seconds = stats.pop('accept_seconds')
+        return dict(stats, polls=polls,
+                    avg_poll_seconds=round(poll_seconds / polls, 4) if polls else None,
+                    avg_accept_seconds=round(accept_seconds / stats['accepts'], 4) if stats['accepts'] else None,
+                    soap_calls_per_minute=round(stats['soap_calls'] / minutes, 2) if minutes > 0 else None)
 
     # internal methods
 
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _forget_media(self):
+        with self._lock:
+            self._last_media = None
+            self._media_changes += 1
+
+    def _call_all(self, actions: list[str]) -> list[dict]:
+        '''queries, made as a single call of the policy: an unreachable renderer counts as one failure, not one per query'''
+        for _ in actions:
+            self._count('soap_calls')
+        if self._policy is None:
+            return self._invoke_all(actions)
+        return self._policy.call(lambda: self._invoke_all(actions), True)
+
+    def _invoke_all(self, actions: list[str]) -> list[dict]:
+        if not self._concurrent:
+            # the first failure ends the others
+            return [self._invoke(a, InstanceID=0) for a in actions]
+        futures = [self._executor.submit(self._invoke, a, InstanceID=0) for a in actions[1:]]
+        return [self._invoke(actions[0], InstanceID=0)] + [f.result() for f in futures]
+
+    def _unchanged_media_info(self, last: tuple, transport_state: TRANSPORT_STATE, track_uri: str,
+                              rel_count: int) -> dict | None:
+        '''the media info of the last poll, if the same track still plays on'''
+        if last is None or not track_uri:
+            return None
+        last_transport_state, last_track_uri, last_rel_count, media_info = last
+        if transport_state is TRANSPORT_STATE.PLAYING and last_transport_state is TRANSPORT_STATE.PLAYING \
+                and track_uri == last_track_uri and rel_count >= last_rel_count:
+            return media_info
+        return None
+
+    def _call(self, action: str, **kwargs) -> dict:
+        self._count('soap_calls')
+        if self._policy is None:
+            return self._invoke(action, **kwargs)
+        return self._policy.call(lambda: self._invoke(action, **kwargs), action in upnp_control.QUERIES)
+
+    def _invoke(self, action: str, **kwargs) -> dict:
+        service = self._device.AVTransport
+        if not self._pooled or isinstance(service, upnp_control.ServiceClient):
+            return getattr(service, action)(**kwargs)
+        a = service.find_action(action)
+        # upnpclient knows the control url and the argument order from the service description
+        arguments = [(name, kwargs[name]) for name, _ in a.argsdef_in]
+        return dlna_helper.soap_call(a.url, service.service_type, action, arguments)
+
     def _prepare_metadata(self, **kwargs):
         if (self._include_metadata):
             if ('item' in kwargs):
                 # uses mediaserver's item
                 i: Item = kwargs['item']
-
-                inner_info = ''
-                inner_info += self._add_to_content(self.TITLE_DATA, i.get_title())
-                inner_info += self._add_to_content(self.CREATOR_DATA, i.get_creator())
-                inner_info += self._add_to_content(self.AUTHOR_DATA, i.get_author())
-                inner_info += self._add_to_content(self.ACTOR_DATA, i.get_actor())
-                inner_info += self._add_to_content(self.ARTIST_DATA, i.get_artist())
-                inner_info += self._add_to_content(self.CLASS_DATA, i.get_class())
-                inner_info += i.get_res_as_string()
-
-                return self.META_DATA.format(id=uuid.uuid4(), parentid=uuid.uuid4(), inner_info=inner_info)
+                return metadata.get_metadata(i, self._metadata_profile)
 
             elif ('metadata_raw' in kwargs):
                 return kwargs['metadata_raw']
 
         return None
 
-    def _wait_for_transport_state(self, expected_transport_states: list[TRANSPORT_STATE]):
+    def _wait_for_transport_state(self, expected_transport_states: list[TRANSPORT_STATE]) -> bool:
+        '''polls with exponential backoff, an event ends each wait early'''
         logger.debug(f"waiting for state {','.join(map(str, expected_transport_states))}")
-        for i in range(20):
-            transport_info = self._device.AVTransport.GetTransportInfo(InstanceID=0)
-            current_transport_state = transport_info.get('CurrentTransportState', None)
-            if TRANSPORT_STATE[current_transport_state] in expected_transport_states:
-                logger.debug(f"state {current_transport_state} arrived.")
-                return True
-            sleep(0.1)  # wait for 100ms until another try
-
-        return False
-
-    def _add_to_content(self, xml_tag_data: str, value: str | None):
-        if value is not None:
-            recoded_value = value.translate(self.GERMAN_CHAR_MAP)
-            return xml_tag_data.format(value=recoded_value)
-        return ''
+        started = monotonic()
+        deadline = started + self._accept_timeout
+        delay = self.WAIT_INITIAL_DELAY
+        current_transport_state = self._call('GetTransportInfo', InstanceID=0).get('CurrentTransportState', None)
+        while TRANSPORT_STATE[current_transport_state] not in expected_transport_states:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                logger.warning(f"state {current_transport_state} did not change within {self._accept_timeout}s")
+                self._count('accept_timeouts')
+                return False
+            with self._transport_changed:
+                self._transport_changed.wait_for(lambda: self._event_transport_state is not None, min(delay, remaining))
+                current_transport_state, self._event_transport_state = self._event_transport_state, None
+            if current_transport_state is None:
+                current_transport_state = self._call('GetTransportInfo', InstanceID=0).get('CurrentTransportState', None)
+            delay = min(delay * 2, self.WAIT_MAX_DELAY)
+
+        took = monotonic() - started
+        logger.debug(f"state {current_transport_state} arrived after {took:.3f}s.")
+        with self._lock:
+            self._stats['accepts'] += 1
+            self._stats['accept_seconds'] += took
+            self._stats['last_accept_seconds'] = took
+            self._stats['max_accept_seconds'] = max(self._stats['max_accept_seconds'], took)
+        return True
@@ -0,0 +1,112 @@
+import logging
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+logger = logging.getLogger(__file__)
+
+UMLAUT_MAP = {ord('ä'): 'ae', ord('ö'): 'oe', ord('ü'): 'ue', ord('ß'): 'ss'}
+
+
+def normalize(value) -> str:
+    '''folds case, whitespace and german umlauts, so that similar voice transcriptions are equal'''
+    if value is None:
+        return ''
+    return ' '.join(str(value).casefold().translate(UMLAUT_MAP).split())
+
+
+def search_key(title=None, artist=None, type='audio', max_size=200) -> tuple:
+    return (normalize(title), normalize(artist), normalize(type), int(max_size))
+
+
+class _Entry():
+
+    def __init__(self, value):
+        self.value = value
+        self.created = monotonic()
+
+
+class SearchCache():
+    '''Bounded LRU cache for search responses.
+    Fresh entries (younger than ttl) are served directly. Stale entries (younger than ttl + stale_ttl)
+    are served as well, while a background thread revalidates them. Anything older is a miss.
+    '''
+
+    DEFAULT_TTL = 60*60
+    DEFAULT_STALE_TTL = 60*60*24
+    DEFAULT_MAX_ENTRIES = 64
+
+    def __init__(self, ttl: float = DEFAULT_TTL, stale_ttl: float = DEFAULT_STALE_TTL,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError(f"Invalid size {str(max_entries)}")
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._refreshing: dict[tuple, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0,
+                       'refreshes': 0, 'refresh_errors': 0}
+
+    def get(self, key: tuple, loader):
+        '''returns the cached value for key, calls loader to (re-)create it where needed'''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = monotonic() - entry.created
+                if age < self._ttl:
+                    self._stats['hits'] += 1
+                    self._entries.move_to_end(key)
+                    return entry.value
+                if age < self._ttl + self._stale_ttl:
+                    self._stats['stale_hits'] += 1
+                    self._entries.move_to_end(key)
+                    self._revalidate(key, loader)
+                    return entry.value
+            self._stats['misses'] += 1
+
+        # load outside the lock, a slow media server must not block other lookups
+        value = loader()
+        self._put(key, value)
+        return value
+
+    def _put(self, key: tuple, value):
+        with self._lock:
+            self._entries[key] = _Entry(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _revalidate(self, key: tuple, loader):
+        # called with lock held
+        if key in self._refreshing:
+            return
+        t = threading.Thread(target=self._refresh, args=(key, loader), name=f"SearchCacheRefresh{key}", daemon=True)
+        self._refreshing[key] = t
+        t.start()
+
+    def _refresh(self, key: tuple, loader):
+        try:
+            self._put(key, loader())
+            with self._lock:
+                self._stats['refreshes'] += 1
+        except Exception as e:
+            logger.info(f"refreshing search {key} failed", exc_info=e)
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_info(self) -> dict:
+        with self._lock:
+            res = dict(self._stats)
+            res['size'] = len(self._entries)
+            res['max_entries'] = self._max_entries
+            return res
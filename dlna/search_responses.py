@@ -1,28 +1,140 @@
 import xml.etree.ElementTree as ET
-import random
 import logging
+import threading
+import weakref
+from xml.parsers import expat
+from typing import Iterator, Callable
 
 from dlna import dlna_helper
 from dlna.items import Item
+from dlna.shuffle_deck import ShuffleDeck
 
 logger = logging.getLogger(__file__)
 
+ITEM_TAG = f"{{{dlna_helper.NAMESPACE_DIDL}}}item"
+CONTAINER_TAG = f"{{{dlna_helper.NAMESPACE_DIDL}}}container"
+
+
+class _ResponseParser():
+    '''Incremental parser for ContentDirectory responses.
+    The SOAP envelope is parsed by expat, the escaped DIDL-Lite inside Result is fed
+    to a second incremental parser as soon as its character data arrives. Items are
+    recorded and detached from the DIDL-Lite root once complete, so no full tree is ever built.
+    '''
+
+    FIELDS = ('Result', 'TotalMatches', 'NumberReturned')
+
+    def __init__(self):
+        self.fields: dict[str, str] = {}
+        self.items: list[Item] = []
+        self.container_ids: list[str] = []
+        self._field: str = None
+        self._text: list[str] = []
+        self._didl = ET.XMLPullParser(events=('start', 'end'))
+        self._didl_fed = False
+        self._didl_root: ET.Element = None
+        self._depth = 0
+        self._envelope = expat.ParserCreate()
+        self._envelope.StartElementHandler = self._start
+        self._envelope.EndElementHandler = self._end
+        self._envelope.CharacterDataHandler = self._data
+
+    def feed(self, data: bytes | str):
+        self._envelope.Parse(data, False)
+
+    def close(self):
+        self._envelope.Parse(b'', True)
+        if self._didl_fed:
+            self._didl.close()
+            self._read_didl_events()
+
+    def _start(self, name, attrs):
+        local_name = name.rpartition(':')[2]
+        if local_name in self.FIELDS:
+            self._field = local_name
+            self._text = []
+
+    def _end(self, name):
+        if name.rpartition(':')[2] == self._field:
+            if self._field != 'Result':
+                self.fields[self._field] = ''.join(self._text).strip()
+            else:
+                self.fields[self._field] = ''
+            self._field = None
+
+    def _data(self, data):
+        if self._field == 'Result':
+            self._didl.feed(data)
+            self._didl_fed = True
+            self._read_didl_events()
+        elif self._field is not None:
+            self._text.append(data)
+
+    def _read_didl_events(self):
+        for event, element in self._didl.read_events():
+            if event == 'start':
+                if self._didl_root is None:
+                    self._didl_root = element
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if self._depth != 1:
+                continue
+            # a direct child of DIDL-Lite is complete
+            if element.tag == ITEM_TAG:
+                self.items.append(Item(element))
+            elif element.tag == CONTAINER_TAG and element.get('id') is not None:
+                self.container_ids.append(element.get('id'))
+            self._didl_root.remove(element)
+
 
 class SearchResponse():
+    '''Response of a ContentDirectory Search (or Browse, which shares the same response layout)'''
+
+    CHUNK_SIZE = 16 * 1024
 
     def __init__(self, result_text):
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"constructing search response from content {result_text}")
-        self._root_element = ET.fromstring(result_text)
-        self._matches = self._root_element.find('.//TotalMatches').text
-        self._returned = self._root_element.find('.//NumberReturned').text
-        result = self._root_element.find('.//Result').text
-
-        # create valid XML from result. This field containing escaped XML without xml-header.
-        result_unescaped = dlna_helper.XML_HEADER + result
-        self._result_root = ET.fromstring(result_unescaped)
-        if logger.isEnabledFor(logging.DEBUG):
-            logger.debug(f"result content as xml {ET.tostring(self._result_root, encoding='utf-8', method='xml')}")
+        parser = _ResponseParser()
+        parser.feed(result_text)
+        self._from_parser(parser)
+
+    @classmethod
+    def from_stream(cls, response, chunk_size: int = CHUNK_SIZE) -> 'SearchResponse':
+        '''parses a response while reading it chunk by chunk'''
+        parser = _ResponseParser()
+        try:
+            while True:
+                chunk = response.read(chunk_size)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        finally:
+            response.close()
+        res = cls.__new__(cls)
+        res._from_parser(parser)
+        return res
+
+    def _from_parser(self, parser: _ResponseParser):
+        parser.close()
+        if 'TotalMatches' not in parser.fields or 'NumberReturned' not in parser.fields:
+            raise ValueError("not a ContentDirectory response, TotalMatches or NumberReturned missing")
+        self._matches = parser.fields['TotalMatches']
+        self._returned = parser.fields['NumberReturned']
+        self._items: list[Item] = parser.items
+        self._deck = ShuffleDeck()
+        self._container_ids = parser.container_ids
+        logger.debug(f"parsed response with {len(parser.items)} items of {self._matches} matches")
+
+    @classmethod
+    def from_items(cls, items: list[Item], matches: int = None) -> 'SearchResponse':
+        '''creates a response from already known items, e.g. answered by a local index'''
+        res = cls.__new__(cls)
+        res._items = list(items)
+        res._deck = ShuffleDeck()
+        res._container_ids = []
+        res._returned = str(len(items))
+        res._matches = str(len(items) if matches is None else matches)
+        return res
 
     def get_matches(self):
         return int(self._matches)
@@ -30,14 +142,244 @@ class SearchResponse():
     def get_returned(self):
         return int(self._returned)
 
+    def get_items(self) -> list[Item]:
+        return list(self._items)
+
+    def get_items_from(self, start: int) -> list[Item]:
+        '''the items from position start on'''
+        return self._items[start:]
+
+    def get_container_ids(self) -> list[str]:
+        return list(self._container_ids)
+
     def first_item(self):
-        first_item = self._result_root.find('r:item', {'r': 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/'})
-        if (first_item is not None):
-            return Item(first_item)
-        return None
+        return self._items[0] if self._items else None
+
+    def random_item(self, deck: ShuffleDeck = None):
+        '''next item of the shuffled items, the response's own deck is used unless one is given'''
+        return _draw(self._items, self._deck if deck is None else deck)
+
+
+class PagedSearchResponse():
+    '''Search response that is usable as soon as the first page arrived.
+    The remaining pages are consumed in a background thread and extend the item pool while playing,
+    it stops once the response is discarded. With fetch, draws cover all matches from the start:
+    a position not loaded yet is fetched on its own, so the first tracks are not biased towards the first page.
+    '''
+
+    def __init__(self, first_page: SearchResponse, remaining_pages: Iterator[SearchResponse],
+                 fetch: Callable[[int], SearchResponse] = None, limit: int = None):
+        self._matches = first_page.get_matches()
+        self._items: list[Item] = first_page.get_items()
+        self._fetch = fetch
+        # the positions the pages will cover
+        self._size = self._matches if limit is None else min(self._matches, limit)
+        self._deck = ShuffleDeck()
+        self._lock = threading.Lock()
+        # held weakly by the loader, so a response nobody uses anymore is not loaded on
+        self._loader = threading.Thread(target=self._load, args=(weakref.ref(self), remaining_pages),
+                                        name='PagedSearchResponse', daemon=True)
+        self._loader.start()
+
+    @staticmethod
+    def _load(ref: weakref.ref, remaining_pages: Iterator[SearchResponse]):
+        try:
+            for page in remaining_pages:
+                response: PagedSearchResponse = ref()
+                if response is None:
+                    logger.debug('search response discarded, stopped loading pages')
+                    return
+                items = page.get_items()
+                with response._lock:
+                    response._items.extend(items)
+                del response
+                logger.debug(f"loaded page with {len(items)} items")
+        except Exception as e:
+            logger.info('error while loading next page, keeping the items found so far', exc_info=e)
+
+    def is_complete(self) -> bool:
+        return not self._loader.is_alive()
 
-    def random_item(self):
-        all_item = self._result_root.findall('r:item', {'r': 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/'})
-        if all_item is None or len(all_item) == 0:
+    def wait(self, timeout: float = None) -> bool:
+        '''waits for all pages to be loaded'''
+        self._loader.join(timeout)
+        return self.is_complete()
+
+    def get_matches(self):
+        return self._matches
+
+    def get_returned(self):
+        with self._lock:
+            return len(self._items)
+
+    def get_items(self) -> list[Item]:
+        with self._lock:
+            return list(self._items)
+
+    def get_items_from(self, start: int) -> list[Item]:
+        '''the items from position start on, e.g. the ones of pages loaded since'''
+        with self._lock:
+            return self._items[start:]
+
+    def first_item(self):
+        with self._lock:
+            return self._items[0] if self._items else None
+
+    def random_item(self, deck: ShuffleDeck = None):
+        deck = self._deck if deck is None else deck
+        with self._lock:
+            if self._fetch is None:
+                # pages only append, so the deck simply grows with them
+                return _draw(self._items, deck)
+            deck.resize(max(self._size, len(self._items)))
+            index = deck.next()
+            if index is None:
+                return None
+            if index < len(self._items):
+                return self._items[index]
+        # not loaded yet, the same sort order makes it the item its page will hold
+        item = self._fetch(index).first_item()
+        if item is None:
+            # the library shrunk since counting
+            logger.debug(f"nothing found at index {index} of {self._size}")
+            return self.first_item()
+        return item
+
+
+class SampledSearchResponse():
+    '''Search response that does not hold the matching items at all.
+    It knows the number of matches only and fetches a single item at a random offset per random_item(),
+    so every match is drawn with equal probability and each request carries one item only.
+    '''
+
+    def __init__(self, count_page: SearchResponse, fetch: Callable[[int], SearchResponse]):
+        self._matches = count_page.get_matches()
+        self._first_item = count_page.first_item()
+        self._fetch = fetch
+        self._deck = ShuffleDeck()
+        self._returned = 1 if self._first_item is not None else 0
+
+    def get_matches(self):
+        return self._matches
+
+    def get_returned(self):
+        return self._returned
+
+    def first_item(self):
+        return self._first_item
+
+    def random_item(self, deck: ShuffleDeck = None):
+        deck = self._deck if deck is None else deck
+        deck.resize(self._matches)
+        index = deck.next()
+        if index is None:
             return None
-        return Item(random.choice(all_item))
+        return self.item_at(index)
+
+    def item_at(self, index: int):
+        '''fetches the item at the given offset of the matches'''
+        if index == 0:
+            return self._first_item
+        item = self._fetch(index).first_item()
+        if item is None:
+            # the library shrunk since counting
+            logger.debug(f"nothing found at index {index} of {self._matches}")
+            return self._first_item
+        self._returned += 1
+        return item
+
+
+def _draw(items: list[Item], deck: ShuffleDeck):
+    deck.resize(len(items))
+    index = deck.next()
+    return items[index] if index is not None else None
+
+
+def _identity(item: Item) -> tuple:
+    res = item.get_res_attributes()
+    return (item.get_title(), item.get_artist(), res.get('duration'), res.get('size'))
+
+
+class MergedSearchResponse():
+    '''Combines the responses of several media servers.
+    Identical tracks (same title, artist, duration and size) found on several servers are used once.
+    Responses may still be added, while this one is already in use.
+    Shuffling covers the merged items followed by the matches of sampling responses, so every
+    sampled match is as likely as a listed item.
+    '''
+
+    def __init__(self, responses: list = None):
+        self._responses = []
+        # merged items only ever grow, so positions in a deck stay valid
+        self._pool: list[Item] = []
+        self._identities: set[tuple] = set()
+        # the responses listing their items and how many of them are merged, the sampling ones
+        self._listed = []
+        self._taken: list[int] = []
+        self._sampled: list[SampledSearchResponse] = []
+        self._deck = ShuffleDeck()
+        self._lock = threading.Lock()
+        for r in responses or []:
+            self.add(r)
+
+    def add(self, response):
+        with self._lock:
+            self._responses.append(response)
+            if isinstance(response, SampledSearchResponse):
+                self._sampled.append(response)
+            else:
+                self._listed.append(response)
+                self._taken.append(0)
+
+    def _sync(self):
+        '''merges the items arrived since the last call, holding the lock'''
+        for pos, r in enumerate(self._listed):
+            items = r.get_items_from(self._taken[pos])
+            self._taken[pos] += len(items)
+            for i in items:
+                identity = _identity(i)
+                if identity not in self._identities:
+                    self._identities.add(identity)
+                    self._pool.append(i)
+
+    def _snapshot(self) -> list:
+        with self._lock:
+            return list(self._responses)
+
+    def get_matches(self):
+        return sum(r.get_matches() for r in self._snapshot())
+
+    def get_returned(self):
+        return len(self.get_items())
+
+    def get_items(self) -> list[Item]:
+        with self._lock:
+            self._sync()
+            return list(self._pool)
+
+    def first_item(self):
+        for r in self._snapshot():
+            item = r.first_item()
+            if item is not None:
+                return item
+        return None
+
+    def random_item(self, deck: ShuffleDeck = None):
+        deck = self._deck if deck is None else deck
+        with self._lock:
+            self._sync()
+            pooled = len(self._pool)
+            sampled = list(self._sampled)
+            deck.resize(pooled + sum(r.get_matches() for r in sampled))
+            index = deck.next()
+            if index is None:
+                return None
+            if index < pooled:
+                return self._pool[index]
+        # fetched outside the lock
+        index -= pooled
+        for r in sampled:
+            if index < r.get_matches():
+                return r.item_at(index)
+            index -= r.get_matches()
+        return None
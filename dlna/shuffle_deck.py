@@ -0,0 +1,74 @@
+import random
+
+
+class ShuffleDeck():
+    '''Shuffle without replacement over the positions 0..size-1.
+    Fisher-Yates is done lazily with one swap per draw and only swapped positions are stored,
+    so a draw is O(1) and even huge (sampled) pools cost memory for the drawn positions only.
+    No position repeats until all were drawn. The next round never starts with the last drawn position.
+    '''
+
+    _size: int
+    _drawn: int
+    _swaps: dict[int, int]
+    _last: int
+    _rounds: int
+
+    def __init__(self, size: int = 0, rng: random.Random = None):
+        self._rng = rng
+        self._size = size
+        self._drawn = 0
+        self._swaps = {}
+        self._last = None
+        self._rounds = 0
+
+    def get_size(self) -> int:
+        return self._size
+
+    def get_remaining(self) -> int:
+        '''positions left until the deck is reshuffled'''
+        return self._size - self._drawn
+
+    def get_rounds(self) -> int:
+        '''number of reshuffles after the deck was exhausted'''
+        return self._rounds
+
+    def resize(self, size: int):
+        '''grows the deck with new undrawn positions, a smaller size starts a new round'''
+        if size == self._size:
+            return
+        if size < self._size:
+            self._drawn = 0
+            self._swaps = {}
+            if self._last is not None and self._last >= size:
+                self._last = None
+        self._size = size
+
+    def next(self) -> int | None:
+        if self._size == 0:
+            return None
+        if self._drawn >= self._size:
+            self._drawn = 0
+            self._swaps = {}
+            self._rounds += 1
+        high = self._size
+        if self._drawn == 0 and self._last is not None and self._size > 1:
+            # a fresh round holds every position at its own place: park the last one out of reach
+            self._swap(self._last, self._size - 1)
+            high -= 1
+        j = self._randrange(self._drawn, high)
+        self._swap(self._drawn, j)
+        position = self._swaps.pop(self._drawn, self._drawn)
+        self._drawn += 1
+        self._last = position
+        return position
+
+    def _randrange(self, start: int, stop: int) -> int:
+        return (self._rng or random).randrange(start, stop)
+
+    def _swap(self, i: int, j: int):
+        if i == j:
+            return
+        value_i = self._swaps.get(i, i)
+        self._swaps[i] = self._swaps.get(j, j)
+        self._swaps[j] = value_i
@@ -0,0 +1,431 @@
+'''A stand-in for real renderers: AVTransport and ConnectionManager served over HTTP from memory,
+with configurable track durations, latency, jitter, errors and gapless playback.
+A RendererFleet runs hundreds of them in one process, all accepted on a single thread.
+
+Run a fleet for a controller to be pointed at: python -m dlna.simulated_renderer [count]
+'''
+import sys
+import json
+import uuid
+import random
+import logging
+import selectors
+import threading
+from time import monotonic, sleep
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+from dlna import dlna_helper
+from dlna.dlna_helper import SOAPError
+from dlna.player import parse_time, format_time
+from dlna.upnp_control import ACTIONS, AV_TRANSPORT, CONNECTION_MANAGER
+
+logger = logging.getLogger(__file__)
+
+SERVICE_TYPES = {AV_TRANSPORT: 'urn:schemas-upnp-org:service:AVTransport:1',
+                 CONNECTION_MANAGER: 'urn:schemas-upnp-org:service:ConnectionManager:1'}
+
+# what the controller uses, and what a renderer offers in addition
+SIMULATED_ACTIONS = {
+    AV_TRANSPORT: dict(ACTIONS[AV_TRANSPORT]),
+    CONNECTION_MANAGER: dict(ACTIONS[CONNECTION_MANAGER], GetCurrentConnectionIDs=((), ('ConnectionIDs',))),
+}
+
+DEFAULT_SINK = ','.join(f"http-get:*:{t}:*" for t in ('audio/mpeg', 'audio/flac', 'audio/mp4', 'video/mp4', 'image/jpeg'))
+
+FAULT = (dlna_helper.XML_HEADER +
+         '<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"'
+         ' s:encodingStyle="http://schemas.xmlsoap.org/soap/encoding/"><s:Body>'
+         '<s:Fault><faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>'
+         '<UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+         '<errorCode>{code}</errorCode><errorDescription>{description}</errorDescription>'
+         '</UPnPError></detail></s:Fault></s:Body></s:Envelope>')
+
+DESCRIPTION = '''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+    <friendlyName>{name}</friendlyName>
+    <manufacturer>dlna_mediacontroller</manufacturer>
+    <modelName>Simulated Renderer</modelName>
+    <UDN>{udn}</UDN>
+    <serviceList>{services}
+    </serviceList>
+  </device>
+</root>'''
+
+SERVICE = '''
+      <service>
+        <serviceType>{service_type}</serviceType>
+        <serviceId>urn:upnp-org:serviceId:{name}</serviceId>
+        <SCPDURL>/{name}/scpd.xml</SCPDURL>
+        <controlURL>/{name}/control</controlURL>
+        <eventSubURL></eventSubURL>
+      </service>'''
+
+
+def scpd(actions: dict) -> str:
+    '''service description of the actions, every argument with a string state variable of its own'''
+    action_list = []
+    variables = set()
+    for name, (arguments_in, arguments_out) in actions.items():
+        arguments = []
+        for direction, names in (('in', arguments_in), ('out', arguments_out)):
+            for argument in names:
+                variables.add(f"A_ARG_TYPE_{argument}")
+                arguments.append(f"<argument><name>{argument}</name><direction>{direction}</direction>"
+                                 f"<relatedStateVariable>A_ARG_TYPE_{argument}</relatedStateVariable></argument>")
+        action_list.append(f"<action><name>{name}</name><argumentList>{''.join(arguments)}</argumentList></action>")
+    state_variables = ''.join(f'<stateVariable sendEvents="no"><name>{v}</name><dataType>string</dataType></stateVariable>'
+                              for v in sorted(variables))
+    return ('<?xml version="1.0"?><scpd xmlns="urn:schemas-upnp-org:service-1-0">'
+            '<specVersion><major>1</major><minor>0</minor></specVersion>'
+            f"<actionList>{''.join(action_list)}</actionList>"
+            f"<serviceStateTable>{state_variables}</serviceStateTable></scpd>")
+
+
+class SimulatedRenderer():
+    '''The state of a single renderer, advanced by the clock whenever it is looked at.
+    Every track lasts track_duration seconds (a number or a function of the URI). SetAVTransportURI
+    is TRANSITIONING for accept_delay seconds. A next track set with SetNextAVTransportURI follows
+    after gap seconds of TRANSITIONING, right away with gap 0 (gapless). Each call is answered after
+    latency plus up to jitter seconds, fails with a SOAP fault at error_rate and gets no answer at drop_rate.
+    There is no eventing, the controller has to poll.
+    '''
+
+    def __init__(self, name: str, track_duration=30, accept_delay: float = 0.0, gap: float = 0.0,
+                 supports_next: bool = True, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 drop_rate: float = 0.0, sink: str = DEFAULT_SINK, rng: random.Random = None, clock=monotonic):
+        self.name = name
+        self.udn = f"uuid:{uuid.uuid5(uuid.NAMESPACE_URL, name)}"
+        self._track_duration = track_duration
+        self._accept_delay = accept_delay
+        self._gap = gap
+        self._supports_next = supports_next
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._drop_rate = drop_rate
+        self._sink = sink
+        self._rng = rng or random.Random()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.location: str = None
+
+        self._transport_state = 'NO_MEDIA_PRESENT'
+        self._current: tuple[str, str] = (None, None)
+        self._next: tuple[str, str] = (None, None)
+        # seconds played when the clock read _since, _since is None unless running
+        self._position = 0.0
+        self._since: float = None
+        # end of TRANSITIONING and whether Play was sent during it
+        self._ready_at: float = None
+        self._play_requested = False
+        self._stats = {'calls': 0, 'faults': 0, 'drops': 0, 'tracks': 0}
+        self._last_play: float = None
+
+    # timing and errors, decided per request
+
+    def delay(self) -> float:
+        return self._latency + (self._rng.uniform(0, self._jitter) if self._jitter else 0.0)
+
+    def drops(self) -> bool:
+        with self._lock:
+            dropped = self._drop_rate > 0 and self._rng.random() < self._drop_rate
+            if dropped:
+                self._stats['drops'] += 1
+            return dropped
+
+    def description(self) -> str:
+        services = ''.join(SERVICE.format(service_type=t, name=n) for n, t in SERVICE_TYPES.items())
+        return DESCRIPTION.format(name=escape(self.name), udn=self.udn, services=services)
+
+    # the state machine
+
+    def _duration(self, uri: str) -> float:
+        return self._track_duration(uri) if callable(self._track_duration) else self._track_duration
+
+    def _elapsed(self, now: float) -> float:
+        return self._position + (now - self._since if self._since is not None else 0.0)
+
+    def _advance(self, now: float):
+        if self._transport_state == 'TRANSITIONING' and now >= self._ready_at:
+            ready_at, self._ready_at = self._ready_at, None
+            if self._play_requested:
+                self._play_requested = False
+                self._start(ready_at)
+            else:
+                self._transport_state = 'STOPPED'
+        while self._transport_state == 'PLAYING':
+            duration = self._duration(self._current[0])
+            ends_at = self._since + duration - self._position
+            if now < ends_at:
+                return
+            self._position, self._since = 0.0, None
+            if self._next[0] is None:
+                # played until the end
+                self._transport_state = 'STOPPED'
+                return
+            self._current, self._next = self._next, (None, None)
+            if self._gap > 0 and now < ends_at + self._gap:
+                self._transport_state = 'TRANSITIONING'
+                self._ready_at = ends_at + self._gap
+                self._play_requested = True
+                return
+            self._start(ends_at + self._gap)
+
+    def _start(self, at: float):
+        self._transport_state = 'PLAYING'
+        self._since = at
+        self._stats['tracks'] += 1
+
+    def handle(self, action: str, arguments: dict) -> dict:
+        '''performs an action, raises SOAPError like a renderer's fault response'''
+        with self._lock:
+            self._stats['calls'] += 1
+            if self._error_rate > 0 and self._rng.random() < self._error_rate:
+                self._stats['faults'] += 1
+                raise SOAPError(501, 'Action Failed')
+            handler = getattr(self, f"_do_{action}", None)
+            if handler is None:
+                self._stats['faults'] += 1
+                raise SOAPError(401, 'Invalid Action')
+            now = self._clock()
+            self._advance(now)
+            try:
+                return handler(now, arguments)
+            except SOAPError:
+                self._stats['faults'] += 1
+                raise
+
+    def _do_SetAVTransportURI(self, now: float, arguments: dict) -> dict:
+        self._current = (arguments.get('CurrentURI'), arguments.get('CurrentURIMetaData'))
+        self._next = (None, None)
+        self._position, self._since = 0.0, None
+        self._play_requested = False
+        if self._accept_delay > 0:
+            self._transport_state = 'TRANSITIONING'
+            self._ready_at = now + self._accept_delay
+        else:
+            self._transport_state = 'STOPPED'
+        return {}
+
+    def _do_SetNextAVTransportURI(self, now: float, arguments: dict) -> dict:
+        if not self._supports_next:
+            raise SOAPError(401, 'Invalid Action')
+        self._next = (arguments.get('NextURI'), arguments.get('NextURIMetaData'))
+        return {}
+
+    def _do_Play(self, now: float, arguments: dict) -> dict:
+        if self._current[0] is None:
+            raise SOAPError(701, 'Transition not available')
+        self._last_play = now
+        if self._transport_state == 'TRANSITIONING':
+            self._play_requested = True
+        elif self._transport_state == 'PAUSED_PLAYBACK':
+            self._transport_state = 'PLAYING'
+            self._since = now
+        elif self._transport_state == 'STOPPED':
+            self._position = 0.0
+            self._start(now)
+        return {}
+
+    def _do_Pause(self, now: float, arguments: dict) -> dict:
+        if self._transport_state != 'PLAYING':
+            raise SOAPError(701, 'Transition not available')
+        self._position, self._since = self._elapsed(now), None
+        self._transport_state = 'PAUSED_PLAYBACK'
+        return {}
+
+    def _do_Stop(self, now: float, arguments: dict) -> dict:
+        if self._transport_state != 'NO_MEDIA_PRESENT':
+            self._transport_state = 'STOPPED'
+        self._position, self._since = 0.0, None
+        self._ready_at = None
+        self._play_requested = False
+        return {}
+
+    def _do_Seek(self, now: float, arguments: dict) -> dict:
+        if arguments.get('Unit') != 'REL_TIME':
+            raise SOAPError(710, 'Seek mode not supported')
+        target = parse_time(arguments.get('Target'))
+        if target is None or self._current[0] is None or target > self._duration(self._current[0]):
+            raise SOAPError(711, 'Illegal seek target')
+        self._position = target
+        if self._since is not None:
+            self._since = now
+        return {}
+
+    def _do_GetTransportInfo(self, now: float, arguments: dict) -> dict:
+        return {'CurrentTransportState': self._transport_state, 'CurrentTransportStatus': 'OK', 'CurrentSpeed': '1'}
+
+    def _do_GetPositionInfo(self, now: float, arguments: dict) -> dict:
+        uri, metadata = self._current
+        duration = format_time(self._duration(uri)) if uri else '0:00:00'
+        elapsed = self._elapsed(now)
+        return {'Track': '1' if uri else '0', 'TrackDuration': duration, 'TrackMetaData': metadata, 'TrackURI': uri,
+                'RelTime': format_time(elapsed), 'AbsTime': format_time(elapsed),
+                'RelCount': str(int(elapsed)), 'AbsCount': str(int(elapsed))}
+
+    def _do_GetMediaInfo(self, now: float, arguments: dict) -> dict:
+        uri, metadata = self._current
+        next_uri, next_metadata = self._next
+        return {'NrTracks': '1' if uri else '0', 'MediaDuration': format_time(self._duration(uri)) if uri else '0:00:00',
+                'CurrentURI': uri, 'CurrentURIMetaData': metadata, 'NextURI': next_uri, 'NextURIMetaData': next_metadata,
+                'PlayMedium': 'NETWORK', 'RecordMedium': 'NOT_IMPLEMENTED', 'WriteStatus': 'NOT_IMPLEMENTED'}
+
+    def _do_GetProtocolInfo(self, now: float, arguments: dict) -> dict:
+        return {'Source': '', 'Sink': self._sink}
+
+    def _do_GetCurrentConnectionIDs(self, now: float, arguments: dict) -> dict:
+        return {'ConnectionIDs': '0'}
+
+    def get_last_play(self) -> float | None:
+        '''clock reading of the last Play received'''
+        return self._last_play
+
+    def get_info(self) -> dict:
+        with self._lock:
+            self._advance(self._clock())
+            return dict(self._stats, transport_state=self._transport_state, current_uri=self._current[0],
+                        next_uri=self._next[0])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, delayed ACKs would dominate every keep-alive call
+    disable_nagle_algorithm = True
+    # idle keep-alive connections don't hold a thread forever
+    timeout = 60
+
+    def do_GET(self):
+        renderer: SimulatedRenderer = self.server.renderer
+        sleep(renderer.delay())
+        name = self.path.split('/')[1]
+        if self.path == '/description.xml':
+            self._respond(200, renderer.description())
+        elif self.path.endswith('/scpd.xml') and name in SIMULATED_ACTIONS:
+            self._respond(200, scpd(SIMULATED_ACTIONS[name]))
+        else:
+            self._respond(404, '')
+
+    def do_POST(self):
+        renderer: SimulatedRenderer = self.server.renderer
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        service = self.path.split('/')[1]
+        action = self.headers.get('SOAPACTION', '').strip('"').split('#')[-1]
+        sleep(renderer.delay())
+        if renderer.drops():
+            # like a renderer losing the connection
+            self.close_connection = True
+            return
+        if service not in SIMULATED_ACTIONS or action not in SIMULATED_ACTIONS[service]:
+            self._respond(500, FAULT.format(code=401, description='Invalid Action'))
+            return
+        try:
+            result = renderer.handle(action, dlna_helper.parse_soap_response(body))
+        except SOAPError as e:
+            self._respond(500, FAULT.format(code=e.code, description=escape(e.description or '')))
+            return
+        arguments = ''.join(f"<{name}>{escape(result.get(name) or '')}</{name}>"
+                            for name in SIMULATED_ACTIONS[service][action][1])
+        self._respond(200, dlna_helper.SOAP_ENVELOPE.format(action=f"{action}Response", service_type=SERVICE_TYPES[service],
+                                                            arguments=arguments))
+
+    def _respond(self, status: int, body: str):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset="utf-8"')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RendererFleet():
+    '''count simulated renderers on ports of their own, options are passed to each SimulatedRenderer.
+    Connections are accepted on one thread for all of them and handled on a thread each.
+    '''
+
+    def __init__(self, count: int, host: str = '127.0.0.1', seed: int = None, **options):
+        self._host = host
+        self._renderers = [SimulatedRenderer(f"Simulated {n}", rng=random.Random(None if seed is None else seed + n),
+                                             **options)
+                           for n in range(count)]
+        self._servers: list[ThreadingHTTPServer] = []
+        self._selector: selectors.BaseSelector = None
+        self._thread: threading.Thread = None
+        self._stopped = threading.Event()
+
+    def start(self) -> 'RendererFleet':
+        self._selector = selectors.DefaultSelector()
+        for renderer in self._renderers:
+            server = ThreadingHTTPServer((self._host, 0), _Handler)
+            server.daemon_threads = True
+            server.renderer = renderer
+            renderer.location = f"http://{self._host}:{server.server_address[1]}/description.xml"
+            self._selector.register(server.socket, selectors.EVENT_READ, server)
+            self._servers.append(server)
+        self._thread = threading.Thread(target=self._accept, name='RendererFleet', daemon=True)
+        self._thread.start()
+        logger.debug(f"started {len(self._renderers)} simulated renderers")
+        return self
+
+    def _accept(self):
+        while not self._stopped.is_set():
+            for key, _ in self._selector.select(0.2):
+                server: ThreadingHTTPServer = key.data
+                try:
+                    request, client_address = server.get_request()
+                except OSError:
+                    continue
+                # a thread of its own per connection
+                server.process_request(request, client_address)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        for server in self._servers:
+            self._selector.unregister(server.socket)
+            server.server_close()
+        self._selector.close()
+        self._servers = []
+
+    def __enter__(self) -> 'RendererFleet':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def get_renderers(self) -> list[SimulatedRenderer]:
+        return self._renderers
+
+    def get_locations(self) -> list[str]:
+        return [r.location for r in self._renderers]
+
+    def get_info(self) -> dict:
+        infos = [r.get_info() for r in self._renderers]
+        res = {k: sum(i[k] for i in infos) for k in ('calls', 'faults', 'drops', 'tracks')}
+        res['renderers'] = len(infos)
+        return res
+
+
+def main(count: int):
+    with RendererFleet(count) as fleet:
+        # to be pasted into the config's renderers
+        print(json.dumps([{'name': r.name, 'url': r.location, 'capabilities': ['audio', 'video']}
+                          for r in fleet.get_renderers()], indent=1))
+        try:
+            while True:
+                sleep(60)
+                print(fleet.get_info(), file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,56 @@
+import socket
+import select
+import logging
+from time import monotonic
+
+from upnpclient.ssdp import ssdp_request, get_addresses_ipv4, SSDP_TARGET, ST_ROOTDEVICE
+
+# http://upnp.org/specs/arch/UPnP-arch-DeviceArchitecture-v1.1.pdf, chapter 1 Discovery
+
+logger = logging.getLogger(__file__)
+
+DEFAULT_TIMEOUT = 5
+
+
+def parse_response(data: bytes) -> dict[str, str]:
+    '''the headers of a search response, names in upper case'''
+    res = {}
+    for line in data.decode('utf-8', errors='replace').split('\r\n')[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            res[name.strip().upper()] = value.strip()
+    return res
+
+
+def search(timeout: float = DEFAULT_TIMEOUT, st: str = ST_ROOTDEVICE) -> dict[str, str | None]:
+    '''searches root devices like upnpclient's discovery, but keeps what it drops:
+    returns the locations with the configId (CONFIGID.UPNP.ORG) each device announced, None if not'''
+    res = {}
+    sockets = []
+    for address in get_addresses_ipv4():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+            sock.bind((address, 0))
+            sock.sendto(ssdp_request(st), SSDP_TARGET)
+            sock.setblocking(False)
+        except OSError as e:
+            logger.debug(f"cannot search on {address}", exc_info=e)
+            sock.close()
+            continue
+        sockets.append(sock)
+    try:
+        stop = monotonic() + timeout
+        while sockets and monotonic() < stop:
+            for sock in select.select(sockets, [], [], max(0, stop - monotonic()))[0]:
+                try:
+                    headers = parse_response(sock.recv(2048))
+                except OSError:
+                    continue
+                location = headers.get('LOCATION')
+                if location and res.get(location) is None:
+                    res[location] = headers.get('CONFIGID.UPNP.ORG')
+    finally:
+        for sock in sockets:
+            sock.close()
+    return res
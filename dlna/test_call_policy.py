@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from urllib.error import URLError, HTTPError
+from http.client import RemoteDisconnected
+
+from dlna.dlna_helper import SOAPError
+from dlna.call_policy import CallPolicy, CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    @patch('dlna.call_policy.monotonic')
+    def test_open_and_close(self, monotonic):
+        monotonic.return_value = 100
+        b = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+        b.record_failure()
+        self.assertEqual(CLOSED, b.get_state())
+        b.record_failure()
+        self.assertEqual(OPEN, b.get_state())
+        self.assertTrue(b.is_open())
+        self.assertFalse(b.allow())
+
+        # a single trial after the reset timeout
+        monotonic.return_value = 110
+        self.assertEqual(HALF_OPEN, b.get_state())
+        self.assertFalse(b.is_open())
+        self.assertTrue(b.allow())
+        self.assertTrue(b.is_open())
+        self.assertFalse(b.allow())
+
+        b.record_success()
+        self.assertEqual(CLOSED, b.get_state())
+        self.assertEqual({'opened': 1, 'rejected': 2, 'state': CLOSED, 'failures': 0}, b.get_info())
+
+    @patch('dlna.call_policy.monotonic')
+    def test_failed_trial(self, monotonic):
+        monotonic.return_value = 100
+        b = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+        b.record_failure()
+
+        monotonic.return_value = 111
+        self.assertTrue(b.allow())
+        b.record_failure()
+        self.assertEqual(OPEN, b.get_state())
+        monotonic.return_value = 120
+        self.assertEqual(OPEN, b.get_state())
+        monotonic.return_value = 121
+        self.assertEqual(HALF_OPEN, b.get_state())
+
+    def test_success_resets_failures(self):
+        b = CircuitBreaker(failure_threshold=2)
+        b.record_failure()
+        b.record_success()
+        b.record_failure()
+        self.assertEqual(CLOSED, b.get_state())
+
+
+@patch('dlna.call_policy.sleep')
+class TestCallPolicy(unittest.TestCase):
+
+    def test_call(self, sleep):
+        p = CallPolicy()
+        self.assertEqual(1, p.call(lambda: 1))
+        sleep.assert_not_called()
+        self.assertEqual((3, 5), p.get_timeout())
+
+    def test_retry_idempotent(self, sleep):
+        p = CallPolicy(retries=2, backoff=0.1)
+        fn = MagicMock(side_effect=[URLError('timed out'), RemoteDisconnected(), 'state'])
+
+        self.assertEqual('state', p.call(fn, idempotent=True))
+        self.assertEqual(3, fn.call_count)
+        self.assertEqual(2, sleep.call_count)
+        # jittered, but bounded by the exponential backoff
+        self.assertTrue(0 <= sleep.call_args_list[0][0][0] <= 0.1)
+        self.assertTrue(0 <= sleep.call_args_list[1][0][0] <= 0.2)
+        self.assertEqual(2, p.get_info()['retries'])
+
+    def test_no_retry_for_commands(self, sleep):
+        p = CallPolicy(retries=2)
+        fn = MagicMock(side_effect=TimeoutError())
+
+        with self.assertRaises(TimeoutError):
+            p.call(fn)
+        fn.assert_called_once()
+
+    def test_soap_fault_not_retried(self, sleep):
+        p = CallPolicy(failure_threshold=1)
+        fn = MagicMock(side_effect=SOAPError(701, 'Transition not available'))
+
+        with self.assertRaises(SOAPError):
+            p.call(fn, idempotent=True)
+        fn.assert_called_once()
+        # the renderer answered
+        self.assertFalse(p.is_open())
+
+    def test_http_error_not_retried(self, sleep):
+        p = CallPolicy(failure_threshold=1)
+        fn = MagicMock(side_effect=HTTPError('http://renderer/ctl', 500, 'Internal Server Error', {}, None))
+
+        with self.assertRaises(HTTPError):
+            p.call(fn, idempotent=True)
+        fn.assert_called_once()
+        # an error status is an answer as well
+        self.assertFalse(p.is_open())
+        self.assertEqual(0, p.get_info()['failures'])
+
+    def test_circuit_opens(self, sleep):
+        p = CallPolicy(retries=1, failure_threshold=2)
+        fn = MagicMock(side_effect=ConnectionRefusedError())
+
+        for _ in range(2):
+            with self.assertRaises(ConnectionRefusedError):
+                p.call(fn, idempotent=True)
+        self.assertTrue(p.is_open())
+        self.assertEqual(4, fn.call_count)
+
+        with self.assertRaises(CircuitOpenError):
+            p.call(fn)
+        self.assertEqual(4, fn.call_count)
+        info = p.get_info()
+        self.assertEqual(2, info['failures'])
+        self.assertEqual(OPEN, info['circuit']['state'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import json
+import unittest
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import MagicMock
+
+from dlna.description_cache import DescriptionCache, identify
+
+DESCRIPTION = '''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0" configId="{config_id}">
+  <device><friendlyName>Living Room</friendlyName><UDN>uuid:1234</UDN></device>
+</root>'''
+
+
+class DescriptionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        etag = f'"{server.config_id}"'
+        if server.fail:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = server.body or DESCRIPTION.format(config_id=server.config_id).encode()
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestDescriptionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), DescriptionHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.config_id = '1'
+        self.server.fail = False
+        self.server.body = None
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/description.xml"
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def _wait_refreshed(self, cache: DescriptionCache):
+        for t in list(cache._refreshing.values()):
+            t.join(5)
+
+    def test_identify(self):
+        self.assertEqual(('uuid:1234', '7'), identify(DESCRIPTION.format(config_id='7').encode()))
+        self.assertEqual((None, None), identify(b'<root xmlns="urn:schemas-upnp-org:device-1-0"/>'))
+
+    def test_miss_then_hit(self):
+        cache = DescriptionCache(self.tmp.name)
+
+        first = cache.get(self.url)
+        self.assertIn(b'configId="1"', first)
+        self.assertEqual(1, len(self.server.requests))
+
+        # a new instance, as after a restart, reads the disk
+        cache = DescriptionCache(self.tmp.name)
+        self.assertEqual(first, cache.get(self.url))
+        self.assertEqual(1, len(self.server.requests))
+
+        info = cache.get_info()
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(0, info['misses'])
+        self.assertEqual(1, info['entries'])
+
+        with open(os.path.join(self.tmp.name, os.listdir(self.tmp.name)[0])) as f:
+            entry = json.load(f)
+        self.assertEqual('uuid:1234', entry['udn'])
+        self.assertEqual('1', entry['config_id'])
+        self.assertEqual(self.url, entry['location'])
+
+    def test_revalidate_not_modified(self):
+        cache = DescriptionCache(self.tmp.name, max_age=0)
+        cache.get(self.url)
+        on_change = MagicMock()
+
+        cache.get(self.url, on_change=on_change)
+        self._wait_refreshed(cache)
+
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual('"1"', self.server.requests[1]['If-None-Match'])
+        on_change.assert_not_called()
+        info = cache.get_info()
+        self.assertEqual(1, info['revalidations'])
+        self.assertEqual(1, info['not_modified'])
+
+    def test_revalidate_changed(self):
+        cache = DescriptionCache(self.tmp.name, max_age=0)
+        cache.get(self.url)
+        self.server.config_id = '2'
+        on_change = MagicMock()
+
+        # the cached one is served, the changed one is handed over later
+        self.assertIn(b'configId="1"', cache.get(self.url, on_change=on_change))
+        self._wait_refreshed(cache)
+
+        on_change.assert_called_once()
+        self.assertIn(b'configId="2"', on_change.call_args[0][0])
+        self.assertEqual(1, cache.get_info()['changes'])
+        cache._max_age = 60
+        self.assertIn(b'configId="2"', cache.get(self.url))
+
+    def test_fresh_not_revalidated(self):
+        cache = DescriptionCache(self.tmp.name)
+        cache.get(self.url)
+        cache.get(self.url)
+
+        self.assertEqual({}, cache._refreshing)
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_announced_config_id(self):
+        cache = DescriptionCache(self.tmp.name)
+        cache.get(self.url)
+        self.server.config_id = '2'
+
+        self.assertIn(b'configId="1"', cache.get(self.url, config_id='1'))
+        # another configId than the cached one is a miss
+        self.assertIn(b'configId="2"', cache.get(self.url, config_id='2'))
+        self.assertEqual(2, cache.get_info()['misses'])
+
+    def test_revalidate_error(self):
+        cache = DescriptionCache(self.tmp.name, max_age=0)
+        cache.get(self.url)
+        self.server.fail = True
+
+        self.assertIn(b'configId="1"', cache.get(self.url))
+        self._wait_refreshed(cache)
+        self.assertEqual(1, cache.get_info()['errors'])
+
+    def test_not_utf_8(self):
+        self.server.body = DESCRIPTION.replace('version="1.0"', 'version="1.0" encoding="ISO-8859-1"') \
+            .replace('Living Room', 'Küche').format(config_id='1').encode('iso-8859-1')
+        cache = DescriptionCache(self.tmp.name)
+        self.assertEqual(self.server.body, cache.get(self.url))
+
+        # kept as it came
+        cache = DescriptionCache(self.tmp.name)
+        self.assertEqual(self.server.body, cache.get(self.url))
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_unreadable_entry(self):
+        cache = DescriptionCache(self.tmp.name)
+        with open(cache._path(self.url), 'w') as f:
+            f.write('no json')
+
+        self.assertIn(b'configId="1"', cache.get(self.url))
+        self.assertEqual(1, cache.get_info()['misses'])
+
+    def test_clear(self):
+        cache = DescriptionCache(self.tmp.name)
+        cache.get(self.url)
+        cache.clear()
+
+        self.assertEqual(0, cache.get_info()['entries'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,36 +1,69 @@
 import unittest
+import xml.etree.ElementTree as ET
+from io import BytesIO
+from urllib.error import HTTPError
 from dlna import dlna_helper
 from unittest.mock import patch
 
 
 class TestDLNAHelper(unittest.TestCase):
 
-    @patch("dlna.dlna_helper.urlopen")
-    @patch("dlna.dlna_helper.Request")
-    def test_send_request(self, request_constructor, urlopen):
+    SOAP_RESPONSE = b'''<?xml version="1.0"?>
+    <s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>
+    <u:GetTransportInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">
+    <CurrentTransportState>PLAYING</CurrentTransportState><CurrentSpeed>1</CurrentSpeed><Empty/>
+    </u:GetTransportInfoResponse></s:Body></s:Envelope>'''
+
+    SOAP_FAULT = b'''<?xml version="1.0"?>
+    <s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault>
+    <faultcode>s:Client</faultcode><faultstring>UPnPError</faultstring><detail>
+    <UPnPError xmlns="urn:schemas-upnp-org:control-1-0"><errorCode>701</errorCode>
+    <errorDescription>Transition not available</errorDescription></UPnPError>
+    </detail></s:Fault></s:Body></s:Envelope>'''
+
+    @patch("dlna.dlna_helper._POOLS")
+    def test_send_request(self, pools):
         dlna_helper.send_request('foo', 'bar', 'faz')
 
-        request_constructor.assert_called_with('foo', 'faz'.encode('utf-8'), 'bar')
-        urlopen.assert_called()
+        pools.request.assert_called_with('POST', 'foo', 'faz'.encode('utf-8'), 'bar', False)
 
-    def test_create_header(self):
+        dlna_helper.send_request('foo', 'bar', 'faz', stream=True)
+        pools.request.assert_called_with('POST', 'foo', 'faz'.encode('utf-8'), 'bar', True)
+
+    def test_create_header_keep_alive(self):
         res = dlna_helper.create_header('foo', 'bar')
-        self.assertTrue('foo' in res['Soapaction'])
-        self.assertTrue('bar' in res['Soapaction'])
+        self.assertEqual('keep-alive', res['Connection'])
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_soap_call(self, send_request):
+        send_request.return_value.read.return_value = self.SOAP_RESPONSE
 
-    def test_namespace_free_res_element(self):
+        res = dlna_helper.soap_call('http://foo/ctrl', 'urn:schemas-upnp-org:service:AVTransport:1', 'GetTransportInfo',
+                                    [('InstanceID', 0), ('Meta', '<a&b>'), ('Empty', None)])
+        self.assertEqual({'CurrentTransportState': 'PLAYING', 'CurrentSpeed': '1', 'Empty': ''}, res)
 
-        # no content in res
-        before = '''<bla:res xmlns:bla="blubb"></bla:res>'''
-        after = '''<res></res>'''
-        self.assertEqual(after, dlna_helper.namespace_free_res_element(before))
+        url, headers, body = send_request.call_args.args
+        self.assertEqual('http://foo/ctrl', url)
+        self.assertEqual('"urn:schemas-upnp-org:service:AVTransport:1#GetTransportInfo"', headers['Soapaction'])
+        action = ET.fromstring(body).find('.//{urn:schemas-upnp-org:service:AVTransport:1}GetTransportInfo')
+        self.assertEqual(['InstanceID', 'Meta', 'Empty'], [c.tag for c in action])
+        self.assertEqual('<a&b>', action.find('Meta').text)
 
-        # content in res
-        before = '''<bla:res xmlns:bla="blubb">asdf</bla:res>'''
-        after = '''<res>asdf</res>'''
-        self.assertEqual(after, dlna_helper.namespace_free_res_element(before))
+    @patch("dlna.dlna_helper.send_request")
+    def test_soap_call_error(self, send_request):
+        send_request.side_effect = HTTPError('http://foo', 500, 'error', {}, BytesIO(self.SOAP_FAULT))
 
-        # real life example
-        before = '''<ns0:res xmlns:ns0="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" size="3094117" duration="0:03:13.366" bitrate="128000" sampleFrequency="44100" nrAudioChannels="2" protocolInfo="http-get:*:audio/mpeg:DLNA.ORG_PN=MP3;DLNA.ORG_OP=01;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=01700000000000000000000000000000">http://192.168.0.9:8200/MediaItems/20971.mp3</ns0:res>'''
-        after = '''<res size="3094117" duration="0:03:13.366" bitrate="128000" sampleFrequency="44100" nrAudioChannels="2" protocolInfo="http-get:*:audio/mpeg:DLNA.ORG_PN=MP3;DLNA.ORG_OP=01;DLNA.ORG_CI=0;DLNA.ORG_FLAGS=01700000000000000000000000000000">http://192.168.0.9:8200/MediaItems/20971.mp3</res>'''
-        self.assertEqual(after, dlna_helper.namespace_free_res_element(before))
+        with self.assertRaises(dlna_helper.SOAPError) as ctx:
+            dlna_helper.soap_call('http://foo/ctrl', 'urn:x', 'Play', [('InstanceID', 0)])
+        self.assertEqual(701, ctx.exception.code)
+        self.assertEqual('Transition not available', ctx.exception.description)
+
+        # no upnp error inside
+        send_request.side_effect = HTTPError('http://foo', 404, 'not found', {}, BytesIO(b'not found'))
+        with self.assertRaises(HTTPError):
+            dlna_helper.soap_call('http://foo/ctrl', 'urn:x', 'Play', [('InstanceID', 0)])
+
+    def test_create_header(self):
+        res = dlna_helper.create_header('foo', 'bar')
+        self.assertTrue('foo' in res['Soapaction'])
+        self.assertTrue('bar' in res['Soapaction'])
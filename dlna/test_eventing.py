@@ -0,0 +1,152 @@
+import unittest
+import threading
+from html import escape
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.error import HTTPError
+from unittest.mock import patch
+
+from dlna.eventing import EventListener, Subscription, parse_last_change, local_address_for
+
+LAST_CHANGE = '''<Event xmlns="urn:schemas-upnp-org:metadata-1-0/AVT/">
+<InstanceID val="0"><TransportState val="PLAYING"/><CurrentTrackURI val="http://x/1.mp3?a=1&amp;b=2"/></InstanceID>
+<InstanceID val="1"><TransportState val="STOPPED"/></InstanceID>
+</Event>'''
+
+PROPERTYSET = f'''<?xml version="1.0"?>
+<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0">
+<e:property><LastChange>{escape(LAST_CHANGE)}</LastChange></e:property>
+</e:propertyset>'''
+
+
+class DeviceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_SUBSCRIBE(self):
+        self.requests.append(('SUBSCRIBE', dict(self.headers)))
+        if self.headers.get('SID') == 'uuid:unknown':
+            self.send_response(412)
+        else:
+            self.send_response(200)
+            self.send_header('SID', self.headers.get('SID', 'uuid:4711'))
+            self.send_header('TIMEOUT', 'Second-300')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_UNSUBSCRIBE(self):
+        self.requests.append(('UNSUBSCRIBE', dict(self.headers)))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestEventing(unittest.TestCase):
+
+    def test_parse_last_change(self):
+        values = parse_last_change(PROPERTYSET)
+        self.assertEqual({'TransportState': 'PLAYING', 'CurrentTrackURI': 'http://x/1.mp3?a=1&b=2'}, values)
+        self.assertEqual({'TransportState': 'STOPPED'}, parse_last_change(PROPERTYSET, '1'))
+
+        # other state variables only
+        other = '<e:propertyset xmlns:e="urn:schemas-upnp-org:event-1-0"><e:property><Foo>1</Foo></e:property></e:propertyset>'
+        self.assertEqual({}, parse_last_change(other))
+
+    def test_parse_last_change_rejects_entities(self):
+        bomb = '<!DOCTYPE e [<!ENTITY a "aaaaaaaaaa"><!ENTITY b "&a;&a;&a;&a;&a;">]><e:propertyset ' \
+            'xmlns:e="urn:schemas-upnp-org:event-1-0"><e:property><LastChange>&b;</LastChange></e:property></e:propertyset>'
+        with self.assertRaises(ValueError):
+            parse_last_change(bomb)
+
+    def test_local_address_for(self):
+        self.assertEqual('127.0.0.1', local_address_for('http://127.0.0.1:1234/evt'))
+
+    def test_subscription(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), DeviceHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        DeviceHandler.requests = []
+        try:
+            s = Subscription(f"http://127.0.0.1:{server.server_address[1]}/evt", 'http://127.0.0.1:1/cb', 600)
+            self.assertFalse(s.is_active())
+            with self.assertRaises(ValueError):
+                s.renew()
+
+            s.subscribe()
+            self.assertTrue(s.is_active())
+            self.assertEqual('uuid:4711', s.get_sid())
+            self.assertEqual(300, s.get_timeout())
+            method, headers = DeviceHandler.requests[-1]
+            self.assertEqual('<http://127.0.0.1:1/cb>', headers['CALLBACK'])
+            self.assertEqual('upnp:event', headers['NT'])
+            self.assertEqual('Second-600', headers['TIMEOUT'])
+
+            s.renew()
+            method, headers = DeviceHandler.requests[-1]
+            self.assertEqual('uuid:4711', headers['SID'])
+            self.assertNotIn('CALLBACK', headers)
+
+            s.unsubscribe()
+            self.assertFalse(s.is_active())
+            self.assertEqual('UNSUBSCRIBE', DeviceHandler.requests[-1][0])
+
+            # the device does not know the subscription anymore
+            s._sid = 'uuid:unknown'
+            with self.assertRaises(HTTPError):
+                s.renew()
+            self.assertFalse(s.is_active())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    @patch('dlna.dlna_helper.http_request')
+    def test_subscription_request_timeout(self, http_request):
+        http_request.return_value.headers = {'SID': 'uuid:4711', 'TIMEOUT': 'Second-300'}
+        s = Subscription('http://device/evt', 'http://me/cb', request_timeout=(2, 4))
+
+        s.subscribe()
+        s.renew()
+        s.unsubscribe()
+        # the renderer's timeouts, not the pool's default
+        self.assertEqual([(2, 4)] * 3, [c.kwargs['timeout'] for c in http_request.call_args_list])
+
+    def test_listener(self):
+        listener = EventListener(host='127.0.0.1')
+        listener.start()
+        received = []
+        try:
+            callback_url = listener.register('http://127.0.0.1:1234/evt', received.append)
+            self.assertTrue(callback_url.startswith(f"http://127.0.0.1:{listener.get_port()}/"))
+            path = callback_url[callback_url.index('/', 7):]
+
+            conn = HTTPConnection('127.0.0.1', listener.get_port())
+            headers = {'NT': 'upnp:event', 'NTS': 'upnp:propchange', 'SID': 'uuid:4711', 'SEQ': '0'}
+            conn.request('NOTIFY', path, PROPERTYSET.encode('utf-8'), headers)
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(200, response.status)
+            self.assertEqual([{'TransportState': 'PLAYING', 'CurrentTrackURI': 'http://x/1.mp3?a=1&b=2'}], received)
+
+            # unknown subscriber
+            conn.request('NOTIFY', '/unknown', PROPERTYSET.encode('utf-8'), headers)
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(412, response.status)
+
+            listener.unregister(callback_url)
+            conn.request('NOTIFY', path, PROPERTYSET.encode('utf-8'), headers)
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(412, response.status)
+            conn.close()
+
+            info = listener.get_info()
+            self.assertEqual(1, info['notifications'])
+            self.assertEqual(2, info['unknown'])
+            self.assertEqual(0, info['subscribers'])
+        finally:
+            listener.stop()
+        self.assertIsNone(listener.get_info()['port'])
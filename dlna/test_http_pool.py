@@ -0,0 +1,188 @@
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.error import HTTPError
+from http.client import RemoteDisconnected
+from time import sleep
+from unittest.mock import patch
+
+from dlna.http_pool import HTTPConnectionPool, HTTPConnectionPools
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        status = 500 if body == b'fail' else 200
+        if body == b'slow':
+            sleep(0.5)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        if body == b'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/ctrl"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _testee(self, **kwargs) -> HTTPConnectionPool:
+        self.pool = HTTPConnectionPool('http', f"127.0.0.1:{self.server.server_address[1]}", **kwargs)
+        return self.pool
+
+    def test_reuse(self):
+        pool = self._testee()
+
+        for i in range(3):
+            res = pool.request('POST', self.url, f"hello {i}".encode(), {})
+            self.assertEqual(200, res.getcode())
+            self.assertEqual(f"hello {i}".encode(), res.read())
+
+        info = pool.get_info()
+        self.assertEqual(3, info['requests'])
+        self.assertEqual(1, info['opened'])
+        self.assertEqual(2, info['reused'])
+        self.assertEqual(1, info['open'])
+        self.assertEqual(0.667, info['reuse_ratio'])
+        pool.close()
+        self.assertEqual(0, pool.get_info()['open'])
+
+    def test_server_closes(self):
+        pool = self._testee()
+
+        pool.request('POST', self.url, b'close', {})
+        pool.request('POST', self.url, b'again', {})
+
+        info = pool.get_info()
+        self.assertEqual(2, info['opened'])
+        self.assertEqual(0, info['reused'])
+
+    def test_idle_timeout(self):
+        pool = self._testee(idle_timeout=10)
+        pool.request('POST', self.url, b'a', {})
+
+        with patch('dlna.http_pool.monotonic') as monotonic:
+            monotonic.return_value = 10**9
+            pool.request('POST', self.url, b'b', {})
+
+        info = pool.get_info()
+        self.assertEqual(2, info['opened'])
+        self.assertEqual(1, info['discarded'])
+
+    def test_stale_connection_retried(self):
+        pool = self._testee()
+        pool.request('POST', self.url, b'a', {})
+
+        # the server dropped the kept-alive connection without us noticing
+        exchange = pool._exchange
+        failures = [RemoteDisconnected()]
+
+        def exchange_once_failing(*args):
+            if failures:
+                raise failures.pop()
+            return exchange(*args)
+
+        with patch.object(pool, '_exchange', side_effect=exchange_once_failing):
+            self.assertEqual(b'b', pool.request('POST', self.url, b'b', {}).read())
+        self.assertEqual(2, pool.get_info()['opened'])
+        self.assertEqual(1, pool.get_info()['discarded'])
+
+    def test_http_error(self):
+        pool = self._testee()
+
+        with self.assertRaises(HTTPError) as ctx:
+            pool.request('POST', self.url, b'fail', {})
+        self.assertEqual(500, ctx.exception.code)
+        self.assertEqual(b'fail', ctx.exception.read())
+        # the connection is fine nevertheless
+        pool.request('POST', self.url, b'ok', {})
+        self.assertEqual(1, pool.get_info()['reused'])
+
+    def test_timeout(self):
+        pool = self._testee()
+
+        with self.assertRaises(TimeoutError):
+            pool.request('POST', self.url, b'slow', {}, timeout=(1, 0.1))
+        self.assertEqual(1, pool.get_info()['discarded'])
+        self.assertEqual(0, pool.get_info()['in_use'])
+
+        # the timeout applies to its request only
+        self.assertEqual(b'ok', pool.request('POST', self.url, b'ok', {}, timeout=(1, 0.1)).read())
+        self.assertEqual(b'slow', pool.request('POST', self.url, b'slow', {}).read())
+        self.assertEqual(1, pool.get_info()['reused'])
+
+    def test_bounded(self):
+        pool = self._testee(max_size=2)
+
+        threads = [threading.Thread(target=pool.request, args=('POST', self.url, b'x', {})) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        info = pool.get_info()
+        self.assertEqual(10, info['requests'])
+        self.assertTrue(info['opened'] <= 2)
+        self.assertEqual(0, info['in_use'])
+
+    def test_pools_per_host(self):
+        pools = HTTPConnectionPools()
+
+        pools.request('POST', self.url, b'a', {})
+        pools.request('POST', self.url.replace('/ctrl', '/other'), b'b', {})
+        self.assertIs(pools.get_pool(self.url), pools.get_pool(self.url + '?x=1'))
+        self.assertIsNot(pools.get_pool(self.url), pools.get_pool('http://localhost:1/'))
+
+        info = pools.get_info()
+        self.assertEqual(2, info[f"http://127.0.0.1:{self.server.server_address[1]}"]['requests'])
+        pools.close()
+
+    def test_stream(self):
+        pool = self._testee()
+
+        res = pool.request('POST', self.url, b'streamed body', {}, stream=True)
+        # connection stays in use until the body is read
+        self.assertEqual(1, pool.get_info()['in_use'])
+        self.assertEqual(b'stream', res.read(6))
+        self.assertEqual(b'ed body', res.read(100))
+        self.assertEqual(b'', res.read(100))
+
+        info = pool.get_info()
+        self.assertEqual(0, info['in_use'])
+        self.assertEqual(1, info['idle'])
+        pool.request('POST', self.url, b'again', {})
+        self.assertEqual(1, pool.get_info()['reused'])
+
+    def test_stream_closed_early(self):
+        pool = self._testee()
+
+        res = pool.request('POST', self.url, b'streamed body', {}, stream=True)
+        res.read(3)
+        res.close()
+        res.close()
+
+        info = pool.get_info()
+        self.assertEqual(0, info['in_use'])
+        self.assertEqual(0, info['idle'])
+        self.assertEqual(1, info['discarded'])
+
+    def test_stream_error(self):
+        pool = self._testee()
+
+        with self.assertRaises(HTTPError):
+            pool.request('POST', self.url, b'fail', {}, stream=True)
+        self.assertEqual(0, pool.get_info()['in_use'])
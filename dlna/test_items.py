@@ -81,3 +81,32 @@ class TestItem(unittest.TestCase):
 
         val = ET.tostring(i.get_item(), encoding="utf-8", method="xml")
         self.assertEqual(val, i.get_item_as_string())
+
+    def test_item_compact(self):
+        i = Item(ET.fromstring(self.EXAMPLE_ITEM))
+
+        # parsed once into slots, no element or dict is kept
+        self.assertFalse(hasattr(i, '__dict__'))
+        self.assertEqual("64$1$1$D$4$F$E$7", i.get_id())
+        self.assertIsNone(i.get_ref_id())
+        self.assertEqual("Made in Heaven", i.get_album())
+        self.assertEqual("6", i.get_original_track_number())
+        self.assertEqual("0:04:49.810", i.get_res_attributes()['duration'])
+        self.assertEqual("0:04:49.810", i.get_res().get('duration'))
+
+    def test_item_res_escaped(self):
+        i = Item(ET.fromstring(self.EXAMPLE_ITEM_2.replace('20972.mp3<', '20972.mp3?a=1&amp;b="2"<')))
+
+        self.assertEqual('http://127.0.0.1/MediaItems/20972.mp3?a=1&b="2"', i.get_url())
+        res = ET.fromstring(i.get_res_as_string())
+        self.assertEqual('res', res.tag)
+        self.assertEqual(i.get_url(), res.text)
+        self.assertEqual('4637479', res.get('size'))
+
+    def test_item_rebuilt(self):
+        i = Item(ET.fromstring(self.EXAMPLE_ITEM))
+        rebuilt = Item(i.get_item())
+
+        for getter in ('get_id', 'get_title', 'get_artist', 'get_actor', 'get_author', 'get_creator',
+                       'get_album', 'get_class', 'get_url', 'get_res_as_string'):
+            self.assertEqual(getattr(i, getter)(), getattr(rebuilt, getter)())
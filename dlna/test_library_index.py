@@ -0,0 +1,120 @@
+import unittest
+from html import escape
+
+from dlna.library_index import LibraryIndex
+from dlna.search_responses import SearchResponse
+
+
+def browse_response(didl_content, total=None):
+    didl = ('<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/"'
+            ' xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">' + ''.join(didl_content) + '</DIDL-Lite>')
+    returned = len(didl_content)
+    return SearchResponse(f'''<?xml version="1.0" encoding="utf-8"?>
+        <s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>
+        <u:BrowseResponse xmlns:u="urn:schemas-upnp-org:service:ContentDirectory:1">
+        <Result>{escape(didl)}</Result>
+        <NumberReturned>{returned}</NumberReturned>
+        <TotalMatches>{returned if total is None else total}</TotalMatches>
+        </u:BrowseResponse></s:Body></s:Envelope>''')
+
+
+def item(id, title, artist, upnp_class='object.item.audioItem.musicTrack', album='', track=1, ref_id=None):
+    ref = f' refID="{ref_id}"' if ref_id else ''
+    return (f'<item id="{id}" parentID="1" restricted="1"{ref}><dc:title>{title}</dc:title>'
+            f'<upnp:artist>{artist}</upnp:artist><upnp:album>{album}</upnp:album>'
+            f'<upnp:originalTrackNumber>{track}</upnp:originalTrackNumber><upnp:class>{upnp_class}</upnp:class>'
+            f'<res protocolInfo="http-get:*:audio/mpeg:*">http://127.0.0.1/{id}.mp3</res></item>')
+
+
+def container(id):
+    return f'<container id="{id}" parentID="0" restricted="1"><dc:title>{id}</dc:title></container>'
+
+
+class FakeServer():
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.calls = []
+
+    def browse(self, object_id, start, count):
+        self.calls.append((object_id, start, count))
+        return self.pages[(object_id, start)]
+
+
+class TestLibraryIndex(unittest.TestCase):
+
+    def _server(self):
+        return FakeServer({
+            ('0', 0): browse_response([container('music'), container('videos')]),
+            ('music', 0): browse_response([
+                item('m1', 'Bohemian Rhapsody', 'Queen', album='A Night at the Opera', track=11),
+                item('m2', 'Show Must Go On', 'Queen', album='Innuendo', track=12)], total=3),
+            ('music', 2): browse_response([
+                item('m3', 'Narcotic', 'Liquido'),
+                item('m4', 'Show Must Go On', 'Queen', ref_id='m2')], total=3),
+            ('videos', 0): browse_response([
+                item('v1', 'Bohemian Rhapsody Live', 'Queen', upnp_class='object.item.videoItem')]),
+        })
+
+    def _testee(self, server=None):
+        index = LibraryIndex(server or self._server(), page_size=2)
+        index.build()
+        return index
+
+    def test_cold(self):
+        index = LibraryIndex(self._server())
+        self.assertFalse(index.is_warm())
+        self.assertEqual(0, index.get_info()['items'])
+        with self.assertRaises(ValueError):
+            index.search(title='foo')
+
+    def test_build_pages_and_containers(self):
+        server = self._server()
+        index = self._testee(server)
+
+        self.assertTrue(index.is_warm())
+        # references are skipped
+        self.assertEqual(4, index.get_info()['items'])
+        self.assertTrue(('music', 2, 2) in server.calls)
+        self.assertTrue(('videos', 0, 2) in server.calls)
+
+    def test_search_artist_sorted(self):
+        res = self._testee().search(artist='queen')
+
+        self.assertEqual(2, res.get_matches())
+        titles = [i.get_title() for i in res.get_items()]
+        self.assertEqual(['Bohemian Rhapsody', 'Show Must Go On'], titles)
+
+    def test_search_contains(self):
+        index = self._testee()
+
+        self.assertEqual('m2', index.search(title='must go').first_item().get_id())
+        self.assertEqual('m2', index.search(title='ow mu').first_item().get_id())
+        self.assertEqual(0, index.search(title='go must').get_matches())
+        self.assertEqual(1, index.search(title='arco', artist='liqu').get_matches())
+        self.assertEqual(0, index.search(title='narcotic', artist='queen').get_matches())
+
+    def test_search_parts_of_any_length(self):
+        index = self._testee()
+
+        # shorter and longer than the indexed substrings, at the start, inside and at the end of a token
+        self.assertEqual(3, index.search(title='o').get_matches())
+        self.assertEqual(1, index.search(title='rc').get_matches())
+        self.assertEqual(1, index.search(title='hapsody').get_matches())
+        self.assertEqual(0, index.search(title='rhapsodyx').get_matches())
+        self.assertEqual(2, index.search(artist='UEE').get_matches())
+
+    def test_search_types(self):
+        index = self._testee()
+
+        self.assertEqual(1, index.search(title='bohemian').get_matches())
+        self.assertEqual('v1', index.search(title='bohemian', type='video').first_item().get_id())
+        self.assertEqual(0, index.search(title='bohemian', type='image').get_matches())
+        with self.assertRaises(ValueError):
+            index.search(title='bohemian', type='foo')
+
+    def test_search_max_size(self):
+        res = self._testee().search(artist='queen', max_size=1)
+
+        self.assertEqual(2, res.get_matches())
+        self.assertEqual(1, res.get_returned())
@@ -1,9 +1,12 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 import xml.etree.ElementTree as ET
+from io import BytesIO
+from html import escape
 
 from dlna.mediaserver import MediaServer
-from dlna.search_responses import SearchResponse
+from dlna.search_responses import SearchResponse, PagedSearchResponse, SampledSearchResponse
+from dlna.search_cache import SearchCache
 
 
 class TestMediaserver(unittest.TestCase):
@@ -14,28 +17,26 @@ class TestMediaserver(unittest.TestCase):
 
     class FakeResponse:
 
-        class Decodeable:
-            text: str
-
-            def __init__(self, txt):
-                self.text = txt
-
-            def decode(self, encoding):
-                assert encoding == 'utf-8'
-                return self.text
-
         def __init__(self, txt):
             self.text = txt
-            self.read_result = TestMediaserver.FakeResponse.Decodeable(txt)
+            self.content = BytesIO(txt.encode('utf-8'))
+            self.closed = False
+
+        def read(self, amt=None):
+            return self.content.read(amt)
+
+        def close(self):
+            self.closed = True
 
-        def read(self):
-            return self.read_result
+    def _respond_with(self, send_request_mock, txt):
+        # a fresh response per request, as they are read only once
+        send_request_mock.side_effect = lambda *args, **kwargs: TestMediaserver.FakeResponse(txt)
 
     @patch("dlna.dlna_helper.send_request")
     @patch("dlna.dlna_helper.create_header")
     def test_search_basic(self, create_header_mock, send_request_mock):
         create_header_mock.return_value = 'bla'
-        send_request_mock.return_value = TestMediaserver.FakeResponse(self.EXAMPLE_ITEM)
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
 
         ms = MediaServer('some-url')
         res = ms.search(title='foo')
@@ -59,7 +60,7 @@ class TestMediaserver(unittest.TestCase):
     @patch("dlna.dlna_helper.create_header")
     def test_search_artist(self, create_header_mock, send_request_mock):
         create_header_mock.return_value = 'bla'
-        send_request_mock.return_value = TestMediaserver.FakeResponse(self.EXAMPLE_ITEM)
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
 
         ms = MediaServer('some-url')
         res = ms.search(artist='bar')
@@ -73,7 +74,7 @@ class TestMediaserver(unittest.TestCase):
     @patch("dlna.dlna_helper.create_header")
     def test_search_sizes(self, create_header_mock, send_request_mock):
         create_header_mock.return_value = 'bla'
-        send_request_mock.return_value = TestMediaserver.FakeResponse(self.EXAMPLE_ITEM)
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
 
         ms = MediaServer('asdf')
         with self.assertRaises(ValueError):
@@ -98,7 +99,7 @@ class TestMediaserver(unittest.TestCase):
     @patch("dlna.dlna_helper.create_header")
     def test_search_types(self, create_header_mock, send_request_mock):
         create_header_mock.return_value = 'bla'
-        send_request_mock.return_value = TestMediaserver.FakeResponse(self.EXAMPLE_ITEM)
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
 
         ms = MediaServer('asdf')
 
@@ -128,3 +129,196 @@ class TestMediaserver(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             ms.search(title='foo', type='somethingelse')
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_browse(self, send_request_mock):
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
+
+        ms = MediaServer('some-url')
+        res = ms.browse('64$0', 10, 50)
+        self.assertTrue(isinstance(res, SearchResponse))
+
+        self.assertEqual('ContentDirectory:1#Browse"', send_request_mock.call_args.args[1]['Soapaction'][-26:])
+        body = ET.fromstring(send_request_mock.call_args.args[2])
+        self.assertEqual('64$0', body.find('.//ObjectID').text)
+        self.assertEqual('BrowseDirectChildren', body.find('.//BrowseFlag').text)
+        self.assertEqual('10', body.find('.//StartingIndex').text)
+        self.assertEqual('50', body.find('.//RequestedCount').text)
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_get_item(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(1)
+
+        ms = MediaServer('some-url')
+        item = ms.get_item('0')
+        self.assertEqual('http://x/0.mp3', item.get_url())
+
+        body = ET.fromstring(send_request_mock.call_args.args[2])
+        self.assertEqual('0', body.find('.//ObjectID').text)
+        self.assertEqual('BrowseMetadata', body.find('.//BrowseFlag').text)
+
+        # a container
+        send_request_mock.side_effect = self._paging_responses(0)
+        self.assertIsNone(ms.get_item('64'))
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_uses_warm_index(self, send_request_mock):
+        index = MagicMock()
+        ms = MediaServer('some-url')
+        ms.set_index(index)
+
+        # cold index falls back to the live search
+        index.is_warm.return_value = False
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
+        ms.search(title='foo')
+        send_request_mock.assert_called()
+        index.search.assert_not_called()
+
+        # warm index answers
+        send_request_mock.reset_mock()
+        index.is_warm.return_value = True
+        res = ms.search(title='foo', max_size='3')
+        send_request_mock.assert_not_called()
+        index.search.assert_called_with(title='foo', artist=None, type='audio', max_size=3)
+        self.assertEqual(index.search.return_value, res)
+
+        # validation still applies
+        with self.assertRaises(ValueError):
+            ms.search(title='foo', type='somethingelse')
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_uses_cache(self, send_request_mock):
+        self._respond_with(send_request_mock, self.EXAMPLE_ITEM)
+
+        ms = MediaServer('some-url')
+        ms.set_cache(SearchCache())
+        res = ms.search(artist='Die Ärzte')
+        self.assertEqual(res, ms.search(artist=' die aerzte'))
+        send_request_mock.assert_called_once()
+
+        # the original spelling is sent to the media server
+        body = ET.fromstring(send_request_mock.call_args.args[2])
+        self.assertTrue('upnp:artist contains "Die Ärzte"' in body.find('.//SearchCriteria').text)
+
+        ms.search(artist='Die Ärzte', max_size=10)
+        self.assertEqual(2, send_request_mock.call_count)
+        self.assertEqual(1, ms.get_info()['cache']['hits'])
+
+    def _paging_responses(self, total):
+        '''fakes a media server with the given number of items, answering depending on StartingIndex'''
+        def respond(url, header, body, stream=False):
+            b = ET.fromstring(body)
+            start = int(b.find('.//StartingIndex').text)
+            count = int(b.find('.//RequestedCount').text)
+            ids = range(start, min(start + count, total))
+            didl = ''.join(f'<item id="{i}"><res>http://x/{i}.mp3</res></item>' for i in ids)
+            didl = f'<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">{didl}</DIDL-Lite>'
+            return TestMediaserver.FakeResponse(f'<r><Result>{escape(didl)}</Result><TotalMatches>{total}</TotalMatches>'
+                                                f'<NumberReturned>{len(ids)}</NumberReturned></r>')
+        return respond
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_iter(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(25)
+
+        ms = MediaServer('some-url')
+        it = ms.search_iter(artist='foo', page_size=10)
+        # lazy, nothing fetched yet
+        send_request_mock.assert_not_called()
+
+        self.assertEqual('0', next(it).get_id())
+        self.assertEqual(1, send_request_mock.call_count)
+
+        rest = list(it)
+        self.assertEqual(24, len(rest))
+        self.assertEqual('24', rest[-1].get_id())
+        self.assertEqual(3, send_request_mock.call_count)
+        starts = [ET.fromstring(c.args[2]).find('.//StartingIndex').text for c in send_request_mock.call_args_list]
+        self.assertEqual(['0', '10', '20'], starts)
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_iter_limit(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(25)
+
+        ms = MediaServer('some-url')
+        self.assertEqual(15, len(list(ms.search_iter(artist='foo', page_size=10, limit=15))))
+        counts = [ET.fromstring(c.args[2]).find('.//RequestedCount').text for c in send_request_mock.call_args_list]
+        self.assertEqual(['10', '5'], counts)
+
+        with self.assertRaises(ValueError):
+            list(ms.search_iter(artist='foo', page_size=0))
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_paged(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(250)
+
+        ms = MediaServer('some-url', page_size=100)
+        res = ms.search(artist='foo')
+        self.assertTrue(isinstance(res, PagedSearchResponse))
+        self.assertEqual(250, res.get_matches())
+        self.assertIsNotNone(res.random_item())
+
+        self.assertTrue(res.wait(1))
+        # not limited to the default max_size of the unpaged search
+        self.assertEqual(250, res.get_returned())
+        self.assertEqual(3, send_request_mock.call_count)
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_paged_draws_all_matches(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(250)
+
+        ms = MediaServer('some-url', page_size=100)
+        with patch('dlna.shuffle_deck.random.randrange') as randrange:
+            randrange.return_value = 215
+            # not biased towards the first page, whether or not the third one arrived yet
+            self.assertEqual('215', ms.search(artist='foo').random_item().get_id())
+            randrange.assert_called_with(0, 250)
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_paged_crawl_limit(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(250)
+
+        ms = MediaServer('some-url', page_size=100, crawl_limit=150)
+        res = ms.search(artist='foo')
+        self.assertTrue(res.wait(1))
+        self.assertEqual(150, res.get_returned())
+        # the others are still drawn
+        with patch('dlna.shuffle_deck.random.randrange') as randrange:
+            randrange.return_value = 215
+            self.assertEqual('215', res.random_item().get_id())
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_paged_max_size(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(250)
+
+        ms = MediaServer('some-url', page_size=100)
+        res = ms.search(artist='foo', max_size=120)
+        self.assertTrue(res.wait(1))
+        self.assertEqual(120, res.get_returned())
+        # the last page asks for the rest only
+        counts = [ET.fromstring(c.args[2]).find('.//RequestedCount').text for c in send_request_mock.call_args_list]
+        self.assertEqual(['100', '20'], counts)
+
+    @patch("dlna.dlna_helper.send_request")
+    def test_search_sampling(self, send_request_mock):
+        send_request_mock.side_effect = self._paging_responses(1000)
+
+        ms = MediaServer('some-url', sampling=True)
+        res = ms.search(artist='foo')
+        self.assertTrue(isinstance(res, SampledSearchResponse))
+        self.assertEqual(1000, res.get_matches())
+
+        # counting asks for a single unsorted item
+        body = ET.fromstring(send_request_mock.call_args.args[2])
+        self.assertEqual('1', body.find('.//RequestedCount').text)
+        self.assertEqual('0', body.find('.//StartingIndex').text)
+        self.assertIsNone(body.find('.//SortCriteria').text)
+
+        with patch('dlna.shuffle_deck.random.randrange') as randrange:
+            randrange.return_value = 815
+            self.assertEqual('815', res.random_item().get_id())
+            randrange.assert_called_with(0, 1000)
+        body = ET.fromstring(send_request_mock.call_args.args[2])
+        self.assertEqual('1', body.find('.//RequestedCount').text)
+        self.assertEqual('815', body.find('.//StartingIndex').text)
+        self.assertEqual(2, send_request_mock.call_count)
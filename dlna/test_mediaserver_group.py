@@ -0,0 +1,113 @@
+import unittest
+import threading
+from unittest.mock import MagicMock
+
+from dlna.mediaserver_group import MediaServerGroup
+
+
+class FakeResponse():
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def get_matches(self):
+        return self.matches
+
+    def get_items(self):
+        return []
+
+    def get_items_from(self, start):
+        return []
+
+    def first_item(self):
+        return None
+
+
+class TestMediaServerGroup(unittest.TestCase):
+
+    def _server(self, response=None, error=None, block: threading.Event = None):
+        server = MagicMock()
+
+        def search(**kwargs):
+            if block is not None:
+                block.wait(2)
+            if error is not None:
+                raise error
+            return response
+        server.search.side_effect = search
+        return server
+
+    def test_all_servers_searched(self):
+        a = self._server(FakeResponse(3))
+        b = self._server(FakeResponse(4))
+        group = MediaServerGroup([a, b])
+
+        res = group.search(artist='foo', type='audio')
+        a.search.assert_called_with(artist='foo', type='audio')
+        b.search.assert_called_with(artist='foo', type='audio')
+        self.assertEqual(7, res.get_matches())
+        self.assertEqual(1, group.get_info()['fan_out']['searches'])
+
+    def test_early_return_with_late_response(self):
+        release = threading.Event()
+        fast = self._server(FakeResponse(10))
+        slow = self._server(FakeResponse(5), block=release)
+        group = MediaServerGroup([fast, slow], enough=10)
+
+        res = group.search(title='foo')
+        # did not wait for the slow server
+        self.assertEqual(10, res.get_matches())
+        self.assertEqual(1, group.get_info()['fan_out']['early_returns'])
+
+        # but it's added as soon as it arrives
+        release.set()
+        group._executor.shutdown(wait=True)
+        self.assertEqual(15, res.get_matches())
+        self.assertEqual(1, group.get_info()['fan_out']['late_responses'])
+
+    def test_deadline(self):
+        release = threading.Event()
+        fast = self._server(FakeResponse(1))
+        slow = self._server(FakeResponse(5), block=release)
+        group = MediaServerGroup([fast, slow], deadline=0.1, enough=10)
+
+        res = group.search(title='foo')
+        self.assertEqual(1, res.get_matches())
+        self.assertEqual(1, group.get_info()['fan_out']['timeouts'])
+
+        # too late to be used
+        release.set()
+        group._executor.shutdown(wait=True)
+        self.assertEqual(1, res.get_matches())
+        self.assertEqual(0, group.get_info()['fan_out']['late_responses'])
+
+    def test_errors(self):
+        ok = self._server(FakeResponse(2))
+        failing = self._server(error=OSError('down'))
+        group = MediaServerGroup([ok, failing])
+
+        self.assertEqual(2, group.search(title='foo').get_matches())
+        self.assertEqual(1, group.get_info()['fan_out']['errors'])
+
+        group = MediaServerGroup([self._server(error=ValueError('bad type')), self._server(error=OSError('down'))])
+        with self.assertRaises((ValueError, OSError)):
+            group.search(title='foo', type='bar')
+
+    def test_get_item(self):
+        unknown = MagicMock()
+        unknown.get_item.side_effect = OSError('no such object')
+        knowing = MagicMock()
+        knowing.get_item.return_value = 'item'
+        self.assertEqual('item', MediaServerGroup([unknown, knowing]).get_item('64$1'))
+        knowing.get_item.assert_called_once_with('64$1')
+
+        knowing.get_item.return_value = None
+        self.assertIsNone(MediaServerGroup([unknown, knowing]).get_item('64$1'))
+        with self.assertRaises(OSError):
+            MediaServerGroup([unknown]).get_item('64$1')
+
+    def test_info(self):
+        a = self._server(FakeResponse(3))
+        a.get_info.return_value = {'url': 'a'}
+        info = MediaServerGroup([a]).get_info()
+        self.assertEqual([{'url': 'a'}], info['media_servers'])
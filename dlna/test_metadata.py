@@ -0,0 +1,73 @@
+import unittest
+import xml.etree.ElementTree as ET
+
+from dlna.items import Item
+from dlna import metadata
+from dlna.metadata import MetadataCache, render, profile_of
+
+
+ITEM = '''<item xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" xmlns:dc="http://purl.org/dc/elements/1.1/"
+ xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" id="{id}">
+    <dc:title>Über &amp; &lt;unter&gt;</dc:title>
+    <upnp:artist>Die Ärzte</upnp:artist>
+    <upnp:class>object.item.audioItem.musicTrack</upnp:class>
+    <res duration="0:03:00" protocolInfo="http-get:*:audio/mpeg:*">http://127.0.0.1/MediaItems/{id}.mp3?a=1&amp;b=2</res>
+</item>'''
+
+
+def item(id='1'):
+    return Item(ET.fromstring(ITEM.format(id=id)))
+
+
+class TestMetadata(unittest.TestCase):
+
+    def test_render(self):
+        didl = ET.fromstring(render(item()))
+        i = Item(didl[0])
+
+        self.assertEqual('Über & <unter>', i.get_title())
+        self.assertEqual('Die Ärzte', i.get_artist())
+        self.assertIsNone(i.get_creator())
+        self.assertEqual('object.item.audioItem.musicTrack', i.get_class())
+        self.assertEqual('http://127.0.0.1/MediaItems/1.mp3?a=1&b=2', i.get_url())
+        self.assertEqual('1', i.get_id())
+
+    def test_render_ascii(self):
+        rendered = render(item(), metadata.PROFILE_ASCII)
+        rendered.encode('ascii')
+
+        i = Item(ET.fromstring(rendered)[0])
+        self.assertEqual('Ueber & <unter>', i.get_title())
+        self.assertEqual('Die Aerzte', i.get_artist())
+
+    def test_render_ascii_keeps_url(self):
+        i = Item(ET.fromstring(render(item('Müller'), metadata.PROFILE_ASCII))[0])
+        # the media server's url, not a transliterated one
+        self.assertEqual('http://127.0.0.1/MediaItems/Müller.mp3?a=1&b=2', i.get_url())
+        self.assertEqual('Die Aerzte', i.get_artist())
+
+    def test_profile_of(self):
+        self.assertEqual(metadata.PROFILE_DEFAULT, profile_of(True))
+        self.assertEqual(metadata.PROFILE_DEFAULT, profile_of(False))
+        self.assertEqual(metadata.PROFILE_ASCII, profile_of('ascii'))
+        with self.assertRaises(ValueError):
+            profile_of('latin1')
+
+    def test_cache(self):
+        c = MetadataCache(max_entries=2)
+
+        first = c.get(item('1'))
+        self.assertIs(first, c.get(item('1')))
+        self.assertIsNot(first, c.get(item('1'), metadata.PROFILE_ASCII))
+        c.get(item('2'))
+
+        info = c.get_info()
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(3, info['misses'])
+        self.assertEqual(1, info['evictions'])
+        self.assertEqual(2, info['entries'])
+
+        c.clear()
+        self.assertEqual(0, c.get_info()['entries'])
+        with self.assertRaises(ValueError):
+            MetadataCache(0)
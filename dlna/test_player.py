@@ -1,11 +1,15 @@
 import unittest
+import threading
 from unittest.mock import patch, call, MagicMock
+from concurrent.futures import ThreadPoolExecutor
 import xml.etree.ElementTree as ET
 from html import unescape
 
 from dlna.dlna_helper import XML_HEADER
-from dlna.player import Player, TRANSPORT_STATE
+from dlna.player import Player, TRANSPORT_STATE, parse_time, format_time
 from dlna.items import Item
+from dlna.upnp_control import ServiceClient
+from dlna.call_policy import CallPolicy
 
 
 class TestPlayer(unittest.TestCase):
@@ -109,6 +113,137 @@ class TestPlayer(unittest.TestCase):
             call.AVTransport.GetMediaInfo(InstanceID=0)
         ])
 
+    def test_parse_time(self):
+        self.assertEqual(192, parse_time('0:03:12'))
+        self.assertEqual(3600 + 0.5, parse_time('1:00:00.500'))
+        self.assertEqual(1.5, parse_time('+0:00:01.5'))
+        self.assertIsNone(parse_time('NOT_IMPLEMENTED'))
+        self.assertIsNone(parse_time(''))
+        self.assertIsNone(parse_time(None))
+        self.assertIsNone(parse_time('a:b:c'))
+
+    def test_format_time(self):
+        self.assertEqual('0:00:00', format_time(0))
+        self.assertEqual('1:02:03', format_time(3723.9))
+        self.assertEqual(3723, parse_time(format_time(3723.9)))
+
+    @patch("upnpclient.Device")
+    def test_resume_and_seek(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA)
+        p.resume()
+        p.seek(75.5)
+        device.AVTransport.Play.assert_called_once_with(InstanceID=0, Speed='1')
+        device.AVTransport.Seek.assert_called_once_with(InstanceID=0, Unit='REL_TIME', Target='0:01:15')
+
+    @patch("upnpclient.Device")
+    def test_get_state_times(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA)
+
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'PLAYING'}
+        device.AVTransport.GetPositionInfo.return_value = {'RelCount': '3', 'TrackDuration': '0:03:00', 'RelTime': '0:01:00'}
+        device.AVTransport.GetMediaInfo.return_value = {'CurrentURI': 'a-track', 'NextURI': ''}
+
+        res = p.get_state()
+        self.assertEqual(180, res.track_duration)
+        self.assertEqual(60, res.rel_time)
+
+    @patch("upnpclient.Device")
+    def test_get_state_change_aware(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA, change_aware=True)
+
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'PLAYING'}
+        device.AVTransport.GetPositionInfo.return_value = {'RelCount': '10', 'TrackURI': 'a-track'}
+        device.AVTransport.GetMediaInfo.return_value = {'CurrentURI': 'a-track', 'NextURI': 'b-track'}
+
+        self.assertEqual('b-track', p.get_state().next_url)
+        # same track still playing
+        device.AVTransport.GetPositionInfo.return_value = {'RelCount': '20', 'TrackURI': 'a-track'}
+        res = p.get_state()
+        self.assertEqual('a-track', res.current_url)
+        self.assertEqual('b-track', res.next_url)
+        self.assertEqual(20, res.progress_count)
+        self.assertEqual(1, device.AVTransport.GetMediaInfo.call_count)
+
+        # next track started
+        device.AVTransport.GetPositionInfo.return_value = {'RelCount': '1', 'TrackURI': 'b-track'}
+        device.AVTransport.GetMediaInfo.return_value = {'CurrentURI': 'b-track', 'NextURI': ''}
+        self.assertEqual('b-track', p.get_state().current_url)
+        self.assertEqual(2, device.AVTransport.GetMediaInfo.call_count)
+
+        # setting the next track changes the media info
+        p.set_next('c-track')
+        p.get_state()
+        self.assertEqual(3, device.AVTransport.GetMediaInfo.call_count)
+
+        # no longer playing
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'STOPPED'}
+        p.get_state()
+        self.assertEqual(4, device.AVTransport.GetMediaInfo.call_count)
+
+        stats = p.get_statistics()
+        self.assertEqual(5, stats['polls'])
+        self.assertEqual(1, stats['media_info_skipped'])
+        self.assertEqual(5 * 2 + 4 + 1, stats['soap_calls'])
+        self.assertIsNotNone(stats['avg_poll_seconds'])
+        self.assertIsNotNone(stats['soap_calls_per_minute'])
+
+    @patch("upnpclient.Device")
+    def test_get_state_concurrent(self, device):
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        p = Player(device, self.DEFAULT_WITH_METADATA, concurrent=True, executor=executor)
+        release = threading.Barrier(3, timeout=2)
+
+        def answer(value):
+            def respond(**kwargs):
+                # all three queries are in flight at the same time
+                release.wait()
+                return value
+            return respond
+
+        device.AVTransport.GetTransportInfo.side_effect = answer({'CurrentTransportState': 'PLAYING'})
+        device.AVTransport.GetPositionInfo.side_effect = answer({'RelCount': '3'})
+        device.AVTransport.GetMediaInfo.side_effect = answer({'CurrentURI': 'a-track', 'NextURI': 'b-track'})
+
+        res = p.get_state()
+        self.assertEqual(TRANSPORT_STATE.PLAYING, res.transport_state)
+        self.assertEqual('a-track', res.current_url)
+        self.assertEqual(3, res.progress_count)
+        self.assertEqual('b-track', res.next_url)
+
+    @patch("upnpclient.Device")
+    def test_get_state_shared_executor(self, device):
+        # no pool of its own
+        self.assertFalse(Player(device, self.DEFAULT_WITH_METADATA, concurrent=True)._concurrent)
+
+        executor = MagicMock()
+        f = MagicMock()
+        f.result.return_value = {'RelCount': '3'}
+        executor.submit.return_value = f
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'PLAYING'}
+        p = Player(device, self.DEFAULT_WITH_METADATA, concurrent=True, change_aware=True, executor=executor)
+        device.AVTransport.GetMediaInfo.return_value = {'CurrentURI': 'a-track', 'NextURI': ''}
+        self.assertEqual(3, p.get_state().progress_count)
+        # the first query runs on the calling thread
+        executor.submit.assert_called_once_with(p._invoke, 'GetPositionInfo', InstanceID=0)
+
+    @patch("upnpclient.Device")
+    def test_get_state_media_forgotten_meanwhile(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA, change_aware=True)
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'PLAYING'}
+        device.AVTransport.GetPositionInfo.return_value = {'RelCount': '10', 'TrackURI': 'a-track'}
+
+        def media_info(**kwargs):
+            # the next track is set while the poll is on its way
+            p.set_next('c-track')
+            return {'CurrentURI': 'a-track', 'NextURI': 'b-track'}
+        device.AVTransport.GetMediaInfo.side_effect = media_info
+
+        p.get_state()
+        self.assertIsNone(p._last_media)
+        p.get_state()
+        self.assertEqual(2, device.AVTransport.GetMediaInfo.call_count)
+
     @patch("upnpclient.Device")
     def test_play(self, device):
         p = Player(device, self.DEFAULT_WITH_METADATA)
@@ -124,6 +259,45 @@ class TestPlayer(unittest.TestCase):
             call.AVTransport.GetTransportInfo(InstanceID=0),
         ])
 
+    @patch("upnpclient.Device")
+    def test_play_waits_with_backoff(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA)
+
+        states = ['TRANSITIONING', 'TRANSITIONING', 'TRANSITIONING', 'STOPPED']
+        device.AVTransport.GetTransportInfo.side_effect = lambda **kwargs: {'CurrentTransportState': states.pop(0)}
+        with patch.object(p._transport_changed, 'wait_for', wraps=p._transport_changed.wait_for) as wait_for:
+            p.play('track-uri')
+            # 20, 40, 80ms
+            self.assertEqual([0.02, 0.04, 0.08], [round(c.args[1], 2) for c in wait_for.call_args_list])
+        device.AVTransport.Play.assert_called_with(InstanceID=0, Speed='1')
+
+        stats = p.get_statistics()
+        self.assertEqual(1, stats['accepts'])
+        self.assertEqual(0, stats['accept_timeouts'])
+        self.assertTrue(0.1 < stats['last_accept_seconds'] < 1)
+
+    @patch("upnpclient.Device")
+    def test_play_deadline(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA, accept_timeout=0.3)
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'TRANSITIONING'}
+
+        self.assertFalse(p._wait_for_transport_state([TRANSPORT_STATE.STOPPED]))
+        # backoff keeps the number of queries low
+        self.assertLessEqual(device.AVTransport.GetTransportInfo.call_count, 6)
+        self.assertEqual(1, p.get_statistics()['accept_timeouts'])
+
+    @patch("upnpclient.Device")
+    def test_play_woken_by_event(self, device):
+        p = Player(device, self.DEFAULT_WITH_METADATA, accept_timeout=5)
+        p.WAIT_INITIAL_DELAY = 5
+        device.AVTransport.GetTransportInfo.return_value = {'CurrentTransportState': 'TRANSITIONING'}
+
+        threading.Timer(0.1, p.on_transport_state, ['STOPPED']).start()
+        self.assertTrue(p._wait_for_transport_state([TRANSPORT_STATE.STOPPED]))
+        # the event answered, no further query
+        device.AVTransport.GetTransportInfo.assert_called_once()
+        self.assertLess(p.get_statistics()['last_accept_seconds'], 1)
+
     VALID_ITEMS = """
     <DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/" \n xmlns:dlna="urn:schemas-dlna-org:metadata-1-0/">
         <item id="64$1$1$12$2E$5" parentID="64$1$1$12$2E" restricted="1">
@@ -236,3 +410,100 @@ class TestPlayer(unittest.TestCase):
         self.assertTrue(i.get_class() in xml_content)
         self.assertTrue(i.get_title() in xml_content)
         self.assertTrue(i.get_url() in xml_content)
+
+    @patch("dlna.dlna_helper.soap_call")
+    @patch("upnpclient.Device")
+    def test_pooled(self, device, soap_call):
+        p = Player(device, self.DEFAULT_WITH_METADATA, pooled=True)
+
+        action = MagicMock()
+        action.url = 'http://renderer/ctrl'
+        action.argsdef_in = [('InstanceID', {}), ('Speed', {})]
+        device.AVTransport.find_action.return_value = action
+        device.AVTransport.service_type = 'urn:schemas-upnp-org:service:AVTransport:1'
+        soap_call.return_value = {}
+
+        p._call('Play', Speed='1', InstanceID=0)
+
+        device.AVTransport.find_action.assert_called_with('Play')
+        device.AVTransport.Play.assert_not_called()
+        soap_call.assert_called_with('http://renderer/ctrl', 'urn:schemas-upnp-org:service:AVTransport:1', 'Play',
+                                     [('InstanceID', 0), ('Speed', '1')])
+
+    @patch("dlna.dlna_helper.http_request")
+    def test_native_device(self, http_request):
+        device = MagicMock()
+        device.AVTransport = ServiceClient('urn:schemas-upnp-org:service:AVTransport:1', 'http://renderer/ctrl',
+                                           'http://renderer/event')
+        p = Player(device, self.DEFAULT_WITH_METADATA, pooled=True)
+
+        self.assertEqual('http://renderer/event', p.get_event_url())
+
+        p._call('Play', Speed='1', InstanceID=0)
+        method, url, headers, body, timeout = http_request.call_args[0]
+        self.assertEqual(('POST', 'http://renderer/ctrl'), (method, url))
+        self.assertEqual('"urn:schemas-upnp-org:service:AVTransport:1#Play"', headers['Soapaction'])
+        self.assertIn(b'<InstanceID>0</InstanceID><Speed>1</Speed>', body)
+
+    @patch("dlna.call_policy.sleep")
+    @patch("upnpclient.Device")
+    def test_policy(self, device, sleep):
+        p = Player(device, self.DEFAULT_WITH_METADATA, policy=CallPolicy(retries=1))
+        device.AVTransport.GetTransportInfo.side_effect = [TimeoutError(), {'CurrentTransportState': 'STOPPED'}]
+        device.AVTransport.Stop.side_effect = TimeoutError()
+
+        # queries are retried
+        self.assertEqual({'CurrentTransportState': 'STOPPED'}, p._call('GetTransportInfo', InstanceID=0))
+        # commands are not
+        with self.assertRaises(TimeoutError):
+            p.stop()
+        device.AVTransport.Stop.assert_called_once()
+
+    @patch("dlna.call_policy.sleep")
+    @patch("upnpclient.Device")
+    def test_policy_get_state_one_failure(self, device, sleep):
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        for concurrent in (False, True):
+            policy = CallPolicy(retries=0)
+            p = Player(device, self.DEFAULT_WITH_METADATA, concurrent=concurrent, policy=policy, executor=executor)
+            device.AVTransport.GetTransportInfo.side_effect = TimeoutError()
+            device.AVTransport.GetPositionInfo.side_effect = TimeoutError()
+            device.AVTransport.GetMediaInfo.side_effect = TimeoutError()
+
+            # a single poll of an unreachable renderer does not open the circuit
+            with self.assertRaises(TimeoutError):
+                p.get_state()
+            self.assertEqual(1, policy.get_info()['circuit']['failures'])
+            self.assertFalse(policy.is_open())
+
+    @patch("upnpclient.Device")
+    def test_set_next_metadata_cached(self, device):
+        p = Player(device, 'ascii')
+
+        root_el = ET.fromstring(XML_HEADER + unescape(self.VALID_ITEMS))
+        i = Item(root_el.find('r:item', {'r': 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/'}))
+        p.set_next('track-uri', item=i)
+        p.set_next('track-uri', item=i)
+
+        first = device.mock_calls[0][2]['NextURIMetaData']
+        second = device.mock_calls[1][2]['NextURIMetaData']
+        # rendered once, the same metadata is sent again
+        self.assertIs(first, second)
+        first.encode('ascii')
+
+    @patch("upnpclient.Device")
+    def test_render_metadata(self, device):
+        root_el = ET.fromstring(XML_HEADER + unescape(self.VALID_ITEMS))
+        i = Item(root_el.find('r:item', {'r': 'urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/'}))
+
+        p = Player(device, True)
+        metadata = p.render_metadata(i)
+        p.set_next('track-uri', metadata_raw=metadata)
+        self.assertIs(metadata, device.mock_calls[0][2]['NextURIMetaData'])
+        self.assertIsNone(Player(device, False).render_metadata(i))
+
+    @patch("upnpclient.Device")
+    def test_invalid_profile(self, device):
+        with self.assertRaises(ValueError):
+            Player(device, 'foo')
@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from dlna.search_cache import SearchCache, normalize, search_key
+
+
+class TestSearchCache(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual('', normalize(None))
+        self.assertEqual('queen', normalize('  Queen '))
+        self.assertEqual('die aerzte', normalize('Die  Ärzte'))
+        self.assertEqual(normalize('Die Aerzte'), normalize('die ärzte'))
+        self.assertEqual('strasse', normalize('Straße'))
+        self.assertEqual(search_key('Queen', None, 'audio', '200'), search_key(' queen', '', 'Audio', 200))
+        self.assertNotEqual(search_key('Queen', max_size=10), search_key('Queen', max_size=20))
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            SearchCache(max_entries=0)
+
+    @patch("dlna.search_cache.monotonic")
+    def test_hit_and_miss(self, monotonic):
+        monotonic.return_value = 100
+        loader = MagicMock(return_value='res')
+        c = SearchCache(ttl=10)
+
+        self.assertEqual('res', c.get('k', loader))
+        self.assertEqual('res', c.get('k', loader))
+        loader.assert_called_once()
+
+        info = c.get_info()
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(1, info['misses'])
+        self.assertEqual(1, info['size'])
+
+    @patch("dlna.search_cache.monotonic")
+    def test_lru_eviction(self, monotonic):
+        monotonic.return_value = 100
+        c = SearchCache(max_entries=2)
+
+        c.get('a', lambda: 'a')
+        c.get('b', lambda: 'b')
+        c.get('a', lambda: 'x')  # a is now most recently used
+        c.get('c', lambda: 'c')  # evicts b
+
+        self.assertEqual('a', c.get('a', lambda: 'y'))
+        self.assertEqual('new-b', c.get('b', lambda: 'new-b'))
+        self.assertEqual(2, c.get_info()['evictions'])
+
+    @patch("dlna.search_cache.monotonic")
+    def test_stale_while_revalidate(self, monotonic):
+        monotonic.return_value = 100
+        c = SearchCache(ttl=10, stale_ttl=100)
+        c.get('k', lambda: 'old')
+
+        # stale: old value is served, refresh runs in background
+        monotonic.return_value = 150
+        self.assertEqual('old', c.get('k', lambda: 'new'))
+        refresh = c._refreshing.get('k')
+        if refresh is not None:
+            refresh.join(1)
+        self.assertEqual('new', c.get('k', lambda: 'newer'))
+
+        info = c.get_info()
+        self.assertEqual(1, info['stale_hits'])
+        self.assertEqual(1, info['refreshes'])
+        self.assertEqual(1, info['hits'])
+
+    @patch("dlna.search_cache.monotonic")
+    def test_refresh_error_keeps_stale(self, monotonic):
+        monotonic.return_value = 100
+        c = SearchCache(ttl=10, stale_ttl=100)
+        c.get('k', lambda: 'old')
+
+        def failing():
+            raise OSError('media server down')
+
+        monotonic.return_value = 150
+        self.assertEqual('old', c.get('k', failing))
+        refresh = c._refreshing.get('k')
+        if refresh is not None:
+            refresh.join(1)
+        self.assertEqual(1, c.get_info()['refresh_errors'])
+        self.assertEqual('old', c.get('k', failing))
+
+    @patch("dlna.search_cache.monotonic")
+    def test_expired(self, monotonic):
+        monotonic.return_value = 100
+        c = SearchCache(ttl=10, stale_ttl=10)
+        c.get('k', lambda: 'old')
+
+        monotonic.return_value = 200
+        self.assertEqual('new', c.get('k', lambda: 'new'))
+        self.assertEqual(2, c.get_info()['misses'])
@@ -1,5 +1,12 @@
-from dlna.search_responses import SearchResponse
+from dlna.search_responses import SearchResponse, PagedSearchResponse, SampledSearchResponse, MergedSearchResponse
+from dlna.search_responses import _ResponseParser
+from dlna.shuffle_deck import ShuffleDeck
 import unittest
+from io import BytesIO
+from html import escape
+from unittest.mock import patch, call, MagicMock
+import threading
+import gc
 
 
 class TestSearchResponses(unittest.TestCase):
@@ -27,3 +34,216 @@ class TestSearchResponses(unittest.TestCase):
 
         some = res.random_item()
         self.assertEqual('Foo 1', some.get_title())
+
+    def test_from_items(self):
+        items = SearchResponse(self.EXAMPLE_RESPONSE).get_items()
+        self.assertEqual(3, len(items))
+
+        res = SearchResponse.from_items(items[:2], 42)
+        self.assertEqual(42, res.get_matches())
+        self.assertEqual(2, res.get_returned())
+        self.assertEqual(items[0].get_url(), res.first_item().get_url())
+        self.assertTrue(res.random_item().get_url() in [i.get_url() for i in items[:2]])
+
+        empty = SearchResponse.from_items([])
+        self.assertEqual(0, empty.get_matches())
+        self.assertIsNone(empty.first_item())
+        self.assertIsNone(empty.random_item())
+
+    def test_container_ids(self):
+        res = SearchResponse(self.EXAMPLE_RESPONSE)
+        self.assertEqual([], res.get_container_ids())
+
+    def test_paged(self):
+        first = SearchResponse(self.EXAMPLE_RESPONSE)
+        release = threading.Event()
+
+        def pages():
+            release.wait(1)
+            yield SearchResponse.from_items(first.get_items()[:1], 3)
+            raise OSError('connection lost')
+
+        res = PagedSearchResponse(first, pages())
+        # usable before the remaining pages arrived
+        self.assertEqual(3, res.get_matches())
+        self.assertEqual(3, res.get_returned())
+        self.assertEqual('Foo 1', res.first_item().get_title())
+        self.assertEqual('Foo 1', res.random_item().get_title())
+
+        release.set()
+        self.assertTrue(res.wait(1))
+        # the error ends loading, but keeps what was found
+        self.assertEqual(4, res.get_returned())
+        self.assertEqual(4, len(res.get_items()))
+
+    def test_paged_discarded_stops_loading(self):
+        first = SearchResponse(self.EXAMPLE_RESPONSE)
+        requested = []
+        release = threading.Event()
+
+        def pages():
+            for n in range(10):
+                requested.append(n)
+                release.wait(1)
+                yield SearchResponse.from_items(first.get_items()[:1], 13)
+
+        res = PagedSearchResponse(first, pages())
+        loader = res._loader
+        del res
+        gc.collect()
+        release.set()
+        loader.join(1)
+
+        self.assertFalse(loader.is_alive())
+        # the page requested meanwhile is the last one
+        self.assertEqual([0], requested)
+
+    @patch('dlna.shuffle_deck.random.randrange')
+    def test_paged_fetches_not_loaded(self, randrange):
+        items = SearchResponse(self.EXAMPLE_RESPONSE).get_items()
+        release = threading.Event()
+
+        def pages():
+            release.wait(1)
+            yield SearchResponse.from_items(items[1:], 3)
+        fetch = MagicMock(return_value=SearchResponse.from_items(items[2:], 3))
+
+        res = PagedSearchResponse(SearchResponse.from_items(items[:1], 3), pages(), fetch)
+        randrange.return_value = 2
+        self.assertEqual(items[2].get_url(), res.random_item().get_url())
+        fetch.assert_called_once_with(2)
+        randrange.assert_called_with(0, 3)
+
+        # gone meanwhile
+        fetch.return_value = SearchResponse.from_items([], 1)
+        randrange.return_value = 1
+        self.assertEqual(items[0].get_url(), res.random_item().get_url())
+
+        release.set()
+        self.assertTrue(res.wait(1))
+        # loaded now
+        self.assertEqual(items[1].get_url(), res.random_item(ShuffleDeck()).get_url())
+        self.assertEqual(2, fetch.call_count)
+
+    @patch('dlna.shuffle_deck.random.randrange')
+    def test_sampled(self, randrange):
+        items = SearchResponse(self.EXAMPLE_RESPONSE).get_items()
+        count_page = SearchResponse.from_items(items[:1], 3)
+        fetch = MagicMock()
+        fetch.return_value = SearchResponse.from_items(items[2:], 3)
+
+        res = SampledSearchResponse(count_page, fetch)
+        self.assertEqual(3, res.get_matches())
+        self.assertEqual(1, res.get_returned())
+        self.assertEqual(items[0].get_url(), res.first_item().get_url())
+
+        # the first item is known already
+        randrange.return_value = 0
+        self.assertEqual(items[0].get_url(), res.random_item().get_url())
+        fetch.assert_not_called()
+
+        randrange.return_value = 2
+        self.assertEqual(items[2].get_url(), res.random_item().get_url())
+        fetch.assert_called_with(2)
+        self.assertEqual(2, res.get_returned())
+
+        # library shrunk in the meantime
+        fetch.return_value = SearchResponse.from_items([], 1)
+        self.assertEqual(items[0].get_url(), res.random_item().get_url())
+
+    def test_merged(self):
+        items = SearchResponse(self.EXAMPLE_RESPONSE).get_items()
+        duplicate = SearchResponse(self.EXAMPLE_RESPONSE).get_items()[0]
+        sampled = MagicMock(spec=SampledSearchResponse)
+        sampled.get_matches.return_value = 0
+
+        res = MergedSearchResponse([SearchResponse.from_items(items[:2]), SearchResponse.from_items([duplicate]), sampled])
+        self.assertEqual(3, res.get_matches())
+        # duplicates are merged
+        self.assertEqual(2, res.get_returned())
+        self.assertEqual(items[0].get_url(), res.first_item().get_url())
+        self.assertTrue(res.random_item().get_url() in [i.get_url() for i in items[:2]])
+        sampled.random_item.assert_not_called()
+
+        # sampled matches follow the merged items
+        sampled.get_matches.return_value = 1000
+        sampled.item_at.return_value = 'sampled'
+        deck = MagicMock()
+        deck.next.return_value = 502
+        self.assertEqual('sampled', res.random_item(deck))
+        deck.resize.assert_called_with(1002)
+        sampled.item_at.assert_called_with(500)
+        deck.next.return_value = 1
+        self.assertEqual(items[1].get_url(), res.random_item(deck).get_url())
+
+        empty = MergedSearchResponse()
+        self.assertEqual(0, empty.get_matches())
+        self.assertIsNone(empty.first_item())
+        self.assertIsNone(empty.random_item())
+
+    def test_merged_takes_new_items_only(self):
+        items = SearchResponse(self.EXAMPLE_RESPONSE).get_items()
+        growing = MagicMock()
+        growing.get_items_from.side_effect = [items[:1], [], items[1:]]
+
+        res = MergedSearchResponse([growing])
+        deck = ShuffleDeck()
+        self.assertEqual(items[0].get_url(), res.random_item(deck).get_url())
+        self.assertIsNotNone(res.random_item(deck))
+        # a later page arrived
+        self.assertEqual(3, len(res.get_items()))
+        growing.get_items_from.assert_has_calls([call(0), call(1), call(1)])
+        growing.get_items_from.side_effect = None
+        growing.get_items_from.return_value = []
+        res.random_item(deck)
+        growing.get_items_from.assert_called_with(3)
+        self.assertEqual(3, deck.get_size())
+
+    def test_from_stream(self):
+        stream = BytesIO(self.EXAMPLE_RESPONSE.encode('utf-8'))
+        stream.close = MagicMock()
+
+        # tiny chunks split tags, entities and items
+        res = SearchResponse.from_stream(stream, chunk_size=7)
+        stream.close.assert_called()
+        self.assertEqual(3, res.get_matches())
+        self.assertEqual(3, res.get_returned())
+        self.assertEqual(['http://127.0.0.1/MediaItems/25091.mp4', 'http://127.0.0.1/MediaItems/25092.mp4',
+                          'http://127.0.0.1/MediaItems/25093.mp4'], [i.get_url() for i in res.get_items()])
+        self.assertEqual('0:00:16.166', res.first_item().get_res().get('duration'))
+
+    def test_stream_keeps_no_tree(self):
+        parser = _ResponseParser()
+        parser.feed(self.EXAMPLE_RESPONSE)
+        parser.close()
+        # complete items are detached from the DIDL-Lite root
+        self.assertEqual(0, len(parser._didl_root))
+        self.assertEqual(3, len(parser.items))
+
+    def test_browse_containers(self):
+        didl = ('<DIDL-Lite xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">'
+                '<container id="1$2"><container id="nested"/></container><container/><item id="3"/></DIDL-Lite>')
+        res = SearchResponse(f'<r><Result>{escape(didl)}</Result><NumberReturned>3</NumberReturned>'
+                             '<TotalMatches>3</TotalMatches></r>')
+        self.assertEqual(['1$2'], res.get_container_ids())
+        self.assertEqual(1, len(res.get_items()))
+
+    def test_empty_and_invalid(self):
+        res = SearchResponse('<r><Result></Result><NumberReturned>0</NumberReturned><TotalMatches>0</TotalMatches></r>')
+        self.assertEqual(0, res.get_matches())
+        self.assertIsNone(res.first_item())
+
+        with self.assertRaises(ValueError):
+            SearchResponse('<r><Result></Result></r>')
+
+    def test_random_item_no_repeats(self):
+        res = SearchResponse(self.EXAMPLE_RESPONSE)
+
+        urls = [res.random_item().get_url() for _ in range(3)]
+        self.assertEqual(3, len(set(urls)))
+
+        # a separate deck has its own order
+        deck = ShuffleDeck()
+        urls = [res.random_item(deck).get_url() for _ in range(3)]
+        self.assertEqual(3, len(set(urls)))
+        self.assertEqual(3, deck.get_size())
@@ -0,0 +1,57 @@
+import unittest
+import random
+
+from dlna.shuffle_deck import ShuffleDeck
+
+
+class TestShuffleDeck(unittest.TestCase):
+
+    def test_empty(self):
+        d = ShuffleDeck()
+        self.assertIsNone(d.next())
+        self.assertEqual(0, d.get_remaining())
+
+    def test_no_repeats(self):
+        d = ShuffleDeck(50, random.Random(4711))
+        drawn = [d.next() for _ in range(50)]
+        self.assertEqual(list(range(50)), sorted(drawn))
+        self.assertEqual(0, d.get_remaining())
+        self.assertEqual(0, d.get_rounds())
+        # only positions still to be drawn keep swaps
+        self.assertEqual({}, d._swaps)
+
+    def test_reshuffle_avoids_last(self):
+        for seed in range(100):
+            d = ShuffleDeck(3, random.Random(seed))
+            first_round = [d.next() for _ in range(3)]
+            second_round = [d.next() for _ in range(3)]
+            self.assertNotEqual(first_round[-1], second_round[0])
+            self.assertEqual([0, 1, 2], sorted(second_round))
+            self.assertEqual(1, d.get_rounds())
+
+    def test_single(self):
+        d = ShuffleDeck(1)
+        self.assertEqual([0, 0, 0], [d.next() for _ in range(3)])
+
+    def test_grow(self):
+        d = ShuffleDeck(3, random.Random(1))
+        drawn = [d.next() for _ in range(2)]
+        d.resize(6)
+        self.assertEqual(4, d.get_remaining())
+        drawn += [d.next() for _ in range(4)]
+        self.assertEqual(list(range(6)), sorted(drawn))
+
+    def test_shrink(self):
+        d = ShuffleDeck(6, random.Random(1))
+        for _ in range(4):
+            d.next()
+        d.resize(2)
+        self.assertEqual(2, d.get_remaining())
+        self.assertEqual([0, 1], sorted([d.next(), d.next()]))
+
+    def test_huge(self):
+        # sampled pools, only drawn positions cost memory
+        d = ShuffleDeck(10**9, random.Random(2))
+        drawn = {d.next() for _ in range(1000)}
+        self.assertEqual(1000, len(drawn))
+        self.assertLessEqual(len(d._swaps), 1000)
@@ -0,0 +1,184 @@
+import unittest
+from http.client import HTTPException
+
+import upnpclient
+
+from dlna import upnp_control
+from dlna.dlna_helper import SOAPError
+from dlna.player import Player, TRANSPORT_STATE
+from dlna.simulated_renderer import SimulatedRenderer, RendererFleet
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestSimulatedRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+
+    def _renderer(self, **options) -> SimulatedRenderer:
+        return SimulatedRenderer('Test', clock=self.clock, **options)
+
+    def _transport_state(self, r: SimulatedRenderer) -> str:
+        return r.handle('GetTransportInfo', {})['CurrentTransportState']
+
+    def _play(self, r: SimulatedRenderer, uri: str = 'track-1'):
+        r.handle('SetAVTransportURI', {'CurrentURI': uri, 'CurrentURIMetaData': None})
+        r.handle('Play', {})
+
+    def test_play_until_end(self):
+        r = self._renderer(track_duration=10)
+        self.assertEqual('NO_MEDIA_PRESENT', self._transport_state(r))
+        self._play(r)
+
+        self.clock.now += 4
+        position = r.handle('GetPositionInfo', {})
+        self.assertEqual('PLAYING', self._transport_state(r))
+        self.assertEqual('0:00:04', position['RelTime'])
+        self.assertEqual('0:00:10', position['TrackDuration'])
+        self.assertEqual('track-1', position['TrackURI'])
+
+        self.clock.now += 6
+        self.assertEqual('STOPPED', self._transport_state(r))
+        # how the controller tells the natural end
+        self.assertEqual('0', r.handle('GetPositionInfo', {})['RelCount'])
+
+    def test_gapless_next(self):
+        r = self._renderer(track_duration=10)
+        self._play(r)
+        r.handle('SetNextAVTransportURI', {'NextURI': 'track-2', 'NextURIMetaData': None})
+        self.assertEqual('track-2', r.handle('GetMediaInfo', {})['NextURI'])
+
+        self.clock.now += 13
+        media = r.handle('GetMediaInfo', {})
+        self.assertEqual('PLAYING', self._transport_state(r))
+        self.assertEqual('track-2', media['CurrentURI'])
+        self.assertIsNone(media['NextURI'])
+        self.assertEqual('0:00:03', r.handle('GetPositionInfo', {})['RelTime'])
+        self.assertEqual(2, r.get_info()['tracks'])
+
+    def test_gap(self):
+        r = self._renderer(track_duration=10, gap=2)
+        self._play(r)
+        r.handle('SetNextAVTransportURI', {'NextURI': 'track-2', 'NextURIMetaData': None})
+
+        self.clock.now += 11
+        self.assertEqual('TRANSITIONING', self._transport_state(r))
+        self.clock.now += 2
+        self.assertEqual('PLAYING', self._transport_state(r))
+        self.assertEqual('0:00:01', r.handle('GetPositionInfo', {})['RelTime'])
+
+    def test_accept_delay(self):
+        r = self._renderer(accept_delay=1)
+        r.handle('SetAVTransportURI', {'CurrentURI': 'track-1', 'CurrentURIMetaData': None})
+        self.assertEqual('TRANSITIONING', self._transport_state(r))
+        # played once accepted
+        r.handle('Play', {})
+        self.clock.now += 1.5
+        self.assertEqual('PLAYING', self._transport_state(r))
+        self.assertEqual('0:00:00', r.handle('GetPositionInfo', {})['RelTime'])
+
+    def test_pause_seek_stop(self):
+        r = self._renderer(track_duration=100)
+        self._play(r)
+        self.clock.now += 5
+        r.handle('Pause', {})
+        self.clock.now += 50
+        self.assertEqual('PAUSED_PLAYBACK', self._transport_state(r))
+        self.assertEqual('0:00:05', r.handle('GetPositionInfo', {})['RelTime'])
+
+        r.handle('Seek', {'Unit': 'REL_TIME', 'Target': '0:01:00'})
+        r.handle('Play', {})
+        self.clock.now += 2
+        self.assertEqual('0:01:02', r.handle('GetPositionInfo', {})['RelTime'])
+
+        r.handle('Stop', {})
+        self.assertEqual('STOPPED', self._transport_state(r))
+        self.assertEqual('0:00:00', r.handle('GetPositionInfo', {})['RelTime'])
+
+    def test_faults(self):
+        r = self._renderer(supports_next=False)
+        with self.assertRaises(SOAPError) as e:
+            r.handle('Play', {})
+        self.assertEqual(701, e.exception.code)
+        with self.assertRaises(SOAPError) as e:
+            r.handle('SetNextAVTransportURI', {'NextURI': 'track-2'})
+        self.assertEqual(401, e.exception.code)
+
+        r = self._renderer(error_rate=1)
+        with self.assertRaises(SOAPError) as e:
+            r.handle('GetTransportInfo', {})
+        self.assertEqual(501, e.exception.code)
+        self.assertEqual(1, r.get_info()['faults'])
+
+    def test_track_duration_per_uri(self):
+        r = self._renderer(track_duration=lambda uri: 60 if uri == 'long' else 5)
+        self._play(r, 'long')
+        self.assertEqual('0:01:00', r.handle('GetPositionInfo', {})['TrackDuration'])
+
+
+class TestRendererFleet(unittest.TestCase):
+
+    def test_player(self):
+        with RendererFleet(3, track_duration=60) as fleet:
+            self.assertEqual(3, len(set(fleet.get_locations())))
+            device = upnp_control.Device(fleet.get_locations()[1])
+            self.assertEqual('Simulated 1', device.friendly_name)
+            self.assertIn('audio/flac', device.ConnectionManager.GetProtocolInfo()['Sink'])
+
+            player = Player(device, False)
+            player.play('http://media/track-1')
+            player.set_next('http://media/track-2')
+            state = player.get_state()
+            self.assertEqual(TRANSPORT_STATE.PLAYING, state.transport_state)
+            self.assertEqual('http://media/track-1', state.current_url)
+            self.assertEqual('http://media/track-2', state.next_url)
+            self.assertEqual(60, state.track_duration)
+
+            info = fleet.get_info()
+            self.assertEqual(3, info['renderers'])
+            self.assertEqual(1, info['tracks'])
+            self.assertIsNotNone(fleet.get_renderers()[1].get_last_play())
+
+    def test_upnpclient(self):
+        with RendererFleet(1) as fleet:
+            device = upnpclient.Device(fleet.get_locations()[0])
+            device.AVTransport.Stop(InstanceID=0)
+            self.assertEqual('NO_MEDIA_PRESENT',
+                             device.AVTransport.GetTransportInfo(InstanceID=0)['CurrentTransportState'])
+
+    def test_errors_over_http(self):
+        with RendererFleet(2, seed=1, error_rate=1) as fleet:
+            device = upnp_control.Device(fleet.get_locations()[0])
+            with self.assertRaises(SOAPError) as e:
+                device.AVTransport.GetTransportInfo(InstanceID=0)
+            self.assertEqual(501, e.exception.code)
+
+    def test_dropped(self):
+        with RendererFleet(1, drop_rate=1) as fleet:
+            device = upnp_control.Device(fleet.get_locations()[0])
+            with self.assertRaises((OSError, HTTPException)):
+                device.AVTransport.GetTransportInfo(InstanceID=0)
+            self.assertTrue(fleet.get_info()['drops'] >= 1)
+
+    def test_latency(self):
+        with RendererFleet(1, latency=0.05, jitter=0.05) as fleet:
+            renderer = fleet.get_renderers()[0]
+            delays = [renderer.delay() for _ in range(20)]
+            self.assertTrue(all(0.05 <= d <= 0.1 for d in delays))
+
+    def test_many(self):
+        with RendererFleet(200) as fleet:
+            devices = [upnp_control.Device(location) for location in fleet.get_locations()[::20]]
+            self.assertEqual(10, len({d.udn for d in devices}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from dlna.ssdp import parse_response
+
+
+class TestSsdp(unittest.TestCase):
+
+    def test_parse_response(self):
+        headers = parse_response(b'HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=1800\r\n'
+                                 b'Location: http://192.168.0.5:49152/description.xml\r\n'
+                                 b'ST: upnp:rootdevice\r\nCONFIGID.UPNP.ORG: 7\r\n\r\n')
+        self.assertEqual('http://192.168.0.5:49152/description.xml', headers['LOCATION'])
+        self.assertEqual('7', headers['CONFIGID.UPNP.ORG'])
+        self.assertEqual('upnp:rootdevice', headers['ST'])
+
+    def test_parse_response_without_config_id(self):
+        headers = parse_response(b'HTTP/1.1 200 OK\r\nLOCATION: http://x/d.xml\r\n\r\n')
+        self.assertIsNone(headers.get('CONFIGID.UPNP.ORG'))
+
+
+if __name__ == '__main__':
+    unittest.main()
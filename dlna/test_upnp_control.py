@@ -0,0 +1,210 @@
+import unittest
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+from dlna import upnp_control
+from dlna.dlna_helper import SOAPError
+from dlna.upnp_control import Device, ServiceClient, ActionTemplate, extract
+
+AVT = 'urn:schemas-upnp-org:service:AVTransport:1'
+
+DESCRIPTION = '''<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:Vendor:1</deviceType>
+    <friendlyName>Living Room</friendlyName>
+    <UDN>uuid:1234</UDN>
+    <deviceList><device>
+      <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+      <serviceList>
+        <service>
+          <serviceType>urn:schemas-upnp-org:service:RenderingControl:1</serviceType>
+          <controlURL>/rc/control</controlURL>
+        </service>
+        <service>
+          <serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType>
+          <controlURL>/avt/control</controlURL>
+          <eventSubURL>/avt/event</eventSubURL>
+        </service>
+        <service>
+          <serviceType>urn:schemas-upnp-org:service:ConnectionManager:1</serviceType>
+          <controlURL>cm/control</controlURL>
+        </service>
+      </serviceList>
+    </device></deviceList>
+  </device>
+</root>'''
+
+TRANSPORT_INFO = ('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body>'
+                  '<u:GetTransportInfoResponse xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">'
+                  '<CurrentTransportState>PLAYING</CurrentTransportState>'
+                  '<CurrentTransportStatus>OK</CurrentTransportStatus>'
+                  '<CurrentSpeed>1</CurrentSpeed>'
+                  '</u:GetTransportInfoResponse></s:Body></s:Envelope>')
+
+FAULT = ('<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><s:Fault>'
+         '<detail><UPnPError xmlns="urn:schemas-upnp-org:control-1-0">'
+         '<errorCode>701</errorCode><errorDescription>Transition not available</errorDescription>'
+         '</UPnPError></detail></s:Fault></s:Body></s:Envelope>')
+
+
+class RendererHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond(200, DESCRIPTION.encode())
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers['Soapaction'], body))
+        if b'Pause' in body:
+            self._respond(500, FAULT.encode())
+        elif b'GetTransportInfo' in body:
+            self._respond(200, TRANSPORT_INFO.encode())
+        else:
+            self._respond(200, b'<?xml version="1.0"?><s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/">'
+                               b'<s:Body><u:PlayResponse xmlns:u="x"/></s:Body></s:Envelope>')
+
+    def _respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestExtract(unittest.TestCase):
+
+    def test_extract(self):
+        self.assertEqual({'CurrentTransportState': 'PLAYING', 'CurrentTransportStatus': 'OK', 'CurrentSpeed': '1'},
+                         extract(TRANSPORT_INFO.encode(), ('CurrentTransportState', 'CurrentTransportStatus',
+                                                           'CurrentSpeed')))
+
+    def test_extract_escaped(self):
+        content = ('<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><u:R xmlns:u="x">'
+                   '<TrackURI>http://x/a?b=1&amp;c=&quot;2&quot;</TrackURI>'
+                   '<TrackMetaData>&lt;DIDL-Lite&gt;&lt;/DIDL-Lite&gt;</TrackMetaData>'
+                   '</u:R></s:Body></s:Envelope>').encode()
+        self.assertEqual({'TrackURI': 'http://x/a?b=1&c="2"', 'TrackMetaData': '<DIDL-Lite></DIDL-Lite>'},
+                         extract(content, ('TrackURI', 'TrackMetaData')))
+
+    @patch('dlna.dlna_helper.parse_soap_response')
+    def test_extract_falls_back(self, parse):
+        parse.return_value = {'NextURI': ''}
+        content = ('<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><u:R xmlns:u="x">'
+                   '<NextURI/></u:R></s:Body></s:Envelope>').encode()
+
+        self.assertEqual({'NextURI': ''}, extract(content, ('NextURI',)))
+        parse.assert_called_once_with(content)
+
+    def test_extract_fallback_parses(self):
+        content = ('<s:Envelope xmlns:s="http://schemas.xmlsoap.org/soap/envelope/"><s:Body><u:R xmlns:u="x">'
+                   '<Source>&#228;</Source><Sink/></u:R></s:Body></s:Envelope>').encode()
+        self.assertEqual({'Source': 'ä', 'Sink': ''}, extract(content, ('Source', 'Sink')))
+
+
+class TestActionTemplate(unittest.TestCase):
+
+    def test_body(self):
+        t = ActionTemplate(AVT, 'SetAVTransportURI', ('InstanceID', 'CurrentURI', 'CurrentURIMetaData'), ())
+        body = t.body({'CurrentURIMetaData': None, 'CurrentURI': 'http://x/a&b', 'InstanceID': 0})
+
+        self.assertIn(b'<u:SetAVTransportURI xmlns:u="urn:schemas-upnp-org:service:AVTransport:1">'
+                      b'<InstanceID>0</InstanceID><CurrentURI>http://x/a&amp;b</CurrentURI>'
+                      b'<CurrentURIMetaData></CurrentURIMetaData></u:SetAVTransportURI>', body)
+        self.assertEqual('"urn:schemas-upnp-org:service:AVTransport:1#SetAVTransportURI"', t.headers['Soapaction'])
+
+    def test_body_missing_argument(self):
+        t = ActionTemplate(AVT, 'Play', ('InstanceID', 'Speed'), ())
+        with self.assertRaises(KeyError):
+            t.body({'InstanceID': 0})
+
+
+class TestDevice(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RendererHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_description(self):
+        d = Device(self.base + '/description.xml')
+
+        self.assertEqual('Living Room', d.friendly_name)
+        self.assertEqual('uuid:1234', d.udn)
+        self.assertEqual(AVT, d.AVTransport.service_type)
+        self.assertEqual(self.base + '/avt/control', d.AVTransport.get_control_url())
+        self.assertEqual(self.base + '/avt/event', d.AVTransport.get_event_url())
+        self.assertEqual(self.base + '/cm/control', d.ConnectionManager.get_control_url())
+        self.assertIsNone(d.ConnectionManager.get_event_url())
+        self.assertEqual(['AVTransport', 'ConnectionManager'], list(d.services))
+
+    def test_url_base(self):
+        description = DESCRIPTION.replace('<device>', '<URLBase>http://other:1234/base/</URLBase><device>', 1)
+        d = Device('http://renderer/description.xml', description.encode())
+
+        self.assertEqual('http://other:1234/avt/control', d.AVTransport.get_control_url())
+        self.assertEqual('http://other:1234/base/cm/control', d.ConnectionManager.get_control_url())
+
+    def test_update(self):
+        d = Device('http://renderer/description.xml', DESCRIPTION.encode())
+        former = d.AVTransport
+
+        d.update(DESCRIPTION.replace('/avt/control', '/avt/control2').encode())
+        self.assertIsNot(former, d.AVTransport)
+        self.assertEqual('http://renderer/avt/control2', d.AVTransport.get_control_url())
+
+        # an invalid description keeps the former services
+        with self.assertRaises(ValueError):
+            d.update(b'<root xmlns="urn:schemas-upnp-org:device-1-0"><device/></root>')
+        self.assertEqual('http://renderer/avt/control2', d.AVTransport.get_control_url())
+
+    def test_no_av_transport(self):
+        with self.assertRaises(ValueError):
+            Device('http://renderer/description.xml', b'<root xmlns="urn:schemas-upnp-org:device-1-0">'
+                                                      b'<device><friendlyName>x</friendlyName></device></root>')
+
+    def test_calls(self):
+        d = Device(self.base + '/description.xml')
+
+        self.assertEqual({}, d.AVTransport.Play(InstanceID=0, Speed='1'))
+        self.assertEqual('PLAYING', d.AVTransport.GetTransportInfo(InstanceID=0)['CurrentTransportState'])
+        self.assertEqual('PLAYING', d.AVTransport.call('GetTransportInfo', InstanceID=0)['CurrentTransportState'])
+
+        path, soapaction, body = self.server.requests[0]
+        self.assertEqual('/avt/control', path)
+        self.assertEqual(f'"{AVT}#Play"', soapaction)
+        self.assertIn(b'<InstanceID>0</InstanceID><Speed>1</Speed>', body)
+
+    def test_fault(self):
+        d = Device(self.base + '/description.xml')
+
+        with self.assertRaises(SOAPError) as cm:
+            d.AVTransport.Pause(InstanceID=0)
+        self.assertEqual(701, cm.exception.code)
+
+    def test_unknown_action(self):
+        s = ServiceClient(AVT, 'http://renderer/ctrl')
+
+        with self.assertRaises(AttributeError):
+            s.Record(InstanceID=0)
+        with self.assertRaises(ValueError):
+            s.call('Record', InstanceID=0)
+
+    def test_known_actions(self):
+        s = ServiceClient(AVT, 'http://renderer/ctrl')
+        for action in upnp_control.ACTIONS['AVTransport']:
+            self.assertTrue(callable(getattr(s, action)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import logging
+import xml.etree.ElementTree as ET
+from urllib.error import HTTPError
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape, unescape
+
+from dlna import dlna_helper
+
+# http://upnp.org/specs/av/UPnP-av-AVTransport-v1-Service.pdf
+# http://upnp.org/specs/av/UPnP-av-ConnectionManager-v1-Service.pdf
+
+logger = logging.getLogger(__file__)
+
+NAMESPACE_DEVICE = 'urn:schemas-upnp-org:device-1-0'
+
+AV_TRANSPORT = 'AVTransport'
+CONNECTION_MANAGER = 'ConnectionManager'
+
+# actions without side effects, safe to retry
+QUERIES = frozenset(['GetTransportInfo', 'GetPositionInfo', 'GetMediaInfo', 'GetProtocolInfo'])
+
+# action -> (in arguments in the order of the service description, out arguments)
+ACTIONS = {
+    AV_TRANSPORT: {
+        'SetAVTransportURI': (('InstanceID', 'CurrentURI', 'CurrentURIMetaData'), ()),
+        'SetNextAVTransportURI': (('InstanceID', 'NextURI', 'NextURIMetaData'), ()),
+        'Play': (('InstanceID', 'Speed'), ()),
+        'Pause': (('InstanceID',), ()),
+        'Stop': (('InstanceID',), ()),
+        'Seek': (('InstanceID', 'Unit', 'Target'), ()),
+        'GetTransportInfo': (('InstanceID',),
+                             ('CurrentTransportState', 'CurrentTransportStatus', 'CurrentSpeed')),
+        'GetPositionInfo': (('InstanceID',),
+                            ('Track', 'TrackDuration', 'TrackMetaData', 'TrackURI',
+                             'RelTime', 'AbsTime', 'RelCount', 'AbsCount')),
+        'GetMediaInfo': (('InstanceID',),
+                         ('NrTracks', 'MediaDuration', 'CurrentURI', 'CurrentURIMetaData', 'NextURI',
+                          'NextURIMetaData', 'PlayMedium', 'RecordMedium', 'WriteStatus')),
+    },
+    CONNECTION_MANAGER: {
+        'GetProtocolInfo': ((), ('Source', 'Sink')),
+    },
+}
+
+_ENTITIES = {'&quot;': '"', '&apos;': "'"}
+
+
+def extract(content: bytes, names: tuple[str]) -> dict:
+    '''picks the out arguments from a SOAP response without building a tree.
+    Falls back to parsing for anything unusual like prefixed, empty-tag or character reference values.'''
+    text = content.decode('utf-8')
+    if '&#' in text or '<![CDATA[' in text:
+        return dlna_helper.parse_soap_response(content)
+    res = {}
+    position = 0
+    for name in names:
+        start_tag = f"<{name}>"
+        start = text.find(start_tag, position)
+        if start < 0:
+            return dlna_helper.parse_soap_response(content)
+        start += len(start_tag)
+        end = text.find(f"</{name}>", start)
+        if end < 0:
+            return dlna_helper.parse_soap_response(content)
+        res[name] = unescape(text[start:end], _ENTITIES)
+        # out arguments come in the order of the service description
+        position = end
+    return res
+
+
+class ActionTemplate():
+    '''SOAP request of an action prepared once: only the argument values are filled in per call'''
+
+    def __init__(self, service_type: str, name: str, arguments_in: tuple[str], arguments_out: tuple[str]):
+        self.name = name
+        self.arguments_in = arguments_in
+        self.arguments_out = arguments_out
+        envelope = dlna_helper.SOAP_ENVELOPE.format(action=name, service_type=service_type, arguments='\0')
+        prefix, suffix = envelope.split('\0')
+        self._prefix = prefix.encode('utf-8')
+        self._suffix = suffix.encode('utf-8')
+        # (start tag, end tag) per argument
+        self._tags = tuple((f"<{a}>", f"</{a}>") for a in arguments_in)
+        self.headers = {"Content-type": 'text/xml; charset="utf-8"',
+                        "Soapaction": f'"{service_type}#{name}"',
+                        "Connection": "keep-alive",
+                        "USER-AGENT": "dlna_mediacontroller/0.1 UPnP/1.0"}
+
+    def body(self, kwargs: dict) -> bytes:
+        parts = []
+        for (start_tag, end_tag), name in zip(self._tags, self.arguments_in):
+            value = kwargs[name]
+            parts.append(start_tag)
+            if value is not None:
+                parts.append(escape(str(value)))
+            parts.append(end_tag)
+        return self._prefix + ''.join(parts).encode('utf-8') + self._suffix
+
+
+class ServiceClient():
+    '''Client for the known actions of a single service.
+    Actions are available as methods, e.g. Play(InstanceID=0, Speed='1'), like on an upnpclient service.
+    '''
+
+    def __init__(self, service_type: str, control_url: str, event_url: str = None, actions: dict = None,
+                 timeout: tuple[float, float] = None):
+        self.service_type = service_type
+        self._control_url = control_url
+        self._event_url = event_url
+        # (connect, read) seconds, the pool's default if None
+        self._timeout = timeout
+        if actions is None:
+            actions = ACTIONS[service_type.split(':')[-2]]
+        self._templates = {name: ActionTemplate(service_type, name, arguments_in, arguments_out)
+                           for name, (arguments_in, arguments_out) in actions.items()}
+
+    def __getattr__(self, name: str):
+        template = self.__dict__.get('_templates', {}).get(name)
+        if template is None:
+            raise AttributeError(name)
+        return lambda **kwargs: self._invoke(template, kwargs)
+
+    def get_control_url(self) -> str:
+        return self._control_url
+
+    def get_event_url(self) -> str:
+        return self._event_url
+
+    def call(self, action: str, **kwargs) -> dict:
+        template = self._templates.get(action)
+        if template is None:
+            raise ValueError(f"Unknown action {action}")
+        return self._invoke(template, kwargs)
+
+    def _invoke(self, template: ActionTemplate, kwargs: dict) -> dict:
+        try:
+            response = dlna_helper.http_request('POST', self._control_url, template.headers, template.body(kwargs),
+                                                self._timeout)
+        except HTTPError as e:
+            raise dlna_helper.soap_error(e) from e
+        if not template.arguments_out:
+            return {}
+        return extract(response.read(), template.arguments_out)
+
+
+class Device():
+    '''The control side of a renderer: one fetch of the device description, no SCPDs.
+    Offers the AVTransport and ConnectionManager services as attributes like upnpclient does.
+    '''
+
+    AVTransport: ServiceClient = None
+    ConnectionManager: ServiceClient = None
+    services: dict[str, ServiceClient] = {}
+
+    def __init__(self, location: str, description: bytes = None, timeout: tuple[float, float] = None):
+        self.location = location
+        self._timeout = timeout
+        if description is None:
+            description = dlna_helper.http_request('GET', location, {"Connection": "keep-alive"}, timeout=timeout).read()
+        self.update(description)
+
+    def update(self, description: bytes):
+        '''takes the services from a (changed) description, calls in progress finish on the former ones'''
+        location = self.location
+        root = ET.fromstring(description)
+        ns = {'d': NAMESPACE_DEVICE}
+        url_base = root.findtext('d:URLBase', None, ns) or location
+        device = root.find('d:device', ns)
+        if device is None:
+            raise ValueError(f"no device in description of {location}")
+        services: dict[str, ServiceClient] = {}
+        # services may be found on embedded devices too, e.g. a MediaRenderer within a vendor device
+        for service in root.iter(f"{{{NAMESPACE_DEVICE}}}service"):
+            service_type = service.findtext('d:serviceType', '', ns)
+            name = service_type.split(':')[-2] if service_type.count(':') >= 2 else None
+            if name not in ACTIONS or name in services:
+                continue
+            event_url = service.findtext('d:eventSubURL', None, ns)
+            services[name] = ServiceClient(
+                service_type,
+                urljoin(url_base, service.findtext('d:controlURL', '', ns)),
+                urljoin(url_base, event_url) if event_url else None,
+                timeout=self._timeout)
+        if AV_TRANSPORT not in services:
+            raise ValueError(f"{location} has no AVTransport service")
+        self.friendly_name = device.findtext('d:friendlyName', None, ns)
+        self.udn = device.findtext('d:UDN', None, ns)
+        self.services = services
+        self.AVTransport = services.get(AV_TRANSPORT)
+        self.ConnectionManager = services.get(CONNECTION_MANAGER)
+        logger.debug(f"created control device {self.friendly_name} with {', '.join(self.services)}")
+
+    def __repr__(self):
+        return f"Device(location={self.location!r}, friendly_name={self.friendly_name!r})"
@@ -1,13 +1,23 @@
 import logging
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from controller.webserver import WebServer
 from controller.appinfo import AppInfo
-from controller.scheduler import Scheduler
+from controller.scheduler import Scheduler, HeapScheduler, BUILTIN, APSCHEDULER
 from controller.player_dispatcher import PlayerDispatcher
 from controller.player_manager import PlayerManager
+from controller.poller import Poller
 
 from dlna.mediaserver import MediaServer
+from dlna import dlna_helper
+from dlna import metadata
+from dlna.library_index import LibraryIndex
+from dlna.search_cache import SearchCache
+from dlna.mediaserver_group import MediaServerGroup
+from dlna.eventing import EventListener
+from dlna.description_cache import DescriptionCache
+from dlna.player import Player
 
 logger = logging.getLogger(__file__)
 
@@ -30,14 +40,68 @@ def load_config():
         return json.load(data_file)
 
 
-def create_media_servers(media_servers_config: dict) -> list[MediaServer]:
+def create_media_servers(media_servers_config: dict, scheduler: Scheduler = None) -> list[MediaServer]:
     res = []
     for m_config in media_servers_config:
-        server = MediaServer(m_config.get('url'))
+        server = MediaServer(m_config.get('url'), m_config.get('page_size'), m_config.get('sampling', False),
+                             m_config.get('crawl_limit', MediaServer.DEFAULT_CRAWL_LIMIT))
+        if m_config.get('index', False) and scheduler is not None:
+            index = LibraryIndex(server)
+            server.set_index(index)
+            interval = m_config.get('index_refresh', LibraryIndex.DEFAULT_REFRESH_INTERVAL)
+            scheduler.start_job('LIBRARY_INDEX_' + m_config.get('name', m_config.get('url')), index.build,
+                                interval, immediate=True)
+        cache_config = m_config.get('cache', False)
+        if cache_config:
+            server.set_cache(SearchCache(**cache_config) if isinstance(cache_config, dict) else SearchCache())
         res.append(server)
     return res
 
 
+def create_media_server_search(media_servers: list[MediaServer], fan_out_config: dict = None):
+    if len(media_servers) == 1:
+        return media_servers[0]
+    return MediaServerGroup(media_servers, **(fan_out_config or {}))
+
+
+def create_event_listener(eventing_config) -> EventListener | None:
+    if not eventing_config:
+        return None
+    listener = EventListener(**eventing_config) if isinstance(eventing_config, dict) else EventListener()
+    listener.start()
+    return listener
+
+
+def create_description_cache(cache_config) -> DescriptionCache | None:
+    if not cache_config:
+        return None
+    return DescriptionCache(**cache_config) if isinstance(cache_config, dict) else DescriptionCache()
+
+
+def create_scheduler(scheduler_config) -> Scheduler | HeapScheduler:
+    scheduler_config = dict(scheduler_config or {})
+    backend = scheduler_config.pop('backend', BUILTIN)
+    if backend == APSCHEDULER:
+        scheduler = Scheduler()
+    elif backend == BUILTIN:
+        scheduler = HeapScheduler(**scheduler_config)
+    else:
+        raise ValueError(f"Unknown scheduler backend {backend}")
+    scheduler.start()
+    return scheduler
+
+
+def create_state_executor(workers: int = None) -> ThreadPoolExecutor:
+    # one pool for the state queries of all players
+    return ThreadPoolExecutor(max_workers=workers or Player.STATE_QUERY_WORKERS, thread_name_prefix='PlayerState')
+
+
+def create_poller(poller_config) -> Poller:
+    poller = Poller(**(poller_config or {}))
+    poller.start()
+    return poller
+
+
 def main():
     setup_logging()
 
@@ -47,14 +111,30 @@ def main():
     info.register('config', config)  # put full config into info
 
     logger.info("starting")
-    scheduler = Scheduler()
-    scheduler.start()
-
-    manager = PlayerManager(config.get('players'), scheduler)
+    scheduler = create_scheduler(config.get('scheduler'))
+    info.register('scheduler', scheduler.get_info)
+
+    description_cache = create_description_cache(config.get('description_cache', False))
+    if description_cache is not None:
+        info.register('description_cache', description_cache.get_info)
+    state_executor = create_state_executor(config.get('state_query_workers'))
+    manager = PlayerManager(config.get('players'), scheduler, description_cache, state_executor)
     info.register('players', manager.get_player_views)
-    media_servers = create_media_servers(config.get('media_servers'))
+    media_servers = create_media_servers(config.get('media_servers'), scheduler)
+    media_server_search = create_media_server_search(media_servers, config.get('media_server_fan_out'))
+    info.register('media_servers', media_server_search.get_info)
+    info.register('http_pools', dlna_helper.get_pool_statistics)
+    info.register('metadata', metadata.get_cache_statistics)
+
+    listener = create_event_listener(config.get('eventing', False))
+    if listener is not None:
+        info.register('eventing', listener.get_info)
+
+    poller = create_poller(config.get('poller'))
+    info.register('poller', poller.get_info)
 
-    dispatcher = PlayerDispatcher(manager, media_servers[0], scheduler)  # todo for now only one
+    dispatcher = PlayerDispatcher(manager, media_server_search, scheduler, listener, config.get('groups'), poller)
+    info.register('command_queues', dispatcher.get_queue_info)
     w = WebServer(config, dispatcher, info)
     w.serve()
 
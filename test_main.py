@@ -1,6 +1,13 @@
 import unittest
+import tempfile
+from unittest.mock import MagicMock
 
-from main import setup_logging, create_media_servers
+from main import setup_logging, create_media_servers, create_media_server_search, create_event_listener, \
+    create_description_cache, create_poller, create_scheduler
+from controller.poller import Poller
+from controller.scheduler import Scheduler, HeapScheduler
+from dlna.mediaserver_group import MediaServerGroup
+from dlna.search_cache import SearchCache
 
 
 class TestMain(unittest.TestCase):
@@ -24,3 +31,96 @@ class TestMain(unittest.TestCase):
         self.assertEqual(2, len(res))
         self.assertEqual("http://x.y.z.3:12345/ContentDir", res[0]._url)
         self.assertEqual("http://x.y.z.4:12345/MediaServer/ContentDirectory/Control", res[1]._url)
+
+    def test_create_mediaplayers_with_index(self):
+        scheduler = MagicMock()
+        media_players_cfg = [
+            {"name": "MS-A", "url": "http://x.y.z.3:12345/ContentDir", "index": True, "index_refresh": 60},
+            {"name": "MS-B", "url": "http://x.y.z.4:12345/MediaServer/ContentDirectory/Control"}
+        ]
+        res = create_media_servers(media_servers_config=media_players_cfg, scheduler=scheduler)
+        self.assertIsNotNone(res[0]._index)
+        self.assertIsNone(res[1]._index)
+        scheduler.start_job.assert_called_once_with('LIBRARY_INDEX_MS-A', res[0]._index.build, 60, immediate=True)
+
+    def test_create_mediaplayers_with_cache(self):
+        media_players_cfg = [
+            {"name": "MS-A", "url": "http://x.y.z.3:12345/ContentDir", "cache": True, "page_size": 20},
+            {"name": "MS-B", "url": "http://x.y.z.4:12345/ContentDir", "cache": {"ttl": 10, "max_entries": 2}},
+            {"name": "MS-C", "url": "http://x.y.z.5:12345/ContentDir", "sampling": True}
+        ]
+        res = create_media_servers(media_servers_config=media_players_cfg)
+        self.assertEqual(SearchCache.DEFAULT_MAX_ENTRIES, res[0].get_info()['cache']['max_entries'])
+        self.assertEqual(2, res[1].get_info()['cache']['max_entries'])
+        self.assertIsNone(res[2].get_info()['cache'])
+        self.assertEqual(20, res[0]._page_size)
+        self.assertIsNone(res[1]._page_size)
+        self.assertFalse(res[0]._sampling)
+        self.assertTrue(res[2]._sampling)
+
+    def test_create_media_server_search(self):
+        single = create_media_servers(media_servers_config=[{"url": "http://x.y.z.3:12345/ContentDir"}])
+        self.assertEqual(single[0], create_media_server_search(single))
+
+        several = create_media_servers(media_servers_config=[{"url": "http://a/ContentDir"}, {"url": "http://b/ContentDir"}])
+        group = create_media_server_search(several, {"deadline": 2})
+        self.assertTrue(isinstance(group, MediaServerGroup))
+        self.assertEqual(2, group._deadline)
+
+    def test_create_description_cache(self):
+        self.assertIsNone(create_description_cache(None))
+        self.assertIsNone(create_description_cache(False))
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = create_description_cache({'directory': directory, 'max_age': 10})
+            self.assertEqual(directory, cache._directory)
+            self.assertEqual(10, cache._max_age)
+
+    def test_create_scheduler(self):
+        scheduler = create_scheduler(None)
+        try:
+            self.assertIsInstance(scheduler, HeapScheduler)
+            self.assertEqual('builtin', scheduler.get_info()['backend'])
+        finally:
+            scheduler.shutdown()
+
+        scheduler = create_scheduler({'backend': 'builtin', 'workers': 2})
+        try:
+            self.assertEqual(2, scheduler.get_info()['workers'])
+        finally:
+            scheduler.shutdown()
+
+        scheduler = create_scheduler({'backend': 'apscheduler'})
+        try:
+            self.assertIsInstance(scheduler, Scheduler)
+            self.assertTrue(scheduler.scheduler.running)
+        finally:
+            scheduler.shutdown()
+
+        with self.assertRaises(ValueError):
+            create_scheduler({'backend': 'cron'})
+
+    def test_create_poller(self):
+        poller = create_poller(None)
+        try:
+            self.assertEqual(Poller.DEFAULT_WORKERS, poller.get_info()['workers'])
+        finally:
+            poller.shutdown()
+
+        poller = create_poller({'workers': 2, 'resolution': 0.5})
+        try:
+            self.assertEqual(2, poller.get_info()['workers'])
+            self.assertEqual(0.5, poller._resolution)
+        finally:
+            poller.shutdown()
+
+    def test_create_event_listener(self):
+        self.assertIsNone(create_event_listener(None))
+        self.assertIsNone(create_event_listener(False))
+
+        listener = create_event_listener({'host': '127.0.0.1', 'port': 0})
+        try:
+            self.assertTrue(listener.get_port() > 0)
+            self.assertEqual('127.0.0.1', listener._host)
+        finally:
+            listener.stop()